@@ -1,5 +1,13 @@
 """
 AI Modülleri - ML Tabanlı Rota Optimizasyonu
 """
-from .güncel_v6_fullvehicle import plan_full_vehicle_routes
 from .csv_to_routes_api import csv_to_routes_api
+
+
+def __getattr__(name):
+    # Planlayıcı (scipy, yol grafı, model eğitimi) ilk kullanımda yüklenir;
+    # ai.mahalle_merkezleri gibi hafif modülleri alan API'ler onu yüklemez
+    if name == "plan_full_vehicle_routes":
+        from .güncel_v6_fullvehicle import plan_full_vehicle_routes
+        return plan_full_vehicle_routes
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
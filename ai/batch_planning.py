@@ -0,0 +1,170 @@
+"""
+Çoklu Gün (Haftalık) Toplu Planlama
+Bir tarih aralığındaki günleri süreç havuzuna dağıtarak planlar.
+
+PlannerContext ebeveyn süreçte bir kez yüklenir. fork destekleyen
+sistemlerde işçiler context'i kopyalamadan devralır (mmap mesafe
+tabloları zaten sayfa önbelleğinden paylaşılır); fork olmayan sistemlerde
+her işçi context'i bir kez önbelleklerden yükler (hazır context verildiyse
+onunla tek süreçte planlanır). Her gün için
+rota_fullvehicle_YYYYMMDD.csv / routes_api_YYYYMMDD.json, tüm aralık için
+batch_summary_<başlangıç>_<bitiş>.csv/.json yazılır.
+
+Kullanım:
+    python batch_planning.py --start 2025-12-15 --days 7
+    python batch_planning.py --start 2025-12-01 --end 2025-12-31 --workers 8 --output ciktilar/
+    python batch_planning.py --start 2025-12-01 --end 2025-12-31 --templates
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from datetime import datetime, timedelta
+from pathlib import Path
+
+try:
+    from .güncel_v6_fullvehicle import PlannerContext, DEFAULT_CONFIG, DATA_DIR, write_plan_outputs
+except ImportError:  # script olarak çalıştırıldığında
+    from güncel_v6_fullvehicle import PlannerContext, DEFAULT_CONFIG, DATA_DIR, write_plan_outputs
+
+# İşçi süreç durumu - fork'ta ebeveynden devralınır, spawn'da _init_worker kurar
+_CONTEXT = None
+_CONFIG = None
+_OUTPUT_DIR = None
+
+
+def _init_worker(data_dir, config, output_dir):
+    global _CONTEXT, _CONFIG, _OUTPUT_DIR
+    if _CONTEXT is None:
+        _CONTEXT = PlannerContext.build(data_dir)
+    _CONFIG = config
+    _OUTPUT_DIR = output_dir
+
+
+def _plan_one_day(target_date):
+    """Tek günü planla, çıktılarını yaz ve özet satırını döndür"""
+    start = time.time()
+    vehicles, result_df = _CONTEXT.plan(target_date, _CONFIG)
+    csv_path, json_path = write_plan_outputs(vehicles, result_df, target_date, _OUTPUT_DIR)
+    active = [v for v in vehicles if len(v["route"]) > 1]
+    return {
+        "date": target_date.strftime("%Y-%m-%d"),
+        "day": target_date.strftime("%A").upper(),
+        "vehicles": len(active),
+        "stops": int((result_df["container_idx"] >= 0).sum()) if not result_df.empty else 0,
+        "collected_tonnage": round(sum(v["collected_tonnage"] for v in vehicles), 2),
+        "total_distance_km": round(sum(v["distance"] for v in vehicles), 2),
+        "unloads": int(sum(v["unloads"] for v in vehicles)),
+        "plan_seconds": round(time.time() - start, 2),
+        "csv": str(csv_path) if csv_path else None,
+        "json": str(json_path) if json_path else None,
+    }
+
+
+def date_range(start, end):
+    days = []
+    d = start
+    while d <= end:
+        days.append(d)
+        d += timedelta(days=1)
+    return days
+
+
+def plan_date_range(start, end, config=None, context=None, data_dir=None, output_dir=None, workers=None):
+    """
+    [start, end] aralığındaki her günü paralel planla.
+
+    Args:
+        start, end: İlk ve son gün (dahil)
+        config: PlannerConfig (None ise DEFAULT_CONFIG, günlük loglar kapalı)
+        context: Hazır PlannerContext (None ise data_dir'den bir kez yüklenir)
+        output_dir: Çıktı klasörü (None ise veri klasörü)
+        workers: Süreç sayısı (None ise min(gün sayısı, çekirdek sayısı)).
+            fork yoksa işçiler context'i data_dir'den yeniden yükler; hazır
+            context verildiyse aynı veriyle planlamak için tek süreç kullanılır
+
+    Returns:
+        Gün başına özet satırlarından oluşan DataFrame
+    """
+    global _CONTEXT
+    cfg = config if config is not None else replace(DEFAULT_CONFIG, verbose=False)
+    output_dir = Path(output_dir) if output_dir is not None else Path(data_dir) if data_dir is not None else DATA_DIR
+    output_dir.mkdir(parents=True, exist_ok=True)
+    days = date_range(start, end)
+    workers = workers or min(len(days), os.cpu_count() or 1)
+    if context is not None and "fork" not in mp.get_all_start_methods():
+        workers = 1
+
+    print(f"🗓️ TOPLU PLANLAMA: {start:%Y-%m-%d} - {end:%Y-%m-%d} ({len(days)} gün, {workers} süreç)")
+    batch_start = time.time()
+    _CONTEXT = context if context is not None else PlannerContext.build(data_dir)
+    _CONTEXT.warm_up()
+
+    if workers > 1:
+        if "fork" in mp.get_all_start_methods():
+            # İşçiler ebeveynin context'ini kopyalamadan devralır
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("fork"),
+                                       initializer=_init_worker, initargs=(data_dir, cfg, output_dir))
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers,
+                                       initializer=_init_worker, initargs=(data_dir, cfg, output_dir))
+        with pool:
+            rows = list(pool.map(_plan_one_day, days))
+    else:
+        _init_worker(data_dir, cfg, output_dir)
+        rows = [_plan_one_day(d) for d in days]
+
+    summary = pd.DataFrame(rows)
+    tag = f"{start:%Y%m%d}_{end:%Y%m%d}"
+    summary_csv = output_dir / f"batch_summary_{tag}.csv"
+    summary.to_csv(summary_csv, index=False)
+    elapsed = time.time() - batch_start
+    with open(output_dir / f"batch_summary_{tag}.json", 'w', encoding='utf-8') as f:
+        json.dump({
+            "start": f"{start:%Y-%m-%d}",
+            "end": f"{end:%Y-%m-%d}",
+            "days": len(days),
+            "workers": workers,
+            "wall_seconds": round(elapsed, 2),
+            "total_stops": int(summary["stops"].sum()),
+            "total_tonnage": round(float(summary["collected_tonnage"].sum()), 2),
+            "total_distance_km": round(float(summary["total_distance_km"].sum()), 2),
+            "per_day": rows,
+        }, f, ensure_ascii=False, indent=2)
+
+    print(f"\n{'='*60}")
+    print("📊 TOPLU PLAN ÖZETİ")
+    print(f"{'='*60}")
+    for r in rows:
+        print(f"   {r['date']} {r['day'][:3]}: {r['stops']} durak, {r['collected_tonnage']:.1f} ton, "
+              f"{r['total_distance_km']:.1f} km, {r['unloads']} boşaltma ({r['plan_seconds']:.1f}s)")
+    print(f"⏱️ Toplam süre: {elapsed:.2f} saniye (gün başına plan süreleri toplamı {summary['plan_seconds'].sum():.1f}s)")
+    print(f"✅ Özet: {summary_csv}")
+    return summary
+
+
+def _parse_date(text):
+    return datetime.strptime(text, "%Y-%m-%d")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tarih aralığını paralel planla")
+    parser.add_argument("--start", type=_parse_date, required=True, help="İlk gün (YYYY-MM-DD)")
+    parser.add_argument("--end", type=_parse_date, help="Son gün (YYYY-MM-DD, dahil)")
+    parser.add_argument("--days", type=int, default=7, help="--end verilmezse gün sayısı")
+    parser.add_argument("--workers", type=int, default=None, help="Süreç sayısı")
+    parser.add_argument("--data-dir", default=None, help="Veri klasörü (varsayılan: full_dataset)")
+    parser.add_argument("--output", default=None, help="Çıktı klasörü")
+    parser.add_argument("--templates", action="store_true",
+                        help="Haftanın günü şablon planlarını onar (şablon yoksa tam plan yapılıp kaydedilir)")
+    args = parser.parse_args()
+
+    end = args.end if args.end is not None else args.start + timedelta(days=args.days - 1)
+    config = replace(DEFAULT_CONFIG, verbose=False, plan_templates=args.templates)
+    plan_date_range(args.start, end, config=config, data_dir=args.data_dir, output_dir=args.output,
+                    workers=args.workers)
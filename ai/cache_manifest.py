@@ -0,0 +1,145 @@
+"""
+Önbellek Manifestosu
+v6 önbellek dosyalarının (pickle, npz, mmap tabloları) hangi kaynak
+dosyalardan, hangi parametrelerle ve hangi format sürümüyle üretildiğini
+tek bir JSON dosyasında kaydeder.
+
+Bir önbellek ancak kaynaklarının içerik özeti (sha256), kurulum
+parametreleri ve format sürümü kayıttakiyle aynıysa güncel sayılır.
+Dosya boyutu ve mtime değişmemişse kayıtlı özet yeniden kullanılır;
+büyük yol JSON'u her açılışta yeniden okunmaz.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+MANIFEST_FORMAT_VERSION = 1
+HASH_CHUNK = 1 << 20
+
+
+def _normalize(params):
+    """Parametreleri JSON karşılaştırmasına uygun hale getir (tuple -> list vb.)"""
+    return json.loads(json.dumps(params or {}, sort_keys=True, default=str))
+
+
+class CacheManifest:
+    """
+    Kullanım:
+        manifest = CacheManifest(path)
+        if not manifest.is_fresh("street_widths", {"road": road_path}, version=1):
+            ...yeniden kur...
+            manifest.record("street_widths", {"road": road_path}, version=1)
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        self._signatures = {}  # bu süreçte hesaplanan dosya imzaları
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("format_version") == MANIFEST_FORMAT_VERSION:
+                    self.entries = data.get("artifacts", {})
+            except (OSError, ValueError):
+                # Bozuk manifesto: tüm önbellekler bilinmiyor sayılır
+                self.entries = {}
+
+    # --------------------------------------------------------
+    # Kaynak imzaları
+    # --------------------------------------------------------
+    def _recorded_signature(self, path):
+        for entry in self.entries.values():
+            sig = entry.get("sources", {}).get(path)
+            if sig is not None:
+                return sig
+        return None
+
+    def signature(self, path):
+        """{"size", "mtime_ns", "sha256"}; dosya yoksa None"""
+        path = str(Path(path).resolve())
+        if not os.path.exists(path):
+            return None
+        st = os.stat(path)
+        for known in (self._signatures.get(path), self._recorded_signature(path)):
+            if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+                self._signatures[path] = known
+                return known
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                h.update(chunk)
+        sig = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": h.hexdigest()}
+        self._signatures[path] = sig
+        return sig
+
+    # --------------------------------------------------------
+    # Tazelik kontrolü
+    # --------------------------------------------------------
+    def stale_reasons(self, name, sources, params=None, version=1):
+        """
+        Önbelleği geçersiz kılan nedenlerin listesi (boş = güncel).
+        Diskte olmayan kaynaklar karşılaştırılamaz ve yok sayılır; hiçbir
+        kaynağı okunamayan bir önbellek kayıt olmasa da kullanılabilir.
+        """
+        entry = self.entries.get(name)
+        resolved = {str(Path(p).resolve()): key for key, p in sources.items()}
+        present = {path: self.signature(path) for path in resolved}
+        present = {path: sig for path, sig in present.items() if sig is not None}
+
+        if entry is None:
+            return ["kayıt yok"] if present else []
+        reasons = []
+        if entry.get("version") != version:
+            reasons.append(f"format sürümü {entry.get('version')} -> {version}")
+        if entry.get("params") != _normalize(params):
+            reasons.append("parametreler değişti")
+        recorded = entry.get("sources", {})
+        touched = False
+        for path, sig in present.items():
+            old = recorded.get(path)
+            if old is None or old.get("sha256") != sig["sha256"]:
+                reasons.append(f"{resolved[path]} değişti")
+            elif old != sig:
+                # İçerik aynı, sadece mtime değişmiş: bir sonraki açılışta yeniden özetlenmesin
+                recorded[path] = sig
+                touched = True
+        if touched and not reasons:
+            self.save()
+        return reasons
+
+    def is_fresh(self, name, sources, params=None, version=1):
+        reasons = self.stale_reasons(name, sources, params, version)
+        if reasons:
+            print(f"♻️ {name} önbelleği güncel değil: {', '.join(reasons)}")
+        return not reasons
+
+    # --------------------------------------------------------
+    # Kayıt
+    # --------------------------------------------------------
+    def record(self, name, sources, params=None, version=1):
+        """Önbelleğin şu anki kaynaklardan üretildiğini kaydet ve manifestoyu yaz"""
+        sigs = {}
+        for p in sources.values():
+            path = str(Path(p).resolve())
+            sig = self.signature(path)
+            if sig is not None:
+                sigs[path] = sig
+        self.entries[name] = {
+            "version": version,
+            "params": _normalize(params),
+            "sources": sigs,
+            "built_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        self.save()
+
+    def save(self):
+        # Geçici dosyaya yazıp yer değiştir: yarım kalan yazım manifestoyu bozmasın
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"format_version": MANIFEST_FORMAT_VERSION, "artifacts": self.entries},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
@@ -0,0 +1,243 @@
+"""
+Önce Kümele, Sonra Rotala (Cluster-First, Route-Second)
+Günün konteynerlerini tek bir aday havuzu yerine araç başına coğrafi
+kümelere böler ve her kümeyi ayrı bir süreçte tek araçlık küçük bir
+problem olarak çözer.
+
+1. Konteynerler erişim sınıfına ayrılır (hangi araç kategorileri
+   alabilir: yeraltı -> sadece CRANE, dar sokak -> sadece SMALL, ...)
+2. Her sınıf (veya sınıf × mahalle) k-means ile araç bütçesinin bir
+   kesri büyüklüğünde mikro kümelere bölünür
+3. Mikro kümeler kısıtlı sınıftan başlayarak, boşaltma noktasına en uzak
+   olandan içe doğru, kategorisi uygun ve bütçesi yeten en yakın araca
+   atanır. Araç bütçesi kapasitesi × vardiyada yapabileceği sefer sayısıdır
+4. Her araç kendi kümesinde PlannerContext.simulate_day ile planlanır
+"""
+
+import multiprocessing as mp
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from scipy.cluster.vq import kmeans2
+from scipy.spatial import cKDTree
+
+try:
+    from .güncel_v6_fullvehicle import (DEFAULT_CONFIG, DayProblem, routes_to_dataframe, _silent)
+except ImportError:  # script olarak çalıştırıldığında
+    from güncel_v6_fullvehicle import (DEFAULT_CONFIG, DayProblem, routes_to_dataframe, _silent)
+
+MICRO_CLUSTERS_PER_VEHICLE = 6   # Araç bütçesinin kaçta biri bir mikro küme olur
+BUDGET_SLACK = 1.15              # Toplam bütçe günlük talebin bu katı kadar dağıtılır
+KM_PER_DEG = 111
+
+# fork ile açılan işçilere devredilen durum
+_STATE = {}
+
+
+def access_classes(ctx, day):
+    """
+    Konteyner başına erişim sınıfı.
+
+    Returns:
+        (codes, classes): codes (n,) sınıf indeksi, classes[i] o sınıfa
+        girebilen kategorilerin kümesi (boş küme = hiçbir araç alamaz)
+    """
+    dc = day.day_containers
+    access = ctx.vehicle_mgr.build_access_table(dc["is_underground"].values, dc["street_width"].values)
+    cats = sorted(access)
+    bits = np.zeros(len(dc), dtype=np.int64)
+    for b, cat in enumerate(cats):
+        bits |= access[cat]["mask"].astype(np.int64) << b
+    uniq, codes = np.unique(bits, return_inverse=True)
+    classes = [frozenset(cat for b, cat in enumerate(cats) if u >> b & 1) for u in uniq]
+    return codes, classes
+
+
+def vehicle_budgets(vehicles, day, cfg):
+    """
+    Araç başına vardiyalık tonaj bütçesi: kapasite × sefer sayısı.
+    Sefer süresi = (kapasite / ort. talep) konteynerin servis + aradaki yol
+    süresi + boşaltma gidiş-dönüşü ve bekleme; sefer sayısı hem vardiyaya
+    sığan hem de günün talebini karşılamaya yetecek kadarla sınırlıdır.
+    """
+    dc = day.day_containers
+    lats, lons = dc["lat"].values, dc["lon"].values
+    demand = dc["demand_ton"].values
+    caps = np.array([v["capacity"] for v in vehicles], dtype=np.float64)
+    if len(dc) > 1:
+        gap_km, _ = cKDTree(np.column_stack([lats, lons])).query(np.column_stack([lats, lons]), k=2)
+        gap_km = float(np.median(gap_km[:, 1])) * KM_PER_DEG
+    else:
+        gap_km = 0.0
+    unload_km = float(np.mean(np.hypot(lats - day.unload_pos[0], lons - day.unload_pos[1]))) * KM_PER_DEG
+    per_container_min = cfg.container_service_sec / 60 + gap_km / cfg.avg_speed_kmh * 60
+    trip_min = (caps / max(float(demand.mean()), 1e-6)) * per_container_min \
+        + cfg.unload_wait_min + 2 * unload_km / cfg.avg_speed_kmh * 60
+    shift_min = (cfg.day_end_hour - cfg.day_start_hour) * 60
+    shift_trips = shift_min / np.maximum(trip_min, 1.0)
+    needed_trips = float(demand.sum()) / max(float(caps.sum()), 1e-6) * BUDGET_SLACK
+    return caps * np.minimum(shift_trips, max(needed_trips, 1.0))
+
+
+def micro_clusters(day, codes, target_ton, method="kmeans"):
+    """
+    Konteynerleri yaklaşık target_ton talepli mikro kümelere böl.
+    method="mahalle" ise kümeler mahalle sınırlarını aşmaz.
+    Returns: (n,) küme etiketi
+    """
+    dc = day.day_containers
+    demand = dc["demand_ton"].values
+    coords = np.column_stack([dc["lat"].values, dc["lon"].values * np.cos(np.radians(dc["lat"].values.mean()))])
+    if method == "mahalle":
+        mah_codes = dc["mahalle_code"].values.astype(np.int64)
+        groups = codes * (mah_codes.max() + 1) + mah_codes
+    elif method == "kmeans":
+        groups = codes
+    else:
+        raise ValueError(f"Bilinmeyen kümeleme yöntemi: {method}")
+
+    labels = np.empty(len(dc), dtype=np.int64)
+    next_label = 0
+    for g in np.unique(groups):
+        members = np.flatnonzero(groups == g)
+        k = int(min(len(members), max(1, np.ceil(demand[members].sum() / target_ton))))
+        if k > 1:
+            _, sub = kmeans2(coords[members], k, minit="++", seed=0)
+            _, sub = np.unique(sub, return_inverse=True)  # boş kalan kümeleri at
+        else:
+            sub = np.zeros(len(members), dtype=np.int64)
+        labels[members] = next_label + sub
+        next_label += int(sub.max()) + 1
+    return labels
+
+
+def assign_clusters(day, vehicles, codes, classes, labels, budgets):
+    """
+    Mikro kümeleri araçlara ata. Returns: (n,) sahip araç indeksi (-1 = atanamadı)
+    """
+    dc = day.day_containers
+    lats, lons, demand = dc["lat"].values, dc["lon"].values, dc["demand_ton"].values
+    n_clusters = int(labels.max()) + 1 if len(labels) else 0
+    c_dem = np.bincount(labels, weights=demand, minlength=n_clusters)
+    c_cnt = np.maximum(np.bincount(labels, minlength=n_clusters), 1)
+    c_lat = np.bincount(labels, weights=lats, minlength=n_clusters) / c_cnt
+    c_lon = np.bincount(labels, weights=lons, minlength=n_clusters) / c_cnt
+    c_class = np.zeros(n_clusters, dtype=np.int64)
+    c_class[labels] = codes
+
+    v_cat = np.array([v["category"] for v in vehicles])
+    anchor = np.array([v["start_pos"] for v in vehicles], dtype=np.float64)
+    anchor_w = np.zeros(len(vehicles))
+    remaining = budgets.astype(np.float64).copy()
+    owner_of = np.full(n_clusters, -1, dtype=np.int64)
+
+    # Kısıtlı sınıflar önce; sınıf içinde boşaltma noktasına uzaktan yakına
+    n_cats = np.array([len(classes[c]) for c in c_class])
+    unload_d = np.hypot(c_lat - day.unload_pos[0], c_lon - day.unload_pos[1])
+    order = np.lexsort((-unload_d, n_cats))
+    for c in order:
+        eligible = np.flatnonzero(np.isin(v_cat, list(classes[c_class[c]])))
+        if len(eligible) == 0:
+            continue
+        d = np.hypot(anchor[eligible, 0] - c_lat[c], anchor[eligible, 1] - c_lon[c])
+        fits = remaining[eligible] >= c_dem[c]
+        if fits.any():
+            vi = eligible[fits][np.argmin(d[fits])]
+        else:
+            vi = eligible[np.argmax(remaining[eligible])]
+        owner_of[c] = vi
+        remaining[vi] -= c_dem[c]
+        # Araç çapası atanan kümelerin talep ağırlıklı merkezi
+        w = anchor_w[vi] + c_dem[c]
+        if anchor_w[vi] == 0:
+            anchor[vi] = (c_lat[c], c_lon[c])
+        else:
+            anchor[vi] = (anchor[vi] * anchor_w[vi] + np.array([c_lat[c], c_lon[c]]) * c_dem[c]) / max(w, 1e-9)
+        anchor_w[vi] = w
+    return owner_of[labels] if n_clusters else np.zeros(0, dtype=np.int64)
+
+
+def sub_day(day, members):
+    """Günün sadece members konteynerlerinden oluşan alt problemi"""
+    return DayProblem(day.target_date, day.dow, day.adjusted_target, day.neighborhoods,
+                      day.day_containers.iloc[members].reset_index(drop=True),
+                      day.high_pop, day.low_pop, day.default_start_pos, day.unload_pos,
+                      day.index[members] if day.index is not None else None)
+
+
+def _solve_vehicle(vi):
+    """vi. aracı kendi kümesinde planla; rota indeksleri gün indeksine çevrilir"""
+    ctx, day, vehicles, owner, cfg = (_STATE[k] for k in ("ctx", "day", "vehicles", "owner", "cfg"))
+    vehicle = dict(vehicles[vi])
+    vehicle["route"] = vehicle["route"].copy()
+    members = np.flatnonzero(owner == vi)
+    if len(members) == 0:
+        return vehicle, members
+    collected = ctx.simulate_day(sub_day(day, members), [vehicle], cfg)
+    vehicle["route"].remap(members)
+    return vehicle, members[collected]
+
+
+def plan_clustered(ctx, target_date, config=None, dow=None, fleet=None, method="kmeans", workers=None,
+                   complete=True):
+    """
+    Kümele-sonra-rotala planı. PlannerContext.plan ile aynı çıktıyı verir.
+
+    Args:
+        ctx: PlannerContext
+        method: "kmeans" (erişim sınıfı içinde k-means) veya "mahalle"
+            (mikro kümeler mahalle sınırını aşmaz)
+        workers: Süreç sayısı (None ise çekirdek sayısı; fork yoksa tek süreç)
+        complete: Kümelerinde vardiyası biten araçlardan kalan konteynerler,
+            vakti kalan araçlarla (bıraktıkları konum ve yükten) düz bir
+            tamamlama turunda planlanır
+
+    Returns:
+        (vehicles_data, result_df) - araçlara "cluster_size" alanı eklenir
+    """
+    cfg = config if config is not None else DEFAULT_CONFIG
+    log = print if cfg.verbose else _silent
+    day = ctx.prepare_day(target_date, cfg, dow)
+    if day is None:
+        return [], routes_to_dataframe([])
+    vehicles = ctx.init_vehicles(day, cfg, fleet)
+    quiet = replace(cfg, verbose=False)
+
+    codes, classes = access_classes(ctx, day)
+    budgets = vehicle_budgets(vehicles, day, cfg)
+    target_ton = float(np.median(budgets)) / MICRO_CLUSTERS_PER_VEHICLE
+    labels = micro_clusters(day, codes, target_ton, method)
+    owner = assign_clusters(day, vehicles, codes, classes, labels, budgets)
+    log(f"\n🧩 KÜMELEME ({method}): {int(labels.max()) + 1} mikro küme, "
+        f"{len(vehicles)} araç, atanamayan {int((owner < 0).sum())} konteyner")
+
+    ctx.warm_up()
+    _STATE.update(ctx=ctx, day=day, vehicles=vehicles, owner=owner, cfg=quiet)
+    workers = workers or os.cpu_count() or 1
+    if "fork" not in mp.get_all_start_methods():
+        workers = 1
+    try:
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("fork")) as pool:
+                results = list(pool.map(_solve_vehicle, range(len(vehicles))))
+        else:
+            results = [_solve_vehicle(vi) for vi in range(len(vehicles))]
+    finally:
+        _STATE.clear()
+
+    collected = np.zeros(len(day.day_containers), dtype=bool)
+    vehicles_data = []
+    for vi, (vehicle, done) in enumerate(results):
+        vehicle["cluster_size"] = int((owner == vi).sum())
+        collected[done] = True
+        vehicles_data.append(vehicle)
+
+    if complete and not collected.all():
+        before = int(collected.sum())
+        collected |= ctx.simulate_day(day, vehicles_data, quiet, container_mask=~collected)
+        log(f"🧹 Tamamlama turu: {int(collected.sum()) - before} konteyner daha toplandı")
+
+    result_df = routes_to_dataframe(vehicles_data, day, cfg)
+    ctx.report(day, vehicles_data, collected, result_df, cfg)
+    return vehicles_data, result_df
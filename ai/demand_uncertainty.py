@@ -0,0 +1,173 @@
+"""
+Talep Belirsizliği Altında Plan Dayanıklılığı (Monte Carlo)
+TonnageManager konteyner başına tek bir deterministik demand_ton üretir.
+Bu modül sabit bir planı, rastgele örneklenen N talep gerçekleşmesine karşı
+yeniden planlamadan oynatır ve araç başına taşma, ek boşaltma seferi ve
+fazla mesai dağılımlarını verir.
+
+Talep modeli (ortalaması 1 olan log-normal çarpanlar):
+    doluluk = demand_ton × gün × mahalle × konteyner
+- gün: o günün tonaj hedefindeki (mevsim/haftanın günü faktörleri) sapma,
+  tüm konteynerlerde ortak
+- mahalle: mahalle başına ortak sapma
+- konteyner: konteynerin kendi sapması
+Doluluk konteyner kapasitesini aşarsa fazlası taşmadır (toplanamaz).
+
+Oynatma kuralları (plan sırası sabit):
+- Planlanan boşaltmalar aynen yapılır
+- Sıradaki konteyner araca sığmıyorsa araç önce boşaltmaya gider: ek sefer,
+  sapma mesafesi (önceki durak → boşaltma → konteyner - doğrudan bacak)
+  ve boşaltma bekleme süresi eklenir
+- Fazla mesai: planlanan bitiş + ek süre'nin vardiya sonunu aşan kısmı
+
+Oynatma örnekler üzerinde vektörel, durak sırası üzerinde döngüdür: tüm
+araçların i. durağı tek adımda işlenir. Örnekler bellek için parçalar
+halinde üretilir.
+
+Kullanım:
+    summary, samples = replay_demand(ctx, day, vehicles, n_samples=5000, seed=42)
+"""
+
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+try:
+    from .güncel_v6_fullvehicle import DEFAULT_CONFIG, _silent
+    from .local_search import UNLOAD
+except ImportError:  # script olarak çalıştırıldığında
+    from güncel_v6_fullvehicle import DEFAULT_CONFIG, _silent
+    from local_search import UNLOAD
+
+DAY_SIGMA = 0.10        # Günlük tonaj hedefinin sapması (log-normal σ)
+MAHALLE_SIGMA = 0.15    # Mahalle ortak sapması
+CONTAINER_SIGMA = 0.35  # Konteyner sapması
+CHUNK_SAMPLES = 256     # Bellekte aynı anda tutulan örnek sayısı
+METRICS = ("overflow_ton", "extra_unloads", "extra_km", "overtime_min", "collected_ton")
+
+
+def _lognormal(rng, sigma, size):
+    """Ortalaması 1 olan log-normal çarpanlar (float32)"""
+    if sigma <= 0:
+        return np.ones(size, dtype=np.float32)
+    return rng.lognormal(-0.5 * sigma * sigma, sigma, size).astype(np.float32)
+
+
+def _route_matrix(vehicles):
+    """Rotaları (araç, adım) matrisine diz; boş adımlar START ile doldurulur"""
+    length = max(len(v["route"]) for v in vehicles)
+    pts = np.full((len(vehicles), length), -2, dtype=np.int64)
+    for vi, v in enumerate(vehicles):
+        c = v["route"].view("container")
+        pts[vi, :len(c)] = c
+    return pts
+
+
+def replay_demand(ctx, day, vehicles_data, n_samples=1000, config=None, seed=None,
+                  day_sigma=DAY_SIGMA, mahalle_sigma=MAHALLE_SIGMA, container_sigma=CONTAINER_SIGMA,
+                  chunk=CHUNK_SAMPLES):
+    """
+    Sabit planı n_samples talep gerçekleşmesine karşı oynat.
+
+    Args:
+        ctx: PlannerContext
+        day: Planın DayProblem'i
+        vehicles_data: Plan (değiştirilmez)
+        seed: Tekrarlanabilirlik için rastgele tohum
+
+    Returns:
+        (summary, samples): summary araç başına ortalama/medyan/p95 ve
+        olasılıklar; samples {ölçüt: (n_samples, araç) dizisi} - ölçütler
+        METRICS'teki sırayla
+    """
+    cfg = config if config is not None else DEFAULT_CONFIG
+    log = print if cfg.verbose else _silent
+    started = time.time()
+    rng = np.random.default_rng(seed)
+    dc = day.day_containers
+    n_veh = len(vehicles_data)
+    metric = ctx._route_improver(day, vehicles_data, cfg).metric
+
+    # Rotalardaki konteynerler yerel indekse çevrilir; örnekler sadece onlar için üretilir
+    pts = _route_matrix(vehicles_data)
+    used = np.unique(pts[pts >= 0])
+    local = np.full(len(dc), -1, dtype=np.int64)
+    local[used] = np.arange(len(used))
+    cidx = np.where(pts >= 0, local[np.maximum(pts, 0)], -1)
+    base = dc["demand_ton"].values[used].astype(np.float32)
+    caps = dc["container_capacity"].values[used].astype(np.float32)
+    mah_codes, mah_local = np.unique(dc["mahalle_code"].values[used], return_inverse=True)
+
+    # Ek boşaltma sapması: önceki nokta → boşaltma → konteyner - önceki → konteyner
+    veh = np.repeat(np.arange(n_veh), pts.shape[1] - 1).reshape(n_veh, -1)
+    prev, cur = pts[:, :-1], pts[:, 1:]
+    detour = np.zeros(pts.shape, dtype=np.float32)
+    detour[:, 1:] = np.where(
+        (cur >= 0) & (prev != UNLOAD),
+        metric.legs(prev, UNLOAD, veh) + metric.legs(UNLOAD, cur, veh) - metric.legs(prev, cur, veh), 0.0)
+    is_unload = pts == UNLOAD
+    v_cap = np.array([v["capacity"] for v in vehicles_data], dtype=np.float32)
+
+    day_base = datetime(day.target_date.year, day.target_date.month, day.target_date.day, cfg.day_start_hour)
+    shift_min = (cfg.day_end_hour - cfg.day_start_hour) * 60
+    planned_end = np.array([(v["time"] - day_base).total_seconds() / 60.0 for v in vehicles_data])
+
+    samples = {m: np.zeros((n_samples, n_veh), dtype=np.float32) for m in METRICS}
+    for s0 in range(0, n_samples, chunk):
+        s1 = min(s0 + chunk, n_samples)
+        s = s1 - s0
+        fill = (base[None, :]
+                * _lognormal(rng, day_sigma, (s, 1))
+                * _lognormal(rng, mahalle_sigma, (s, len(mah_codes)))[:, mah_local]
+                * _lognormal(rng, container_sigma, (s, len(used))))
+        spill = np.maximum(fill - caps, 0.0)
+        fill = np.minimum(fill, caps)
+
+        load = np.zeros((s, n_veh), dtype=np.float32)
+        extra_unloads = np.zeros((s, n_veh), dtype=np.float32)
+        extra_km = np.zeros((s, n_veh), dtype=np.float32)
+        collected = np.zeros((s, n_veh), dtype=np.float32)
+        overflow = np.zeros((s, n_veh), dtype=np.float32)
+        for j in range(1, pts.shape[1]):
+            cj = cidx[:, j]
+            has = cj >= 0
+            if has.any():
+                d = np.where(has, fill[:, np.maximum(cj, 0)], 0.0)
+                over = has & (load + d > v_cap) & (load > 0)
+                extra_unloads += over
+                extra_km += np.where(over, detour[:, j], 0.0)
+                load = np.where(over, 0.0, load) + d
+                collected += d
+                overflow += np.where(has, spill[:, np.maximum(cj, 0)], 0.0)
+            if is_unload[:, j].any():
+                load = np.where(is_unload[:, j], 0.0, load)
+
+        extra_min = extra_km / cfg.avg_speed_kmh * 60 + extra_unloads * cfg.unload_wait_min
+        samples["overflow_ton"][s0:s1] = overflow
+        samples["extra_unloads"][s0:s1] = extra_unloads
+        samples["extra_km"][s0:s1] = extra_km
+        samples["overtime_min"][s0:s1] = np.maximum(planned_end + extra_min - shift_min, 0.0)
+        samples["collected_ton"][s0:s1] = collected
+
+    rows = []
+    for vi, v in enumerate(vehicles_data):
+        row = {"vehicle_id": v["id"], "vehicle_category": v["category"], "vehicle_capacity": v["capacity"],
+               "planned_unloads": v["unloads"], "planned_end_min": round(float(planned_end[vi]), 1)}
+        for m in METRICS:
+            col = samples[m][:, vi]
+            row[f"{m}_mean"] = round(float(col.mean()), 3)
+            row[f"{m}_p50"] = round(float(np.percentile(col, 50)), 3)
+            row[f"{m}_p95"] = round(float(np.percentile(col, 95)), 3)
+        row["p_extra_unload"] = round(float((samples["extra_unloads"][:, vi] > 0).mean()), 4)
+        row["p_overtime"] = round(float((samples["overtime_min"][:, vi] > 0).mean()), 4)
+        rows.append(row)
+    summary = pd.DataFrame(rows)
+
+    totals = {m: samples[m].sum(axis=1) for m in METRICS}
+    log(f"🎲 TALEP BELİRSİZLİĞİ: {n_samples} örnek, {n_veh} araç ({time.time() - started:.2f}s)")
+    log(f"   Taşma: ort {totals['overflow_ton'].mean():.1f} ton, p95 {np.percentile(totals['overflow_ton'], 95):.1f} ton")
+    log(f"   Ek boşaltma: ort {totals['extra_unloads'].mean():.1f}, p95 {np.percentile(totals['extra_unloads'], 95):.0f}")
+    log(f"   Fazla mesai: ort {totals['overtime_min'].mean():.0f} dk, p95 {np.percentile(totals['overtime_min'], 95):.0f} dk "
+        f"(fazla mesaili araç olasılığı %{100 * (samples['overtime_min'] > 0).any(axis=1).mean():.1f})")
+    return summary, samples
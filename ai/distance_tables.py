@@ -0,0 +1,252 @@
+"""
+Konteyner Seviyesi Mesafe Tabloları
+Her konteyner için en yakın k komşuya sürüş mesafesi (float32 CSR) ve
+mahalleler arası yoğun bir mesafe bloğu.
+
+Tablolar bir klasörde ayrı .npy dosyaları olarak saklanır ve
+np.load(mmap_mode="r") ile açılır: yükleme neredeyse bedavadır ve aynı
+dosyayı açan işçi süreçler işletim sisteminin sayfa önbelleğindeki tek
+kopyayı paylaşır.
+"""
+
+import json
+import os
+import numpy as np
+from pathlib import Path
+from scipy.spatial import cKDTree
+from scipy.sparse.csgraph import dijkstra
+
+TABLE_FORMAT_VERSION = 2
+DEFAULT_K = 64
+STRAIGHT_LINE_FACTOR = 1.3   # Yol bulunamazsa kuş uçuşu × bu katsayı
+SEARCH_DETOUR = 3.0          # Yol aramasında k'ıncı komşu mesafesinin kaç katına bakılır
+BUILD_BLOCK = 16             # Tabloyu kurarken aynı anda çözülen kaynak sayısı
+MIN_DETOUR_BASE_KM = 0.3     # Bundan yakın mahalle merkezlerinde dolanma oranı güvenilmez
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON_EQ = 111.320
+
+_ARRAYS = ("indptr", "indices", "dist_km", "mahalle_code", "mahalle_lat", "mahalle_lon", "mahalle_km")
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return 2 * 6371.0088 * np.arcsin(np.sqrt(a))
+
+
+class ContainerDistanceTable:
+    """
+    Seyrek konteyner-konteyner mesafe tablosu.
+
+    - indptr/indices: CSR satırları; i. satır i. konteynerin k en yakın
+      komşusudur ve komşu indeksine göre sıralıdır (searchsorted ile arama)
+    - dist_km: float32 sürüş mesafesi
+    - mahalle_code: konteyner başına mahalle kodu (int16)
+    - mahalle_lat / mahalle_lon / mahalle_km: mahalle merkezleri ve (M, M)
+      float32 merkezler arası sürüş mesafesi bloğu; tabloda olmayan
+      çiftlerin tahmini için mahalle çifti başına dolanma oranı verir
+    """
+
+    def __init__(self, arrays, meta):
+        self.indptr = arrays["indptr"]
+        self.indices = arrays["indices"]
+        self.dist_km = arrays["dist_km"]
+        self.mahalle_code = arrays["mahalle_code"]
+        self.mahalle_lat = arrays["mahalle_lat"]
+        self.mahalle_lon = arrays["mahalle_lon"]
+        self.mahalle_km = arrays["mahalle_km"]
+        self.meta = meta
+        self.n = len(self.indptr) - 1
+        # Mahalle çifti dolanma oranı: yol mesafesi / kuş uçuşu. Aynı ya da çok yakın
+        # mahallelerde ve yol bulunamayan çiftlerde sabit katsayı kullanılır.
+        straight = _haversine_km(self.mahalle_lat[:, None], self.mahalle_lon[:, None],
+                                 self.mahalle_lat[None, :], self.mahalle_lon[None, :])
+        ratio = np.divide(self.mahalle_km, straight, out=np.zeros_like(straight), where=straight > 0)
+        self.detour = np.where(straight >= MIN_DETOUR_BASE_KM, np.clip(ratio, 1.0, SEARCH_DETOUR),
+                               STRAIGHT_LINE_FACTOR).astype(np.float32)
+
+    # --------------------------------------------------------
+    # Kurulum
+    # --------------------------------------------------------
+    @classmethod
+    def build(cls, lats, lons, mahalles, graph=None, nodes=None, snap_km=None,
+              min_width=0.0, k=DEFAULT_K, verbose=True):
+        """
+        Tabloyu kur. graph (road_network.RoadGraph) verilirse mesafeler
+        min_width alt grafındaki sürüş mesafesidir; nodes/snap_km konteynerlerin
+        graf düğümleri ve düğüme uzaklıklarıdır. Graf yoksa kuş uçuşu × 1.3.
+        mahalles: konteyner başına mahalle adı (mahalle bloğu için)
+        """
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        n = len(lats)
+        k = int(min(k, max(n - 1, 0)))
+        if verbose:
+            print(f"📐 Konteyner mesafe tablosu kuruluyor ({n} konteyner, k={k}, min genişlik {min_width}m)...")
+
+        # Aday komşular: yerel km projeksiyonunda en yakın k (kendisi hariç)
+        kx = KM_PER_DEG_LON_EQ * np.cos(np.radians(float(lats.mean()))) if n else KM_PER_DEG_LON_EQ
+        xy = np.column_stack([lons * kx, lats * KM_PER_DEG_LAT])
+        if k > 0:
+            _, nbr = cKDTree(xy).query(xy, k=k + 1)
+            nbr = nbr[:, 1:].astype(np.int32)
+        else:
+            nbr = np.zeros((n, 0), dtype=np.int32)
+        rows = np.repeat(np.arange(n), k)
+        straight = _haversine_km(lats[rows], lons[rows], lats[nbr.ravel()], lons[nbr.ravel()]).reshape(n, k)
+        dist = straight * STRAIGHT_LINE_FACTOR
+
+        if graph is not None and k > 0:
+            nodes = np.asarray(nodes, dtype=np.int64)
+            snap_km = np.asarray(snap_km, dtype=np.float64)
+            m = graph.csr(min_width)
+            for b in range(0, n, BUILD_BLOCK):
+                block = np.arange(b, min(b + BUILD_BLOCK, n))
+                limit = SEARCH_DETOUR * straight[block].max() + 0.5
+                d = dijkstra(m, indices=nodes[block], limit=limit)
+                drive = d[np.arange(len(block))[:, None], nodes[nbr[block]]]
+                drive += snap_km[block, None] + snap_km[nbr[block]]
+                dist[block] = np.where(np.isfinite(drive), drive, dist[block])
+
+        # Satırları komşu indeksine göre sırala
+        order = np.argsort(nbr, axis=1, kind="stable")
+        nbr = np.take_along_axis(nbr, order, axis=1)
+        dist = np.take_along_axis(dist, order, axis=1).astype(np.float32)
+
+        # Mahalle bloğu: merkezler arası sürüş mesafesi (yol yoksa kuş uçuşu × 1.3)
+        names, codes = np.unique(np.asarray(mahalles).astype(str), return_inverse=True)
+        counts = np.bincount(codes, minlength=len(names))
+        c_lat = np.bincount(codes, weights=lats, minlength=len(names)) / np.maximum(counts, 1)
+        c_lon = np.bincount(codes, weights=lons, minlength=len(names)) / np.maximum(counts, 1)
+        mahalle_km = _haversine_km(c_lat[:, None], c_lon[:, None], c_lat[None, :], c_lon[None, :]) * STRAIGHT_LINE_FACTOR
+        if graph is not None and len(names):
+            c_nodes, c_snap = graph.snap(c_lat, c_lon)
+            drive = graph.many_to_many_km(c_nodes, c_nodes, min_width).astype(np.float64)
+            drive += c_snap[:, None] + c_snap[None, :]
+            mahalle_km = np.where(np.isfinite(drive), drive, mahalle_km)
+        np.fill_diagonal(mahalle_km, 0.0)
+
+        arrays = {
+            "indptr": np.arange(0, n * k + 1, k, dtype=np.int64) if k > 0 else np.zeros(n + 1, dtype=np.int64),
+            "indices": nbr.ravel(),
+            "dist_km": dist.ravel(),
+            "mahalle_code": codes.astype(np.int16),
+            "mahalle_lat": c_lat,
+            "mahalle_lon": c_lon,
+            "mahalle_km": mahalle_km.astype(np.float32),
+        }
+        meta = {
+            "format_version": TABLE_FORMAT_VERSION,
+            "n": int(n), "k": int(k),
+            "min_width": float(min_width),
+            "source": "road" if graph is not None else "straight_line",
+            "mahalle_names": names.tolist(),
+        }
+        if verbose:
+            print(f"✅ Mesafe tablosu: {n * k} çift, {len(names)} mahalle ({meta['source']})")
+        return cls(arrays, meta)
+
+    # --------------------------------------------------------
+    # Kalıcılık
+    # --------------------------------------------------------
+    def save(self, path):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        # Önce meta silinir, en son yazılır: yarım kalan kayıt load() tarafından geçersiz sayılır
+        (path / "meta.json").unlink(missing_ok=True)
+        for name in _ARRAYS:
+            # Dosyayı mmap ile açık tutan süreçler etkilenmesin diye yeni dosya yazılıp yer değiştirilir
+            tmp = path / f"{name}.npy.tmp"
+            with open(tmp, 'wb') as f:
+                np.save(f, np.ascontiguousarray(getattr(self, name)))
+            os.replace(tmp, path / f"{name}.npy")
+        with open(path / "meta.json", 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Tabloyu aç (varsayılan: salt-okunur mmap); yoksa veya sürüm farklıysa None"""
+        path = Path(path)
+        meta_path = path / "meta.json"
+        if not meta_path.exists():
+            return None
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("format_version") != TABLE_FORMAT_VERSION:
+            return None
+        mode = "r" if mmap else None
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode=mode) for name in _ARRAYS}
+        return cls(arrays, meta)
+
+    # --------------------------------------------------------
+    # Sorgular
+    # --------------------------------------------------------
+    def lookup(self, i, targets):
+        """
+        i. konteynerden hedeflere tablo mesafesi (km). Tabloda olmayan
+        hedefler NaN döner; çağıran kendi yedek hesabını uygular.
+        """
+        targets = np.asarray(targets, dtype=np.int64)
+        a, b = self.indptr[i], self.indptr[i + 1]
+        row = self.indices[a:b]
+        out = np.full(len(targets), np.nan, dtype=np.float32)
+        if b == a or len(targets) == 0:
+            return out
+        pos = np.searchsorted(row, targets)
+        pos_c = np.minimum(pos, len(row) - 1)
+        hit = row[pos_c] == targets
+        out[hit] = self.dist_km[a + pos_c[hit]]
+        return out
+
+    def pair_lookup(self, rows, targets):
+        """
+        (rows[i], targets[i]) çiftleri için tablo mesafesi (km), tek seferde.
+        Satırlar eşit uzunlukta (k) olduğundan indeksler (n, k) olarak
+        görülür; tabloda olmayan çiftler NaN döner.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        out = np.full(rows.shape, np.nan, dtype=np.float32)
+        k = self.meta["k"]
+        if k == 0 or rows.size == 0:
+            return out
+        # Tabloda satırı olmayan konteyner (gid < 0) hiçbir çifte eşleşmez
+        nbr = self.indices.reshape(self.n, k)[np.maximum(rows, 0)]
+        hit = (nbr == targets[..., None]) & (rows >= 0)[..., None]
+        found = hit.any(axis=-1)
+        pos = np.argmax(hit, axis=-1)
+        out[found] = self.dist_km.reshape(self.n, k)[rows[found], pos[found]]
+        return out
+
+    def estimate(self, rows, targets, straight_km):
+        """
+        Tabloda olmayan (rows[i], targets[i]) çiftleri için sürüş mesafesi
+        tahmini (km): kuş uçuşu mesafe × mahalle çiftinin dolanma oranı.
+        straight_km, çağıranın kendi kuş uçuşu mesafesidir (katsayısız).
+        Tabloda satırı olmayan konteynerde (gid < 0) sabit katsayı kullanılır.
+        """
+        rows, targets = np.broadcast_arrays(np.asarray(rows, dtype=np.int64), np.asarray(targets, dtype=np.int64))
+        known = (rows >= 0) & (targets >= 0)
+        factor = np.where(known, self.detour[self.mahalle_code[np.maximum(rows, 0)],
+                                             self.mahalle_code[np.maximum(targets, 0)]], STRAIGHT_LINE_FACTOR)
+        return np.asarray(straight_km, dtype=np.float64) * factor
+
+
+def load_or_build_tables(base_path, lats, lons, mahalles, widths, graph=None, nodes=None,
+                         snap_km=None, k=DEFAULT_K, rebuild=False):
+    """
+    {min_width: ContainerDistanceTable} - her genişlik için base_path/w<genişlik>
+    klasöründen mmap ile açar; yoksa, konteyner sayısı değiştiyse veya
+    rebuild istenirse kurup kaydeder.
+    """
+    tables = {}
+    for w in widths:
+        path = Path(base_path) / f"w{float(w):g}"
+        table = None if rebuild else ContainerDistanceTable.load(path)
+        if table is None or table.n != len(lats) or table.meta["k"] != min(k, max(len(lats) - 1, 0)):
+            table = ContainerDistanceTable.build(lats, lons, mahalles, graph, nodes, snap_km,
+                                                 min_width=w, k=k)
+            table.save(path)
+            table = ContainerDistanceTable.load(path)
+        tables[float(w)] = table
+    return tables
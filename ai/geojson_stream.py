@@ -0,0 +1,199 @@
+"""
+Akışlı GeoJSON Okuyucu
+Büyük yol dosyalarını (Yol-*.json) tamamını belleğe almadan, özellik
+özellik okur. Dosya parça parça okunur ve "features" dizisindeki her
+nesne json.JSONDecoder.raw_decode ile tek tek çözülür; böylece bellekte
+aynı anda sadece o anki parça ve tek bir özellik bulunur.
+
+read_road_lines() koordinatları ve 'Genişlik(m)' değerini doğrudan
+büyüyebilen numpy dizilerine yazar; StreetWidthManager ve RoadGraph
+ikisi de bu çıktıyı kullanır.
+"""
+
+import codecs
+import json
+import os
+import re
+import numpy as np
+
+CHUNK_SIZE = 1 << 20
+DEFAULT_WIDTH_M = 6.0
+WIDTH_PROPERTY = 'Genişlik(m)'
+
+_FEATURES_KEY = re.compile(r'"features"\s*:\s*\[')
+_SKIP = re.compile(r'[\s,]*')
+
+
+def parse_width(value):
+    """'Genişlik(m)' alanını metreye çevir - 0 veya aşırı değerler varsayılana düşer"""
+    try:
+        width = float(str(value).replace(',', '.'))
+    except (TypeError, ValueError):
+        return DEFAULT_WIDTH_M
+    if width <= 0 or width > 50:
+        return DEFAULT_WIDTH_M
+    return width
+
+
+class GrowableArray:
+    """Kapasitesi ikiye katlanarak büyüyen tek boyutlu numpy tamponu"""
+
+    def __init__(self, dtype, capacity=1024):
+        self._data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def _reserve(self, n):
+        if self.size + n > len(self._data):
+            new_cap = max(len(self._data) * 2, self.size + n)
+            data = np.empty(new_cap, dtype=self._data.dtype)
+            data[:self.size] = self._data[:self.size]
+            self._data = data
+
+    def append(self, value):
+        self._reserve(1)
+        self._data[self.size] = value
+        self.size += 1
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        self._reserve(len(values))
+        self._data[self.size:self.size + len(values)] = values
+        self.size += len(values)
+
+    def to_array(self):
+        """Dolu kısmın kopyası (fazla kapasite bırakılır)"""
+        return self._data[:self.size].copy()
+
+
+class _Progress:
+    """Okunan bayt oranını %10'luk adımlarla yazdırır"""
+
+    def __init__(self, total, label, enabled):
+        self.total = max(total, 1)
+        self.label = label
+        self.enabled = enabled
+        self.next_step = 10
+
+    def update(self, done, n_features):
+        if not self.enabled:
+            return
+        # Son parça okunduğunda hâlâ çözülecek özellikler olabilir: %100 finish()'e kalır
+        pct = min(100 * done // self.total, 99)
+        if pct >= self.next_step:
+            print(f"   {self.label}: %{pct} ({n_features} özellik)")
+            while self.next_step <= pct:
+                self.next_step += 10
+
+    def finish(self, n_features):
+        if self.enabled:
+            print(f"   {self.label}: %100 ({n_features} özellik)")
+
+
+def iter_features(path, chunk_size=CHUNK_SIZE, progress=False, label="GeoJSON"):
+    """
+    GeoJSON FeatureCollection'daki özellikleri (dict) sırayla üret.
+    progress=True ise okunan bayt oranı %10 adımlarla yazdırılır.
+    """
+    decoder = json.JSONDecoder()
+    total = os.path.getsize(path)
+    meter = _Progress(total, label, progress)
+    n_features = 0
+
+    with open(path, 'rb') as f:
+        utf8 = codecs.getincrementaldecoder('utf-8')()
+        bytes_read = 0
+
+        def read_chunk():
+            nonlocal bytes_read
+            raw = f.read(chunk_size)
+            bytes_read += len(raw)
+            return utf8.decode(raw, final=not raw), bool(raw)
+
+        buf = ""
+        # "features": [ başlangıcını bul
+        while True:
+            chunk, more = read_chunk()
+            if not more:
+                return
+            buf += chunk
+            m = _FEATURES_KEY.search(buf)
+            if m:
+                buf = buf[m.end():]
+                break
+            # Anahtar parça sınırında bölünmüş olabilir
+            buf = buf[-32:]
+
+        pos = 0
+        eof = False
+        while True:
+            pos = _SKIP.match(buf, pos).end()
+            if pos < len(buf) and buf[pos] == ']':
+                meter.finish(n_features)
+                break
+            try:
+                if pos >= len(buf):
+                    raise ValueError
+                feat, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # Özellik parçanın sonunda kesilmiş: tüketilen kısmı at, yeni parça ekle
+                if eof:
+                    raise ValueError(f"GeoJSON beklenmedik şekilde bitti: {path}")
+                chunk, more = read_chunk()
+                eof = not more
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            pos = end
+            n_features += 1
+            yield feat
+            meter.update(bytes_read, n_features)
+
+
+def read_road_lines(path, properties=(), progress=True):
+    """
+    Yol GeoJSON'undaki tüm çizgileri dizi-yapısına oku.
+
+    Returns:
+        {
+          "vertex_lon", "vertex_lat": float64 köşe koordinatları (art arda),
+          "line_start": int64, i. çizgi köşeleri [line_start[i], line_start[i+1]),
+          "width": float32 çizgi başına genişlik (m),
+          <özellik adı>: çizgi başına istenen property değerleri (list)
+        }
+    MultiLineString'in her parçası ayrı çizgi olur; 2'den az köşeli çizgiler atlanır.
+    """
+    vertex_lon = GrowableArray(np.float64, 1 << 16)
+    vertex_lat = GrowableArray(np.float64, 1 << 16)
+    line_start = GrowableArray(np.int64, 1 << 12)
+    width = GrowableArray(np.float32, 1 << 12)
+    props_out = {name: [] for name in properties}
+    line_start.append(0)
+
+    for feat in iter_features(path, progress=progress, label="Yol ağı"):
+        geom = feat.get('geometry') or {}
+        props = feat.get('properties') or {}
+        if geom.get('type') == 'LineString':
+            lines = [geom['coordinates']]
+        elif geom.get('type') == 'MultiLineString':
+            lines = geom['coordinates']
+        else:
+            continue
+        w = parse_width(props.get(WIDTH_PROPERTY, DEFAULT_WIDTH_M))
+        for coords in lines:
+            if len(coords) < 2:
+                continue
+            arr = np.asarray(coords, dtype=np.float64)
+            vertex_lon.extend(arr[:, 0])
+            vertex_lat.extend(arr[:, 1])
+            line_start.append(vertex_lon.size)
+            width.append(w)
+            for name in properties:
+                props_out[name].append(props.get(name, ''))
+
+    return {
+        "vertex_lon": vertex_lon.to_array(),
+        "vertex_lat": vertex_lat.to_array(),
+        "line_start": line_start.to_array(),
+        "width": width.to_array(),
+        **props_out,
+    }
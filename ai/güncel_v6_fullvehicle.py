@@ -15,10 +15,38 @@ from pathlib import Path
 from scipy.spatial import cKDTree
 from datetime import datetime, timedelta
 from collections import defaultdict
+from dataclasses import dataclass, replace, asdict
+from typing import Optional, Tuple
+import threading
+import heapq
 import pickle
 import os
+import re
 import time
 
+try:
+    from .spatial_index import CandidateGrid
+    from .road_network import RoadGraph
+    from .distance_tables import load_or_build_tables, DEFAULT_K as DISTANCE_TABLE_K
+    from .cache_manifest import CacheManifest
+    from .geojson_stream import read_road_lines
+    from .model_training import train_from_gps, list_stop_files, stop_dates
+    from .local_search import LegMetric, RouteImprover
+    from .route_store import RouteStore, concat_routes, KIND_START, KIND_CONTAINER, KIND_UNLOAD
+    from .plan_templates import PlanTemplateStore, template_key
+    from .konteyner_verisi import normalize_text_tr, container_capacity, load_containers
+except ImportError:  # script olarak çalıştırıldığında (python güncel_v6_fullvehicle.py)
+    from spatial_index import CandidateGrid
+    from road_network import RoadGraph
+    from distance_tables import load_or_build_tables, DEFAULT_K as DISTANCE_TABLE_K
+    from cache_manifest import CacheManifest
+    from geojson_stream import read_road_lines
+    from model_training import train_from_gps, list_stop_files, stop_dates
+    from local_search import LegMetric, RouteImprover
+    from route_store import RouteStore, concat_routes, KIND_START, KIND_CONTAINER, KIND_UNLOAD
+    from plan_templates import PlanTemplateStore, template_key
+    from konteyner_verisi import normalize_text_tr, container_capacity, load_containers
+
 # ============================================================
 # PATHS & CONFIG
 # ============================================================
@@ -33,8 +61,25 @@ PATH_POP = DATA_DIR / "mahalle_nufus.csv"
 PATH_FLEET = DATA_DIR / "fleet.csv"
 PATH_START_POSITIONS = DATA_DIR / "vehicle_start_positions.json"
 PATH_MODEL = DATA_DIR / "route_ml_model_v6.pkl"
-PATH_DISTANCE_CACHE = DATA_DIR / "distance_matrix_cache_v6.pkl"
-PATH_STREET_WIDTH_CACHE = DATA_DIR / "street_width_cache.pkl"
+PATH_STREET_WIDTH_CACHE = DATA_DIR / "street_width_cache_v6"
+PATH_ROAD_GRAPH = DATA_DIR / "road_graph_v6.npz"
+PATH_DISTANCE_TABLES = DATA_DIR / "container_distances_v6"
+PATH_STREET_MAPPING_CACHE = DATA_DIR / "container_street_widths_v6.npz"
+PATH_CACHE_MANIFEST = DATA_DIR / "cache_manifest_v6.json"
+PATH_PLAN_TEMPLATES = DATA_DIR / "plan_templates_v6"
+# GPS durak kayıtları (arac_<id>_duragan.csv) - veri klasöründe yoksa proje kökünde aranır
+PATH_GPS_STOPS = DATA_DIR / "araclarin_durdugu_noktalar"
+PATH_GPS_STOPS_FALLBACK = SCRIPT_DIR.parent / "araclarin_durdugu_noktalar"
+
+# Önbellek format sürümleri - bir önbelleğin içeriği/formatı değişince artırılır,
+# manifestodaki sürümden farklı olan önbellek otomatik yeniden kurulur
+CACHE_VERSIONS = {
+    "street_widths": 2,
+    "container_streets": 2,
+    "ml_model": 3,
+    "road_graph": 1,
+    "distance_tables": 2,
+}
 
 # Config
 START_MAH = "ALAADDINBEY"
@@ -47,6 +92,8 @@ DAY_END_HOUR = 23
 PEAK_MORNING = (7, 10)
 PEAK_EVENING = (17, 20)
 POP_THRESHOLD = 15
+ROAD_SEARCH_DETOUR = 3.0  # Yol aramasında en uzak adayın kuş uçuşu mesafesinin kaç katına kadar bakılır
+ANYTIME_REPORT_SEC = 1.0  # Anytime planlamada iyileşen planın en sık bildirilme aralığı (saniye)
 
 # Araç tipi kısıtlamaları (gerçekçi değerler)
 VEHICLE_MIN_STREET_WIDTH = {
@@ -64,20 +111,6 @@ AY_MAP = {
 # ============================================================
 # HELPERS
 # ============================================================
-TR_MAP = str.maketrans({
-    "Ç":"C","Ğ":"G","İ":"I","Ö":"O","Ş":"S","Ü":"U",
-    "ç":"C","ğ":"G","i":"I","ı":"I","ö":"O","ş":"S","ü":"U",
-})
-
-def normalize_text_tr(s):
-    if pd.isna(s): return ""
-    s = str(s).strip().translate(TR_MAP).upper()
-    for suffix in [" MAHALLESI", " MAHALLESİ", " MH.", " MH"]:
-        s = s.replace(suffix, "")
-    import re
-    s = re.sub(r"[^0-9A-Z\s]", " ", s)
-    return re.sub(r"\s+", " ", s).strip()
-
 def haversine_km_vectorized(lon1, lat1, lon2, lat2):
     R = 6371.0088
     lon1, lat1, lon2, lat2 = map(np.radians, [lon1, lat1, lon2, lat2])
@@ -95,117 +128,194 @@ def is_peak_hour(hour):
 class StreetWidthManager:
     """
     Yol JSON'dan sokak genişliklerini okur.
-    Her konteyner için en yakın sokağın genişliğini bulur.
+    Her konteyner için en yakın sokak parçasının genişliğini bulur.
+
+    Veri dizi-yapısında (struct-of-arrays) tutulur:
+    - vertex_lat / vertex_lon (float64): tüm sokakların köşeleri art arda
+    - line_start (int64): i. sokağın köşeleri vertex_*[line_start[i]:line_start[i+1]]
+    - width (float32) / mahalle_code (int16): sokak başına genişlik ve mahalle kodu
+    İndeks, tüm çizgi parçalarının (uzun parçalar INDEX_PIECE_KM'lik alt
+    parçalara bölünerek) orta noktaları üzerinde bir KDTree'dir; eşleme kesin
+    nokta-doğru parçası mesafesiyle yapılır.
     """
-    
+
+    INDEX_PIECE_KM = 0.05   # İndeksteki alt parça boyu (aday arama yarıçapını sınırlar)
+    CANDIDATES = 8          # İlk turda kesin mesafesi hesaplanan aday parça sayısı
+    _ARRAYS = ("vertex_lat", "vertex_lon", "line_start", "width", "mahalle_code")
+
     def __init__(self):
-        self.street_segments = []  # [(lat1, lon1, lat2, lon2, width_m, mahalle), ...]
-        self.container_widths = {}  # {container_idx: width_m}
+        self.vertex_lat = np.empty(0)
+        self.vertex_lon = np.empty(0)
+        self.line_start = np.zeros(1, dtype=np.int64)
+        self.width = np.empty(0, dtype=np.float32)
+        self.mahalle_code = np.empty(0, dtype=np.int16)
+        self.mahalle_names = []
         self.kdtree = None
-        self.segment_coords = None
-        
+
+    @property
+    def n_segments(self):
+        return len(self.width)
+
+    def road_lines(self):
+        """geojson_stream.read_road_lines() biçiminde çizgi dizileri (yol grafı kurulumu için)"""
+        return {"vertex_lat": self.vertex_lat, "vertex_lon": self.vertex_lon,
+                "line_start": self.line_start, "width": self.width}
+
     def load_from_geojson(self, path):
         """GeoJSON'dan sokak genişliklerini yükle"""
         print("🛣️ Sokak genişlikleri yükleniyor...")
         
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # Akışlı okuma: koordinatlar ve genişlikler doğrudan dizilere yazılır
+        lines = read_road_lines(path, properties=('İdari Mahalle Adı',))
         
-        centroids = []  # Segment ortaları için KDTree
+        self.vertex_lat = lines["vertex_lat"]
+        self.vertex_lon = lines["vertex_lon"]
+        self.line_start = lines["line_start"]
+        self.width = lines["width"]
         
-        for feat in data['features']:
-            props = feat.get('properties', {})
-            geom = feat['geometry']
-            
-            # Genişlik - 0 veya çok büyük değerleri düzelt
-            width_str = props.get('Genişlik(m)', '6')
-            try:
-                width = float(str(width_str).replace(',', '.'))
-                # Veri temizleme: 0 veya aşırı değerleri düzelt
-                if width <= 0 or width > 50:
-                    width = 6.0  # Varsayılan normal sokak
-            except:
-                width = 6.0  # Varsayılan
-            
-            mahalle = normalize_text_tr(props.get('İdari Mahalle Adı', ''))
-            
-            if geom['type'] == 'LineString':
-                coords = geom['coordinates']
-            elif geom['type'] == 'MultiLineString':
-                coords = [c for line in geom['coordinates'] for c in line]
-            else:
-                continue
-            
-            # Segment ortasını kaydet
-            if len(coords) >= 2:
-                mid_idx = len(coords) // 2
-                mid_lon, mid_lat = coords[mid_idx]
-                centroids.append((mid_lat, mid_lon))
-                self.street_segments.append({
-                    'lat': mid_lat,
-                    'lon': mid_lon,
-                    'width': width,
-                    'mahalle': mahalle
-                })
-        
-        # KDTree oluştur
-        self.segment_coords = np.array(centroids)
-        self.kdtree = cKDTree(self.segment_coords)
-        
-        print(f"✅ {len(self.street_segments)} sokak segmenti yüklendi")
+        # Mahalle adları kategorik koda çevrilir
+        mahalle_index = {}
+        self.mahalle_code = np.array(
+            [mahalle_index.setdefault(normalize_text_tr(m), len(mahalle_index)) for m in lines['İdari Mahalle Adı']],
+            dtype=np.int16)
+        self.mahalle_names = list(mahalle_index)
+        
+        self._build_index()
+        
+        print(f"✅ {self.n_segments} sokak segmenti yüklendi ({len(self.vertex_lat)} köşe)")
         
         # İstatistikler
-        widths = [s['width'] for s in self.street_segments]
-        print(f"   Genişlik: min={min(widths):.1f}m, max={max(widths):.1f}m, ort={np.mean(widths):.1f}m")
-        narrow = sum(1 for w in widths if w < 5)
+        widths = self.width
+        print(f"   Genişlik: min={widths.min():.1f}m, max={widths.max():.1f}m, ort={widths.mean():.1f}m")
+        narrow = int((widths < 5).sum())
         print(f"   Dar sokak (<5m): {narrow} ({100*narrow/len(widths):.1f}%)")
     
+    def _build_index(self):
+        """Çizgi parçalarını (uzunları bölerek) km projeksiyonunda indeksle"""
+        if self.n_segments == 0:
+            self.kdtree = None
+            return
+        self._kx = 111.320 * np.cos(np.radians(float(np.mean(self.vertex_lat))))
+        x = np.asarray(self.vertex_lon) * self._kx
+        y = np.asarray(self.vertex_lat) * 110.574
+        
+        # Parça = aynı sokaktaki ardışık iki köşe
+        a = np.arange(len(x) - 1)
+        a = a[~np.isin(a + 1, self.line_start)]
+        piece_line = np.searchsorted(self.line_start, a, side='right') - 1
+        length = np.hypot(x[a + 1] - x[a], y[a + 1] - y[a])
+        
+        # Uzun parçaları alt parçalara böl: aday arama yarıçapı en fazla yarım alt parça kadar büyür
+        n_sub = np.maximum(np.ceil(length / self.INDEX_PIECE_KM).astype(np.int64), 1)
+        rep = np.repeat(np.arange(len(a)), n_sub)
+        j = np.arange(len(rep)) - np.repeat(np.cumsum(n_sub) - n_sub, n_sub)
+        t0 = j / n_sub[rep]
+        t1 = (j + 1) / n_sub[rep]
+        dx, dy = x[a + 1] - x[a], y[a + 1] - y[a]
+        self._ax = x[a][rep] + t0 * dx[rep]
+        self._ay = y[a][rep] + t0 * dy[rep]
+        self._bx = x[a][rep] + t1 * dx[rep]
+        self._by = y[a][rep] + t1 * dy[rep]
+        self._piece_line = piece_line[rep]
+        self._max_half = float(np.max(length / n_sub)) / 2 if len(a) else 0.0
+        self.kdtree = cKDTree(np.column_stack([(self._ax + self._bx) / 2, (self._ay + self._by) / 2]))
+    
+    def _segment_distance(self, px, py, pieces):
+        """Noktalardan parçalara kesin mesafe (km); px/py ve pieces yayınlanabilir şekilde"""
+        ax, ay = self._ax[pieces], self._ay[pieces]
+        dx, dy = self._bx[pieces] - ax, self._by[pieces] - ay
+        len2 = dx * dx + dy * dy
+        t = np.clip(((px - ax) * dx + (py - ay) * dy) / np.where(len2 > 0, len2, 1.0), 0.0, 1.0)
+        return np.hypot(px - (ax + t * dx), py - (ay + t * dy))
+    
+    def nearest_segments(self, lats, lons):
+        """Her nokta için en yakın sokağın indeksi ve km cinsinden mesafesi"""
+        px = np.asarray(lons, dtype=np.float64) * self._kx
+        py = np.asarray(lats, dtype=np.float64) * 110.574
+        k = min(self.CANDIDATES, self.kdtree.n)
+        mid_d, cand = self.kdtree.query(np.column_stack([px, py]), k=k)
+        mid_d, cand = mid_d.reshape(len(px), k), cand.reshape(len(px), k)
+        d = self._segment_distance(px[:, None], py[:, None], cand)
+        best = np.argmin(d, axis=1)
+        rows = np.arange(len(px))
+        best_piece = cand[rows, best]
+        best_d = d[rows, best]
+        
+        # Orta noktası best_d + max_half'tan uzak parça daha yakın olamaz; k aday
+        # bu yarıçapı kapsamıyorsa o noktalar için yarıçap içindeki tüm parçalara bakılır
+        if k < self.kdtree.n:
+            for r in np.flatnonzero(mid_d[:, -1] < best_d + self._max_half):
+                ball = np.asarray(self.kdtree.query_ball_point([px[r], py[r]], best_d[r] + self._max_half))
+                dd = self._segment_distance(px[r], py[r], ball)
+                i = np.argmin(dd)
+                best_piece[r], best_d[r] = ball[i], dd[i]
+        return self._piece_line[best_piece], best_d
+    
     def get_street_width(self, lat, lon):
         """Verilen koordinata en yakın sokağın genişliğini döndür"""
         if self.kdtree is None:
             return 10.0  # Varsayılan
         
-        _, idx = self.kdtree.query([lat, lon])
-        return self.street_segments[idx]['width']
+        line, _ = self.nearest_segments([lat], [lon])
+        return float(self.width[line[0]])
     
-    def map_containers_to_streets(self, containers_df):
-        """Her konteyner için en yakın sokak genişliğini bul"""
+    def map_containers_to_streets(self, containers_df, known_widths=None):
+        """
+        Her konteyner için en yakın sokak genişliğini bul.
+        known_widths: {(lat, lon): genişlik} önceki eşleme; verilirse sadece
+        yeni konumdaki konteynerler sorgulanır.
+
+        Returns:
+            (containers_df, yeni eşlenen konteyner sayısı)
+        """
         print("📍 Konteynerler sokaklara eşleniyor...")
         
         lats = containers_df['lat'].values
         lons = containers_df['lon'].values
-        coords = np.column_stack([lats, lons])
         
-        # Toplu KDTree sorgusu
-        _, indices = self.kdtree.query(coords)
+        widths = np.empty(len(containers_df))
+        known_widths = known_widths or {}
+        keys = list(zip(lats.tolist(), lons.tolist()))
+        found = np.array([k in known_widths for k in keys], dtype=bool)
+        if found.any():
+            widths[found] = [known_widths[k] for k, f in zip(keys, found) if f]
         
-        widths = []
-        for idx in indices:
-            widths.append(self.street_segments[idx]['width'])
+        # Toplu parça sorgusu (sadece yeni konumlar)
+        new = ~found
+        if new.any():
+            lines, _ = self.nearest_segments(lats[new], lons[new])
+            widths[new] = self.width[lines]
         
         containers_df['street_width'] = widths
         
         # İstatistik
         narrow_containers = (containers_df['street_width'] < 5).sum()
-        print(f"✅ {len(containers_df)} konteyner eşlendi")
+        print(f"✅ {len(containers_df)} konteyner eşlendi ({int(new.sum())} yeni)")
         print(f"   Dar sokaktaki konteyner (<5m): {narrow_containers} ({100*narrow_containers/len(containers_df):.1f}%)")
         
-        return containers_df
+        return containers_df, int(new.sum())
     
     def save(self, path):
-        with open(path, 'wb') as f:
-            pickle.dump({
-                'street_segments': self.street_segments,
-                'segment_coords': self.segment_coords
-            }, f)
+        """Dizileri path klasörüne .npy olarak yaz (mmap ile açılabilir)"""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        (path / "meta.json").unlink(missing_ok=True)
+        for name in self._ARRAYS:
+            tmp = path / f"{name}.npy.tmp"
+            with open(tmp, 'wb') as f:
+                np.save(f, np.ascontiguousarray(getattr(self, name)))
+            os.replace(tmp, path / f"{name}.npy")
+        with open(path / "meta.json", 'w', encoding='utf-8') as f:
+            json.dump({"mahalle_names": self.mahalle_names}, f, ensure_ascii=False)
     
     def load(self, path):
-        if os.path.exists(path):
-            with open(path, 'rb') as f:
-                data = pickle.load(f)
-                self.street_segments = data['street_segments']
-                self.segment_coords = data['segment_coords']
-                self.kdtree = cKDTree(self.segment_coords)
+        path = Path(path)
+        if (path / "meta.json").exists():
+            with open(path / "meta.json", 'r', encoding='utf-8') as f:
+                self.mahalle_names = json.load(f)["mahalle_names"]
+            for name in self._ARRAYS:
+                setattr(self, name, np.load(path / f"{name}.npy", mmap_mode="r"))
+            self._build_index()
             return True
         return False
 
@@ -277,25 +387,34 @@ class VehicleTypeManager:
         
         return True, "OK"
     
-    def get_accessible_mask(self, vehicle_row, containers_df):
+    def build_access_table(self, is_underground, street_widths):
         """
-        Aracın erişebileceği konteynerlerin mask'ini döndür (vectorized)
+        Günün konteynerleri için kategori bazlı erişim maskeleri.
+        Kurallar gün başında bir kez uygulanır; planlama döngüsü bu maskeleri
+        dilim maskeleriyle önceden ayrılmış tamponlarda kesiştirir.
+
+        Returns:
+            {kategori: {"mask", "skipped_underground", "skipped_narrow"}}
+            skipped_* alanları o kategorinin günün konteynerlerinden kaçına
+            hangi kural yüzünden erişemediğini verir.
         """
-        vehicle_cat = vehicle_row['vehicle_category']
-        min_width = vehicle_row['min_street_width']
-        
-        # Başlangıçta hepsi erişilebilir
-        mask = np.ones(len(containers_df), dtype=bool)
-        
-        # Yeraltı kontrolü - sadece CRANE
-        if vehicle_cat != 'CRANE':
-            mask &= ~containers_df['is_underground'].values
-        
-        # Sokak genişliği kontrolü
-        if 'street_width' in containers_df.columns:
-            mask &= containers_df['street_width'].values >= min_width
-        
-        return mask
+        is_underground = np.asarray(is_underground, dtype=bool)
+        street_widths = np.asarray(street_widths, dtype=np.float64)
+        table = {}
+        for cat, min_width in VEHICLE_MIN_STREET_WIDTH.items():
+            # Yeraltı kontrolü - sadece CRANE
+            mask = np.ones(len(is_underground), dtype=bool) if cat == 'CRANE' else ~is_underground
+            skipped_underground = len(is_underground) - int(np.count_nonzero(mask))
+            # Sokak genişliği kontrolü
+            street_ok = street_widths >= min_width
+            skipped_narrow = int(np.count_nonzero(mask & ~street_ok))
+            mask &= street_ok
+            table[cat] = {
+                "mask": mask,
+                "skipped_underground": skipped_underground,
+                "skipped_narrow": skipped_narrow,
+            }
+        return table
 
 # ============================================================
 # TONNAGE MANAGER (v4'ten)
@@ -366,69 +485,31 @@ class TonnageManager:
         return mah_tonnage
     
     def distribute_to_containers(self, containers_df, mah_tonnage):
-        containers_df = containers_df.copy()
-        
-        def get_capacity_vectorized(tips):
-            caps = np.zeros(len(tips))
-            tip_arr = tips.astype(str).str.upper()
-            caps[tip_arr.str.contains("YERALTI", na=False)] = 3.0
-            mask_770 = tip_arr.str.contains("770", na=False) & ~tip_arr.str.contains("YERALTI", na=False)
-            caps[mask_770] = 0.77 * 0.25
-            mask_400 = tip_arr.str.contains("400", na=False) & ~tip_arr.str.contains("YERALTI", na=False)
-            caps[mask_400] = 0.40 * 0.25
-            caps[caps == 0] = 0.5 * 0.25
-            return caps
-        
-        containers_df["container_capacity"] = get_capacity_vectorized(containers_df["tip_norm"])
-        mah_total_cap = containers_df.groupby("mahalle_norm")["container_capacity"].transform("sum")
-        containers_df["mah_tonnage"] = containers_df["mahalle_norm"].map(mah_tonnage).fillna(0)
-        containers_df["ratio"] = containers_df["container_capacity"] / mah_total_cap.replace(0, 1)
-        containers_df["demand_ton"] = containers_df["mah_tonnage"] * containers_df["ratio"]
-        containers_df["demand_ton"] = np.minimum(containers_df["demand_ton"], containers_df["container_capacity"] * 0.8)
-        containers_df["demand_ton"] = np.maximum(containers_df["demand_ton"], containers_df["container_capacity"] * 0.3)
-        
-        return containers_df
+        """
+        Mahalle tonajını konteynerlere kapasite oranında dağıt. containers_df
+        yerinde güncellenir (demand_ton). Kapasite ve mahalle kodu yüklemede
+        hesaplandıysa (load_containers) tekrar hesaplanmaz.
+        """
+        if "container_capacity" not in containers_df:
+            containers_df["container_capacity"] = container_capacity(containers_df["tip_norm"].values)
+        if "mahalle_code" not in containers_df:
+            containers_df["mahalle_code"] = pd.factorize(containers_df["mahalle_norm"])[0].astype(np.int32)
+        caps = containers_df["container_capacity"].values
+        codes = containers_df["mahalle_code"].values
+        if len(codes) == 0:
+            containers_df["demand_ton"] = np.zeros(0)
+            return containers_df
 
-# ============================================================
-# FAST DISTANCE MATRIX
-# ============================================================
-class FastDistanceMatrix:
-    def __init__(self):
-        self.matrix = {}
-        self.centroids = {}
-        
-    def build(self, containers_df):
-        print("📐 Mesafe matrisi oluşturuluyor...")
-        centroids = containers_df.groupby("mahalle_norm").agg({
-            "lat": "mean", "lon": "mean"
-        }).to_dict('index')
-        
-        self.centroids = {m: (v["lat"], v["lon"]) for m, v in centroids.items()}
-        mahalles = list(self.centroids.keys())
-        
-        for i, m1 in enumerate(mahalles):
-            for j, m2 in enumerate(mahalles):
-                if i <= j:
-                    lat1, lon1 = self.centroids[m1]
-                    lat2, lon2 = self.centroids[m2]
-                    dist = haversine_km_vectorized(lon1, lat1, lon2, lat2) * 1.3
-                    self.matrix[(m1, m2)] = dist
-                    self.matrix[(m2, m1)] = dist
-        
-        print(f"✅ Mesafe matrisi: {len(mahalles)} mahalle")
-        
-    def save(self, path):
-        with open(path, 'wb') as f:
-            pickle.dump({'matrix': self.matrix, 'centroids': self.centroids}, f)
-            
-    def load(self, path):
-        if os.path.exists(path):
-            with open(path, 'rb') as f:
-                data = pickle.load(f)
-                self.matrix = data['matrix']
-                self.centroids = data['centroids']
-            return True
-        return False
+        # Mahalle başına toplam kapasite ve tonaj kod dizileri üzerinden
+        present, first = np.unique(codes, return_index=True)
+        names = containers_df["mahalle_norm"].values[first]
+        mah_ton = np.zeros(int(present[-1]) + 1)
+        mah_ton[present] = [mah_tonnage.get(m, 0.0) for m in names]
+        mah_total_cap = np.bincount(codes, weights=caps, minlength=len(mah_ton))
+        ratio = caps / np.where(mah_total_cap == 0, 1.0, mah_total_cap)[codes]
+        demand = np.minimum(mah_ton[codes] * ratio, caps * 0.8)
+        containers_df["demand_ton"] = np.maximum(demand, caps * 0.3)
+        return containers_df
 
 # ============================================================
 # ML ROUTE OPTIMIZER
@@ -437,7 +518,9 @@ class MLRouteOptimizer:
     def __init__(self):
         self.weights = None
         self.trained = False
-        
+        self.version = 0
+        self.metrics = {}
+
     def initialize_weights(self):
         self.weights = np.array([
             -2.0,    # 0: mesafe (yakın tercih)
@@ -451,110 +534,177 @@ class MLRouteOptimizer:
         ])
         self.trained = True
         
-    def train(self):
+    def train(self, stop_files=None, shared=None, workers=None):
+        """
+        GPS durak dosyaları ve paylaşılan konteyner dizileri (bkz.
+        PlannerContext.training_inputs) verilirse ağırlıklar gerçek araç
+        kararlarından öğrenilir; yoksa başlangıç ağırlıkları kullanılır.
+        """
         print("🧠 ML Model eğitiliyor...")
         self.initialize_weights()
-        noise = np.random.normal(0, 0.05, len(self.weights))
-        self.weights += noise
+        if stop_files and shared is not None:
+            self.weights, self.metrics = train_from_gps(stop_files, shared, self.weights, workers)
+        else:
+            noise = np.random.normal(0, 0.05, len(self.weights))
+            self.weights += noise
+            self.metrics = {"decisions": 0}
         print(f"✅ Model ağırlıkları: {self.weights.round(2)}")
         return self
-    
+
     def predict_scores_batch(self, features):
         if not self.trained:
             self.initialize_weights()
         return np.dot(features, self.weights)
-    
-    def save(self, path):
-        with open(path, 'wb') as f:
-            pickle.dump({'weights': self.weights, 'trained': self.trained}, f)
-            
+
+    def save(self, path, versioned=True):
+        """
+        Ağırlıkları kaydet. versioned=True ise aynı klasöre
+        route_ml_model_v6.v<N>.pkl olarak sürümlü bir kopya da yazılır;
+        ana dosya her zaman son sürümdür.
+        """
+        path = Path(path)
+        if versioned:
+            pattern = re.compile(rf"^{re.escape(path.stem)}\.v(\d+){re.escape(path.suffix)}$")
+            known = [int(m.group(1)) for f in path.parent.glob(f"{path.stem}.v*{path.suffix}")
+                     if (m := pattern.match(f.name))]
+            self.version = max(known, default=0) + 1
+        data = {
+            'weights': self.weights, 'trained': self.trained,
+            'version': self.version, 'metrics': self.metrics,
+            'trained_at': datetime.now().isoformat(timespec="seconds"),
+        }
+        targets = [path.with_name(f"{path.stem}.v{self.version}{path.suffix}"), path] if versioned else [path]
+        for target in targets:
+            with open(target, 'wb') as f:
+                pickle.dump(data, f)
+
     def load(self, path):
         if os.path.exists(path):
             with open(path, 'rb') as f:
                 data = pickle.load(f)
                 self.weights = data['weights']
                 self.trained = data['trained']
+                self.version = data.get('version', 0)
+                self.metrics = data.get('metrics', {})
             # Eski model 7 ağırlık, yeni 8 ağırlık
             if len(self.weights) < 8:
                 self.weights = np.append(self.weights, 2.0)
             return True
         return False
 
+
 # ============================================================
-# VERİ YÜKLEMELERİ
+# PLANLAMA KONFİGÜRASYONU
 # ============================================================
-print("="*60)
-print("📦 VERİLER YÜKLENİYOR - TAM ARAÇ YÖNETİMİ")
-print("="*60)
-start_load = time.time()
-
-# Konteynerler
-containers_df = pd.read_csv(PATH_CONTAINERS_DETAIL)
-containers_df.columns = [c.strip().lower() for c in containers_df.columns]
-lat_col = next((c for c in containers_df.columns if 'lat' in c or 'enlem' in c), None)
-lon_col = next((c for c in containers_df.columns if 'lon' in c or 'boylam' in c), None)
-mah_col = next((c for c in containers_df.columns if 'mahalle' in c), None)
-tip_col = next((c for c in containers_df.columns if 'tip' in c or 'type' in c), None)
-
-containers_df = containers_df.dropna(subset=[lat_col, lon_col])
-containers_df["lat"] = pd.to_numeric(containers_df[lat_col], errors="coerce")
-containers_df["lon"] = pd.to_numeric(containers_df[lon_col], errors="coerce")
-containers_df = containers_df.dropna(subset=["lat", "lon"])
-containers_df["mahalle_norm"] = containers_df[mah_col].apply(normalize_text_tr) if mah_col else "UNKNOWN"
-containers_df["tip_norm"] = containers_df[tip_col].apply(lambda x: str(x).upper().strip() if pd.notna(x) else "UNKNOWN") if tip_col else "UNKNOWN"
-containers_df["is_collectible"] = ~containers_df["tip_norm"].str.contains("BILINMIYOR|UNKNOWN", case=False, na=True)
-containers_df["is_underground"] = containers_df["tip_norm"].str.contains("YERALTI", case=False, na=False)
-
-print(f"✅ Konteyner: {len(containers_df)} (toplanabilir: {containers_df['is_collectible'].sum()}, yeraltı: {containers_df['is_underground'].sum()})")
-
-# Nüfus
-pop_df = pd.read_csv(PATH_POP, sep=";")
-pop_df["mahalle_norm"] = pop_df["mahalle"].apply(normalize_text_tr)
-pop_map = pop_df.set_index("mahalle_norm")["nufus"].to_dict()
-containers_df["nufus"] = containers_df["mahalle_norm"].map(pop_map).fillna(0)
-containers_df["is_high_pop"] = containers_df["nufus"] >= POP_THRESHOLD
-
-# Filo
-fleet_df = pd.read_csv(PATH_FLEET)
-fleet_df["vehicle_type_norm"] = fleet_df["vehicle_type"].apply(lambda x: str(x).upper().strip())
-fleet_df["is_crane"] = fleet_df["vehicle_type_norm"].str.contains("CRANE", case=False)
-print(f"✅ Filo: {len(fleet_df)} araç (Crane: {fleet_df['is_crane'].sum()})")
-
-# Araç Başlangıç Konumları
-VEHICLE_START_POSITIONS = {}
-if PATH_START_POSITIONS.exists():
-    with open(PATH_START_POSITIONS, 'r', encoding='utf-8') as f:
+@dataclass(frozen=True)
+class PlannerConfig:
+    """
+    Tek bir planlama çağrısının parametreleri.
+    Değiştirilemez (frozen) olduğu için aynı süreçte farklı konfigürasyonlar
+    global state'e dokunmadan paralel çalışabilir.
+    """
+    start_mah: str = START_MAH
+    unload_mah: str = UNLOAD_MAH
+    unload_pos: Optional[Tuple[float, float]] = None  # (lat, lon) - None ise unload_mah'tan bulunur
+    unload_wait_min: float = UNLOAD_WAIT_MIN
+    avg_speed_kmh: float = AVG_SPEED_KMH
+    container_service_sec: float = CONTAINER_SERVICE_SEC
+    day_start_hour: int = DAY_START_HOUR
+    day_end_hour: int = DAY_END_HOUR
+    peak_morning: Tuple[int, int] = PEAK_MORNING
+    peak_evening: Tuple[int, int] = PEAK_EVENING
+    candidate_k: int = 64  # Her adımda skorlanan en yakın aday sayısı (0 = tüm konteynerler)
+    road_distances: bool = False  # Yol grafı varsa kuş uçuşu × 1.3 yerine gerçek sürüş mesafesi
+    local_search_sec: float = 0.0  # > 0 ise greedy plan bu kadar saniye yerel aramayla iyileştirilir
+    plan_templates: bool = False  # Haftanın günü şablonunu yeni taleplerle onar, olmazsa tam plan
+    verbose: bool = True
+
+    def is_peak_hour(self, hour):
+        return (self.peak_morning[0] <= hour < self.peak_morning[1]) or (self.peak_evening[0] <= hour < self.peak_evening[1])
+
+    def time_slots(self, day_low_pop, day_high_pop):
+        """Zaman dilimleri: (başlangıç, bitiş, izinli mahalleler, isim)"""
+        return [
+            (self.day_start_hour, self.peak_morning[0], day_low_pop + day_high_pop, "Erken"),
+            (self.peak_morning[0], self.peak_morning[1], day_low_pop, "Sabah Peak"),
+            (self.peak_morning[1], self.peak_evening[0], day_low_pop + day_high_pop, "Gündüz"),
+            (self.peak_evening[0], self.peak_evening[1], day_low_pop, "Akşam Peak"),
+            (self.peak_evening[1], self.day_end_hour, day_high_pop, "Gece"),
+        ]
+
+    def slot_group_table(self):
+        """(48, 2) tablo: o saatte [düşük, yüksek] nüfuslu konteynere dilim kuralınca izin var mı"""
+        table = np.ones((48, 2), dtype=bool)
+        for start, end, allowed, _ in self.time_slots(["LOW"], ["HIGH"]):
+            table[start:end] = ["LOW" in allowed, "HIGH" in allowed]
+        return table
+
+DEFAULT_CONFIG = PlannerConfig()
+
+# ============================================================
+# VERİ YÜKLEYİCİLER
+# ============================================================
+def data_paths(data_dir=None):
+    """Veri klasörüne göre tüm dosya yollarını döndür (varsayılan: DATA_DIR)"""
+    base = Path(data_dir) if data_dir is not None else DATA_DIR
+    gps_stops = base / PATH_GPS_STOPS.name
+    return {
+        "containers": base / PATH_CONTAINERS_DETAIL.relative_to(DATA_DIR),
+        "road": base / PATH_ROAD.name,
+        "rot": base / PATH_ROT.name,
+        "tonnages": base / PATH_TONNAGES.name,
+        "pop": base / PATH_POP.name,
+        "fleet": base / PATH_FLEET.name,
+        "start_positions": base / PATH_START_POSITIONS.name,
+        "model": base / PATH_MODEL.name,
+        "street_width_cache": base / PATH_STREET_WIDTH_CACHE.name,
+        "road_graph": base / PATH_ROAD_GRAPH.name,
+        "distance_tables": base / PATH_DISTANCE_TABLES.name,
+        "street_mapping_cache": base / PATH_STREET_MAPPING_CACHE.name,
+        "manifest": base / PATH_CACHE_MANIFEST.name,
+        "plan_templates": base / PATH_PLAN_TEMPLATES.name,
+        "gps_stops": gps_stops if gps_stops.exists() else PATH_GPS_STOPS_FALLBACK,
+    }
+
+def load_population(path):
+    pop_df = pd.read_csv(path, sep=";")
+    pop_df["mahalle_norm"] = pop_df["mahalle"].apply(normalize_text_tr)
+    return pop_df
+
+def load_fleet(path):
+    fleet_df = pd.read_csv(path)
+    fleet_df["vehicle_type_norm"] = fleet_df["vehicle_type"].apply(lambda x: str(x).upper().strip())
+    fleet_df["is_crane"] = fleet_df["vehicle_type_norm"].str.contains("CRANE", case=False)
+    return fleet_df
+
+def load_start_positions(path):
+    """Araç başlangıç konumları: ({vehicle_id: {lat, lon, mahalle}}, ham JSON)"""
+    positions = {}
+    if not Path(path).exists():
+        return positions, None
+    with open(path, 'r', encoding='utf-8') as f:
         start_data = json.load(f)
     for v in start_data['vehicles']:
-        VEHICLE_START_POSITIONS[v['vehicle_id']] = {
+        positions[v['vehicle_id']] = {
             'lat': v['start_position']['lat'],
             'lon': v['start_position']['lon'],
             'mahalle': v['start_position']['mahalle']
         }
-    print(f"✅ Başlangıç konumları: {len(VEHICLE_START_POSITIONS)} araç (Referans: {start_data['reference_date']} {start_data['reference_time']})")
-    # Sadece start positions'da olan araçları filtrele
-    fleet_df = fleet_df[fleet_df['vehicle_id'].isin(VEHICLE_START_POSITIONS.keys())].reset_index(drop=True)
-    print(f"   Aktif araç sayısı: {len(fleet_df)}")
-else:
-    print("⚠️ Başlangıç konumları bulunamadı, varsayılan kullanılacak")
-
-# Sokak genişliği
-street_mgr = StreetWidthManager()
-if not street_mgr.load(PATH_STREET_WIDTH_CACHE):
-    street_mgr.load_from_geojson(PATH_ROAD)
-    street_mgr.save(PATH_STREET_WIDTH_CACHE)
-else:
-    print(f"✅ Sokak genişlikleri önbellekten yüklendi ({len(street_mgr.street_segments)} segment)")
-
-# Konteynerlere sokak genişliği ekle
-containers_df = street_mgr.map_containers_to_streets(containers_df)
-
-# Araç tipi yöneticisi
-vehicle_mgr = VehicleTypeManager(fleet_df)
-
-# Gün rotasyonu
-rot_df = pd.read_csv(PATH_ROT, sep=";")
-rot_df["mahalle_norm"] = rot_df["MAHALLE ADI"].apply(normalize_text_tr)
+    return positions, start_data
+
+def load_street_mapping(path):
+    """Önceki konteyner -> sokak genişliği eşlemesi: {(lat, lon): genişlik}"""
+    if not Path(path).exists():
+        return None
+    with np.load(path) as data:
+        return dict(zip(zip(data["lat"].tolist(), data["lon"].tolist()), data["width"].tolist()))
+
+def save_street_mapping(path, containers_df):
+    with open(path, 'wb') as f:
+        np.savez(f, lat=containers_df["lat"].values.astype(np.float64),
+                 lon=containers_df["lon"].values.astype(np.float64),
+                 width=containers_df["street_width"].values.astype(np.float64))
+
 DOW_MAP = {"MONDAY": 0, "TUESDAY": 1, "WEDNESDAY": 2, "THURSDAY": 3, "FRIDAY": 4, "SATURDAY": 5, "SUNDAY": 6}
 
 def parse_days(freq_text):
@@ -564,404 +714,1214 @@ def parse_days(freq_text):
     if "NIGHT" in s: return list(range(7))
     return [idx for name, idx in DOW_MAP.items() if name in s]
 
-freq_col = next((c for c in rot_df.columns if "frequency" in c.lower()), None)
-rot_df["days_list"] = rot_df[freq_col].apply(parse_days) if freq_col else [[]] * len(rot_df)
-rot_days = rot_df.groupby("mahalle_norm")["days_list"].apply(lambda x: sorted(set(d for lst in x for d in lst))).to_dict()
+def load_rotations(path):
+    """Mahalle -> toplama günleri sözlüğü"""
+    rot_df = pd.read_csv(path, sep=";")
+    rot_df["mahalle_norm"] = rot_df["MAHALLE ADI"].apply(normalize_text_tr)
+    freq_col = next((c for c in rot_df.columns if "frequency" in c.lower()), None)
+    rot_df["days_list"] = rot_df[freq_col].apply(parse_days) if freq_col else [[]] * len(rot_df)
+    return rot_df.groupby("mahalle_norm")["days_list"].apply(lambda x: sorted(set(d for lst in x for d in lst))).to_dict()
 
-# Tonnage Manager
-tonnage_mgr = TonnageManager()
-tonnage_mgr.load_tonnages(PATH_TONNAGES)
+# ============================================================
+# PLANNER CONTEXT - Bir kez yüklenen, salt-okunur veri
+# ============================================================
+class PlannerContext:
+    """
+    Planlama için gereken tüm veriyi (konteynerler, filo, sokak genişlikleri,
+    rotasyon, tonaj, yol grafı, mesafe tabloları, ML ağırlıkları) bir kez
+    yükler ve salt-okunur olarak tutar. plan() çağrıları bu veriyi değiştirmez; böylece
+    Flask süreci, batch işler ve testler tek bir sıcak context ile çok sayıda
+    günü farklı konfigürasyonlarla planlayabilir.
+    """
 
-# Mesafe matrisi
-dist_matrix = FastDistanceMatrix()
-if not dist_matrix.load(PATH_DISTANCE_CACHE):
-    dist_matrix.build(containers_df)
-    dist_matrix.save(PATH_DISTANCE_CACHE)
+    def __init__(self, containers_df, pop_df, fleet_df, vehicle_start_positions,
+                 street_mgr, vehicle_mgr, rot_days, tonnage_mgr, ml_model,
+                 road_graph=None, distance_tables=None):
+        self.containers_df = containers_df
+        self.pop_df = pop_df
+        self.fleet_df = fleet_df
+        self.vehicle_start_positions = vehicle_start_positions
+        self.street_mgr = street_mgr
+        self.vehicle_mgr = vehicle_mgr
+        self.rot_days = rot_days
+        self.tonnage_mgr = tonnage_mgr
+        self.ml_model = ml_model
+        self.road_graph = road_graph
+        self.distance_tables = distance_tables or {}  # {min_width: ContainerDistanceTable}
+        # Yerel arama / yeniden planlamanın yol grafı sorguları: (kaynak, hedef, genişlik) -> km
+        self.road_km_cache = {}
+        # Haftalık şablon planlar; build() disk klasörü ve kaynak imzalarını ayarlar
+        self.plan_templates = PlanTemplateStore()
+        self.inputs_hash = ""
 
-# ML Model
-ml_model = MLRouteOptimizer()
-if not ml_model.load(PATH_MODEL):
-    ml_model.train()
-    ml_model.save(PATH_MODEL)
+        # Mahalle kategorileri
+        mah_stats = containers_df.groupby("mahalle_norm").agg({
+            "nufus": "first", "is_high_pop": "first"
+        }).to_dict('index')
+        self.high_pop_mahs = [m for m, v in mah_stats.items() if v.get("is_high_pop", False)]
+        self.low_pop_mahs = [m for m, v in mah_stats.items() if not v.get("is_high_pop", False)]
 
-# Mahalle kategorileri
-mah_stats = containers_df.groupby("mahalle_norm").agg({
-    "nufus": "first", "is_high_pop": "first"
-}).to_dict('index')
-high_pop_mahs = [m for m, v in mah_stats.items() if v.get("is_high_pop", False)]
-low_pop_mahs = [m for m, v in mah_stats.items() if not v.get("is_high_pop", False)]
+        # Mahalle adı -> kod; günlük maskeler kod dizileri üzerinde np.isin ile kurulur
+        self.mahalle_index = dict(zip(containers_df["mahalle_norm"].values, containers_df["mahalle_code"].values.tolist()))
+        self._mahalle_code = containers_df["mahalle_code"].values
+        self._collectible = containers_df["is_collectible"].values.astype(bool)
 
-print(f"\n⏱️ Veri yükleme: {time.time() - start_load:.2f} saniye")
+    @classmethod
+    def build(cls, data_dir=None):
+        """Tüm veriyi diskten (ve önbelleklerden) yükleyerek context oluştur"""
+        paths = data_paths(data_dir)
 
-# ============================================================
-# TAM ARAÇ YÖNETİMLİ ROTA PLANLAMA
-# ============================================================
-def plan_full_vehicle_routes(dow: int, target_date: datetime):
-    """
-    Tam araç yönetimli rota planlama:
-    - Crane → yeraltı
-    - Large → geniş sokaklar
-    - Small → dar sokaklar dahil her yer
-    - Kapasite dolunca boşaltma
-    """
-    global containers_df
-    
-    print(f"\n{'='*60}")
-    print(f"🚛 TAM ARAÇ YÖNETİMLİ ROTA - {target_date.strftime('%Y-%m-%d %A')}")
-    print(f"{'='*60}")
-    
-    # 1. Günlük tonaj hedefi
-    daily_target = tonnage_mgr.get_daily_tonnage(target_date)
-    seasonal_factor = tonnage_mgr.get_seasonal_factor(target_date.month)
-    weekday_factor = tonnage_mgr.get_weekday_factor(dow)
-    adjusted_target = daily_target * seasonal_factor * weekday_factor
-    
-    print(f"\n📊 TONAJ: {daily_target:.1f} × {seasonal_factor:.2f} × {weekday_factor:.2f} = {adjusted_target:.1f} ton")
-    
-    # 2. O gün toplanacak mahalleler
-    day_neighborhoods = [m for m, days in rot_days.items() if dow in days]
-    if not day_neighborhoods:
-        print("⚠️ Bu gün için mahalle yok!")
-        return [], pd.DataFrame()
-    
-    # 3. Mahallelere tonaj dağıt
-    mah_tonnage = tonnage_mgr.distribute_to_neighborhoods(adjusted_target, pop_df, day_neighborhoods)
-    
-    # 4. Toplanacak konteynerler
-    day_containers = containers_df[
-        (containers_df["mahalle_norm"].isin(day_neighborhoods)) &
-        (containers_df["is_collectible"])
-    ].copy().reset_index(drop=True)
-    
-    # 5. Konteynerlere tonaj dağıt
-    day_containers = tonnage_mgr.distribute_to_containers(day_containers, mah_tonnage)
-    
-    # Konteyner istatistikleri
-    underground_count = day_containers['is_underground'].sum()
-    narrow_street_count = (day_containers['street_width'] < 5).sum()
-    
-    print(f"\n📦 KONTEYNER ANALİZİ:")
-    print(f"   Toplam: {len(day_containers)}")
-    print(f"   Yeraltı: {underground_count} (sadece CRANE alabilir)")
-    print(f"   Dar sokak (<5m): {narrow_street_count} (sadece SMALL girebilir)")
-    print(f"   Toplam talep: {day_containers['demand_ton'].sum():.1f} ton")
-    
-    # Mahalleleri kategorize
-    day_high_pop = [m for m in high_pop_mahs if m in day_neighborhoods]
-    day_low_pop = [m for m in low_pop_mahs if m in day_neighborhoods]
-    
-    # Boşaltma pozisyonu
-    unload_containers = containers_df[containers_df["mahalle_norm"] == UNLOAD_MAH]
-    default_start = day_containers[day_containers["mahalle_norm"] == START_MAH]
-    default_start_pos = (default_start.iloc[0]["lat"], default_start.iloc[0]["lon"]) if len(default_start) > 0 else (day_containers.iloc[0]["lat"], day_containers.iloc[0]["lon"])
-    unload_pos = (unload_containers.iloc[0]["lat"], unload_containers.iloc[0]["lon"]) if len(unload_containers) > 0 else default_start_pos
-    
-    # Araçların gerçek başlangıç konumları (start positions JSON'dan)
-    print(f"\n📍 ARAÇ BAŞLANGIÇ KONUMLARI:")
-    vehicles_with_real_start = 0
-    for vid, pos_data in VEHICLE_START_POSITIONS.items():
-        print(f"   Araç {vid}: {pos_data['mahalle']} ({pos_data['lat']:.4f}, {pos_data['lon']:.4f})")
-        vehicles_with_real_start += 1
-        if vehicles_with_real_start >= 5:  # İlk 5 tanesini göster
-            remaining = len(VEHICLE_START_POSITIONS) - 5
-            if remaining > 0:
-                print(f"   ... ve {remaining} araç daha")
-            break
-    
-    # Numpy arrays
-    container_lats = day_containers["lat"].values
-    container_lons = day_containers["lon"].values
-    container_demands = day_containers["demand_ton"].values
-    container_mahalles = day_containers["mahalle_norm"].values
-    container_high_pop = day_containers["is_high_pop"].values
-    container_underground = day_containers["is_underground"].values
-    container_street_widths = day_containers["street_width"].values
-    
-    # Araçları hazırla - gerçek başlangıç konumlarıyla
-    fleet_sorted = vehicle_mgr.fleet.sort_values("capacity_ton", ascending=False)
-    
-    vehicles_data = []
-    for _, row in fleet_sorted.iterrows():
-        vid = row["vehicle_id"]
-        # Araç için gerçek başlangıç konumu varsa kullan, yoksa varsayılan
-        if vid in VEHICLE_START_POSITIONS:
-            start_pos = (VEHICLE_START_POSITIONS[vid]['lat'], VEHICLE_START_POSITIONS[vid]['lon'])
-            start_mahalle = VEHICLE_START_POSITIONS[vid]['mahalle']
+        print("="*60)
+        print("📦 VERİLER YÜKLENİYOR - TAM ARAÇ YÖNETİMİ")
+        print("="*60)
+        start_load = time.time()
+
+        # Konteynerler
+        containers_df = load_containers(paths["containers"])
+        print(f"✅ Konteyner: {len(containers_df)} (toplanabilir: {containers_df['is_collectible'].sum()}, yeraltı: {containers_df['is_underground'].sum()})")
+
+        # Nüfus
+        pop_df = load_population(paths["pop"])
+        pop_map = pop_df.set_index("mahalle_norm")["nufus"].to_dict()
+        containers_df["nufus"] = containers_df["mahalle_norm"].map(pop_map).fillna(0)
+        containers_df["is_high_pop"] = containers_df["nufus"] >= POP_THRESHOLD
+
+        # Filo
+        fleet_df = load_fleet(paths["fleet"])
+        print(f"✅ Filo: {len(fleet_df)} araç (Crane: {fleet_df['is_crane'].sum()})")
+
+        # Araç Başlangıç Konumları
+        vehicle_start_positions, start_data = load_start_positions(paths["start_positions"])
+        if start_data is not None:
+            print(f"✅ Başlangıç konumları: {len(vehicle_start_positions)} araç (Referans: {start_data['reference_date']} {start_data['reference_time']})")
+            # Sadece start positions'da olan araçları filtrele
+            fleet_df = fleet_df[fleet_df['vehicle_id'].isin(vehicle_start_positions.keys())].reset_index(drop=True)
+            print(f"   Aktif araç sayısı: {len(fleet_df)}")
         else:
-            start_pos = default_start_pos
-            start_mahalle = START_MAH
-        
-        vehicles_data.append({
-            "id": vid,
-            "name": row["vehicle_name"],
-            "type": row["vehicle_type_norm"],
-            "category": row["vehicle_category"],
-            "capacity": row["capacity_ton"],
-            "min_street_width": row["min_street_width"],
-            "is_crane": row["is_crane"],
-            "load": 0.0,
-            "pos": start_pos,
-            "start_pos": start_pos,  # Başlangıç konumunu sakla
-            "start_mahalle": start_mahalle,
-            "time": datetime(target_date.year, target_date.month, target_date.day, DAY_START_HOUR, 0, 0),
-            "route": [],
-            "distance": 0.0,
-            "unloads": 0,
-            "collected_tonnage": 0.0,
-            "skipped_narrow": 0,
-            "skipped_underground": 0,
-        })
-        
-        # İlk durak olarak başlangıç konumunu ekle
-        vehicles_data[-1]["route"].append({
-            "container_idx": -2,  # -2 = başlangıç noktası
-            "mahalle": start_mahalle,
-            "lat": start_pos[0],
-            "lon": start_pos[1],
-            "tip": "BASLANGIC",
-            "demand_ton": 0,
-            "hour": DAY_START_HOUR,
-            "load_ton": 0,
-            "street_width": 99,
-        })
-    
-    collected = np.zeros(len(day_containers), dtype=bool)
-    
-    # Zaman dilimleri
-    time_slots = [
-        (6, 7, day_low_pop + day_high_pop, "Erken"),
-        (7, 10, day_low_pop, "Sabah Peak"),
-        (10, 17, day_low_pop + day_high_pop, "Gündüz"),
-        (17, 20, day_low_pop, "Akşam Peak"),
-        (20, 23, day_high_pop, "Gece"),
-    ]
-    
-    print(f"\n🚛 ROTA OLUŞTURULUYOR...")
-    
-    for slot_start, slot_end, allowed_mahs, slot_name in time_slots:
-        allowed_set = set(allowed_mahs)
-        slot_mask = np.array([m in allowed_set for m in container_mahalles]) & ~collected
-        
-        if not np.any(slot_mask):
-            continue
-        
-        is_peak_slot = (slot_start == 7 and slot_end == 10) or (slot_start == 17 and slot_end == 20)
-        
-        print(f"⏰ [{slot_start:02d}-{slot_end:02d}] {slot_name}: {np.sum(slot_mask)} konteyner")
-        
+            print("⚠️ Başlangıç konumları bulunamadı, varsayılan kullanılacak")
+
+        # Önbellekler kaynak dosyaların içerik özetiyle doğrulanır
+        manifest = CacheManifest(paths["manifest"])
+        road_src = {"road": paths["road"]}
+        containers_src = {"containers": paths["containers"]}
+
+        # Sokak genişliği
+        street_mgr = StreetWidthManager()
+        street_fresh = manifest.is_fresh("street_widths", road_src, version=CACHE_VERSIONS["street_widths"])
+        if not (street_fresh and street_mgr.load(paths["street_width_cache"])):
+            street_mgr.load_from_geojson(paths["road"])
+            street_mgr.save(paths["street_width_cache"])
+            manifest.record("street_widths", road_src, version=CACHE_VERSIONS["street_widths"])
+        else:
+            print(f"✅ Sokak genişlikleri önbellekten yüklendi ({street_mgr.n_segments} segment)")
+
+        # Konteynerlere sokak genişliği ekle - yol ağı değişmediyse sadece yeni konteynerler eşlenir
+        known_widths = None
+        if manifest.is_fresh("container_streets", road_src, version=CACHE_VERSIONS["container_streets"]):
+            known_widths = load_street_mapping(paths["street_mapping_cache"])
+        containers_df, n_new = street_mgr.map_containers_to_streets(containers_df, known_widths)
+        # Önbellek sadece yeni konteyner eşlendiyse yazılır (sıcak başlangıçta disk yazımı yok)
+        if n_new:
+            save_street_mapping(paths["street_mapping_cache"], containers_df)
+            manifest.record("container_streets", road_src, version=CACHE_VERSIONS["container_streets"])
+        # Mesafe tablolarının satır numarası
+        containers_df = containers_df.reset_index(drop=True)
+        containers_df["container_gid"] = np.arange(len(containers_df), dtype=np.int32)
+
+        # Araç tipi yöneticisi
+        vehicle_mgr = VehicleTypeManager(fleet_df)
+
+        # Gün rotasyonu
+        rot_days = load_rotations(paths["rot"])
+
+        # Tonnage Manager
+        tonnage_mgr = TonnageManager()
+        tonnage_mgr.load_tonnages(paths["tonnages"])
+
+        # ML Model - GPS durak kayıtları veya konteyner/filo verisi değişince yeniden eğitilir
+        ml_model = MLRouteOptimizer()
+        stop_files = list_stop_files(paths["gps_stops"])
+        # Eğitim talebi tonaj, rotasyon ve nüfus dosyalarından gelir: onlar değişince de yeniden eğitilir
+        model_src = {**containers_src, **road_src, "fleet": paths["fleet"], "tonnages": paths["tonnages"],
+                     "rot": paths["rot"], "pop": paths["pop"],
+                     **{f"gps:{Path(p).name}": p for p in stop_files}}
+        model_fresh = manifest.is_fresh("ml_model", model_src, version=CACHE_VERSIONS["ml_model"])
+        model_loaded = model_fresh and ml_model.load(paths["model"])
+
+        # Yol grafı (gerçek sürüş mesafeleri için)
+        road_graph = None
+        if paths["road_graph"].exists() or paths["road"].exists():
+            widths = sorted(VEHICLE_MIN_STREET_WIDTH.values())
+            graph_params = {"min_widths": widths}
+            graph_fresh = manifest.is_fresh("road_graph", road_src, graph_params, CACHE_VERSIONS["road_graph"])
+            # Sokak genişliği dizileri yol dosyasının aynısı: graf için JSON tekrar okunmaz
+            road_graph = RoadGraph.load_or_build(paths["road_graph"], paths["road"],
+                                                 min_widths=widths, rebuild=not graph_fresh,
+                                                 lines=street_mgr.road_lines())
+            if not graph_fresh:
+                manifest.record("road_graph", road_src, graph_params, CACHE_VERSIONS["road_graph"])
+            nodes, snap_km = road_graph.snap(containers_df["lat"].values, containers_df["lon"].values)
+            containers_df["road_node"] = nodes
+            containers_df["road_snap_km"] = snap_km
+
+            tables_src = {**containers_src, **road_src}
+            tables_params = {"min_widths": widths, "k": DISTANCE_TABLE_K}
+            tables_fresh = manifest.is_fresh("distance_tables", tables_src, tables_params,
+                                             CACHE_VERSIONS["distance_tables"])
+            distance_tables = load_or_build_tables(
+                paths["distance_tables"], containers_df["lat"].values, containers_df["lon"].values,
+                containers_df["mahalle_norm"].values, widths, road_graph, nodes, snap_km,
+                k=DISTANCE_TABLE_K, rebuild=not tables_fresh)
+            if not tables_fresh:
+                manifest.record("distance_tables", tables_src, tables_params, CACHE_VERSIONS["distance_tables"])
+        else:
+            distance_tables = None
+
+        ctx = cls(containers_df, pop_df, fleet_df, vehicle_start_positions,
+                  street_mgr, vehicle_mgr, rot_days, tonnage_mgr, ml_model,
+                  road_graph, distance_tables)
+        ctx.plan_templates = PlanTemplateStore(paths["plan_templates"])
+        # Şablon anahtarı için plan kaynaklarının içerik özetleri (tonaj hariç: onarılan kısım)
+        template_src = ("containers", "road", "rot", "pop", "fleet", "start_positions")
+        ctx.inputs_hash = template_key(*[(manifest.signature(paths[k]) or {}).get("sha256") for k in template_src])
+
+        # Eğitim günlük talepleri context üzerinden hesaplar: context kurulduktan sonra yapılır
+        if not model_loaded:
+            ml_model.train(stop_files, ctx.training_inputs(dates=stop_dates(stop_files)) if stop_files else None)
+            ml_model.save(paths["model"])
+            manifest.record("ml_model", model_src, version=CACHE_VERSIONS["ml_model"])
+        # Paralel plan() çağrılarında tembel initialize_weights yarışına girmesin
+        if not ml_model.trained:
+            ml_model.initialize_weights()
+
+        print(f"\n⏱️ Veri yükleme: {time.time() - start_load:.2f} saniye")
+        return ctx
+
+    def warm_up(self):
+        """
+        Tembel kurulan yapıları (yol grafı CSR ve komşuluk listeleri) önceden
+        kur. Süreç havuzu fork ile açılmadan önce çağrılırsa işçiler bunları
+        yeniden kurmak yerine ebeveynden kopyalamadan devralır.
+        """
+        if self.road_graph is not None:
+            for w in sorted(VEHICLE_MIN_STREET_WIDTH.values()):
+                self.road_graph.csr(w)
+                self.road_graph._adjacency(w)
+        return self
+
+    def training_inputs(self, config=None, dates=None):
+        """
+        model_training.train_from_gps için paylaşılan salt-okunur girdiler.
+        Konteyner talebi GPS durak günlerinin (dates) her biri için
+        prepare_day'in verdiği taleptir: "day_demand" gün başına
+        ("YYYY-MM-DD"; o gün toplanmayan konteynerde ortalama), "demand"
+        günlerin ortalaması. dates verilmezse bu haftanın günleri kullanılır.
+        """
+        cfg = config if config is not None else DEFAULT_CONFIG
+        quiet = replace(cfg, verbose=False)
+        df = self.containers_df
+        n = len(df)
+        demand_sum = np.zeros(n)
+        demand_days = np.zeros(n)
+        if not dates:
+            today = datetime.now()
+            dates = [today + timedelta(days=i) for i in range(7)]
+        day, collected = None, {}
+        for date in dates:
+            day_problem = self.prepare_day(date, quiet)
+            if day_problem is None:
+                continue
+            if day is None:
+                day = day_problem
+            gids = day_problem.day_containers["container_gid"].values
+            day_demand = day_problem.day_containers["demand_ton"].values
+            demand_sum[gids] += day_demand
+            demand_days[gids] += 1
+            collected[date.strftime("%Y-%m-%d")] = (gids, day_demand)
+        # Hiç toplanmayan konteynerler için kapasite tahmininin ortası
+        fallback = float(np.mean(demand_sum[demand_days > 0] / demand_days[demand_days > 0])) if demand_days.any() else 0.1
+        demand = np.where(demand_days > 0, demand_sum / np.maximum(demand_days, 1), fallback)
+        day_demands = {}
+        for key, (gids, day_demand) in collected.items():
+            day_demands[key] = demand.copy()
+            day_demands[key][gids] = day_demand
+
+        unload_pos = day.unload_pos if day is not None else (float(df["lat"].iloc[0]), float(df["lon"].iloc[0]))
+        lat = df["lat"].values.astype(np.float64)
+        lon = df["lon"].values.astype(np.float64)
+        access = self.vehicle_mgr.build_access_table(df["is_underground"].values, df["street_width"].values)
+        collectible = df["is_collectible"].values.astype(bool)
+        fleet = {
+            int(row["vehicle_id"]): {
+                "category": row["vehicle_category"],
+                "capacity": float(row["capacity_ton"]),
+                "min_width": float(row["min_street_width"]),
+            }
+            for _, row in self.vehicle_mgr.fleet.iterrows()
+        }
+        return {
+            "lat": lat,
+            "lon": lon,
+            "lon_scale": float(np.cos(np.radians(lat.mean()))),
+            "demand": demand,
+            "day_demand": day_demands,
+            "street_width": df["street_width"].values.astype(np.float64),
+            "high_pop": df["is_high_pop"].values.astype(bool),
+            "unload_dist": np.sqrt((lat - unload_pos[0])**2 + (lon - unload_pos[1])**2) * 111,
+            "unload_pos": unload_pos,
+            "access": {cat: a["mask"] & collectible for cat, a in access.items()},
+            "fleet": fleet,
+            "peak_hours": np.array([cfg.is_peak_hour(h) for h in range(24)], dtype=bool),
+            "slot_groups": cfg.slot_group_table(),
+        }
+
+    def day_neighborhoods(self, dow):
+        """O gün toplanacak mahalleler"""
+        return [m for m, days in self.rot_days.items() if dow in days]
+
+    def mahalle_codes(self, names):
+        """Mahalle adlarının kodları (konteyneri olmayan mahalleler atlanır)"""
+        index = self.mahalle_index
+        return np.array([index[m] for m in names if m in index], dtype=np.int32)
+
+    def prepare_day(self, target_date, config=None, dow=None):
+        """
+        Günün planlama girdilerini hazırla: tonaj hedefi, toplanacak
+        konteynerler ve talepleri, mahalle kategorileri, başlangıç/boşaltma
+        konumları. Gün için mahalle yoksa None döner.
+        """
+        cfg = config if config is not None else DEFAULT_CONFIG
+        if dow is None:
+            dow = target_date.weekday()
+        log = print if cfg.verbose else _silent
+
+        containers_df = self.containers_df
+        tonnage_mgr = self.tonnage_mgr
+
+        # 1. Günlük tonaj hedefi
+        daily_target = tonnage_mgr.get_daily_tonnage(target_date)
+        seasonal_factor = tonnage_mgr.get_seasonal_factor(target_date.month)
+        weekday_factor = tonnage_mgr.get_weekday_factor(dow)
+        adjusted_target = daily_target * seasonal_factor * weekday_factor
+
+        log(f"\n📊 TONAJ: {daily_target:.1f} × {seasonal_factor:.2f} × {weekday_factor:.2f} = {adjusted_target:.1f} ton")
+
+        # 2. O gün toplanacak mahalleler
+        day_neighborhoods = self.day_neighborhoods(dow)
+        if not day_neighborhoods:
+            log("⚠️ Bu gün için mahalle yok!")
+            return None
+
+        # 3. Mahallelere tonaj dağıt
+        mah_tonnage = tonnage_mgr.distribute_to_neighborhoods(adjusted_target, self.pop_df, day_neighborhoods)
+
+        # 4. Toplanacak konteynerler: mahalle kodu maskesi, tek bir satır seçimi (kopya)
+        day_index = np.flatnonzero(np.isin(self._mahalle_code, self.mahalle_codes(day_neighborhoods)) &
+                                   self._collectible)
+        day_containers = containers_df.take(day_index).reset_index(drop=True)
+
+        # 5. Konteynerlere tonaj dağıt (yerinde)
+        tonnage_mgr.distribute_to_containers(day_containers, mah_tonnage)
+
+        # Mahalleleri kategorize
+        day_set = set(day_neighborhoods)
+        day_high_pop = [m for m in self.high_pop_mahs if m in day_set]
+        day_low_pop = [m for m in self.low_pop_mahs if m in day_set]
+
+        # Başlangıç ve boşaltma pozisyonu
+        start_rows = np.flatnonzero(day_containers["mahalle_code"].values == self.mahalle_index.get(cfg.start_mah, -1))
+        first = start_rows[0] if len(start_rows) > 0 else 0
+        default_start_pos = (day_containers["lat"].values[first], day_containers["lon"].values[first])
+        if cfg.unload_pos is not None:
+            unload_pos = tuple(cfg.unload_pos)
+        else:
+            unload_rows = np.flatnonzero(self._mahalle_code == self.mahalle_index.get(cfg.unload_mah, -1))
+            if len(unload_rows) > 0:
+                unload_pos = (containers_df["lat"].values[unload_rows[0]], containers_df["lon"].values[unload_rows[0]])
+            else:
+                unload_pos = default_start_pos
+
+        return DayProblem(target_date, dow, adjusted_target, day_neighborhoods,
+                          day_containers, day_high_pop, day_low_pop,
+                          default_start_pos, unload_pos, day_index)
+
+    def init_vehicles(self, day, config=None, fleet=None):
+        """
+        Araç durumlarını gerçek başlangıç konumlarıyla hazırla (kapasiteye göre
+        büyükten küçüğe). fleet verilmezse context filosu kullanılır.
+        """
+        cfg = config if config is not None else DEFAULT_CONFIG
+        fleet = fleet if fleet is not None else self.vehicle_mgr.fleet
+        fleet_sorted = fleet.sort_values("capacity_ton", ascending=False)
+        target_date = day.target_date
+
+        vehicles_data = []
+        for _, row in fleet_sorted.iterrows():
+            vid = row["vehicle_id"]
+            # Araç için gerçek başlangıç konumu varsa kullan, yoksa varsayılan
+            if vid in self.vehicle_start_positions:
+                start_pos = (self.vehicle_start_positions[vid]['lat'], self.vehicle_start_positions[vid]['lon'])
+                start_mahalle = self.vehicle_start_positions[vid]['mahalle']
+            else:
+                start_pos = day.default_start_pos
+                start_mahalle = cfg.start_mah
+
+            vehicles_data.append({
+                "id": vid,
+                "name": row["vehicle_name"],
+                "type": row["vehicle_type_norm"],
+                "category": row["vehicle_category"],
+                "capacity": row["capacity_ton"],
+                "min_street_width": row["min_street_width"],
+                "is_crane": row["is_crane"],
+                "load": 0.0,
+                "pos": start_pos,
+                "start_pos": start_pos,  # Başlangıç konumunu sakla
+                "start_mahalle": start_mahalle,
+                "time": datetime(target_date.year, target_date.month, target_date.day, cfg.day_start_hour, 0, 0),
+                "route": RouteStore(),
+                "distance": 0.0,
+                "unloads": 0,
+                "collected_tonnage": 0.0,
+                "skipped_narrow": 0,
+                "skipped_underground": 0,
+            })
+
+            # İlk durak olarak başlangıç konumunu ekle (container_idx = -2)
+            vehicles_data[-1]["route"].add_start(start_pos[0], start_pos[1])
+        return vehicles_data
+
+    def simulate_day(self, day, vehicles_data, config=None, container_mask=None):
+        """
+        Olay güdümlü çok araçlı simülasyon.
+
+        Araçlar bir sonraki boş oldukları zamana göre bir heap'te tutulur ve
+        her adımda küresel olarak en erken boşalan araç bir durak (veya
+        boşaltma) için sevk edilir. Saatler DAY_START_HOUR'dan itibaren
+        dakika cinsinden tutulur; dilim ve peak kararları tamsayı dakikaya
+        göre önceden hesaplanmış tablolardan okunur. Araç durumu
+        (yük, konum, zaman, mesafe) dizi-yapısında (struct-of-arrays) tutulur
+        ve sonunda vehicles_data sözlüklerine yazılır.
+
+        Args:
+            day: prepare_day() çıktısı
+            vehicles_data: init_vehicles() çıktısı (yerinde güncellenir)
+            container_mask: Sadece bu konteynerler planlanır (None = hepsi)
+
+        Returns:
+            collected: Toplanan (veya peak nedeniyle atlanan) konteyner maskesi
+        """
+        cfg = config if config is not None else DEFAULT_CONFIG
+        log = print if cfg.verbose else _silent
+        ml_model = self.ml_model
+
+        day_containers = day.day_containers
+        n_day = len(day_containers)
+        unload_pos = day.unload_pos
+
+        # Numpy arrays
+        container_lats = day_containers["lat"].values
+        container_lons = day_containers["lon"].values
+        container_demands = day_containers["demand_ton"].values
+        container_mah_codes = day_containers["mahalle_code"].values
+        container_high_pop = day_containers["is_high_pop"].values
+        container_underground = day_containers["is_underground"].values
+        container_street_widths = day_containers["street_width"].values
+        # Boşaltma noktasına uzaklık konumdan bağımsız - bir kez hesaplanır
+        container_unload_dist = np.sqrt(
+            (container_lats - unload_pos[0])**2 +
+            (container_lons - unload_pos[1])**2
+        ) * 111
+
+        # Araç durumu (struct-of-arrays)
+        n_veh = len(vehicles_data)
+        v_lat = np.array([v["pos"][0] for v in vehicles_data], dtype=np.float64)
+        v_lon = np.array([v["pos"][1] for v in vehicles_data], dtype=np.float64)
+        v_load = np.array([v["load"] for v in vehicles_data], dtype=np.float64)
+        v_cap = np.array([v["capacity"] for v in vehicles_data], dtype=np.float64)
+        v_min_width = np.array([v["min_street_width"] for v in vehicles_data], dtype=np.float64)
+        v_dist = np.array([v["distance"] for v in vehicles_data], dtype=np.float64)
+        v_collected_ton = np.array([v["collected_tonnage"] for v in vehicles_data], dtype=np.float64)
+        v_unloads = np.array([v["unloads"] for v in vehicles_data], dtype=np.int64)
+        day_base = datetime(day.target_date.year, day.target_date.month, day.target_date.day, cfg.day_start_hour)
+        v_minute = np.array([(v["time"] - day_base).total_seconds() / 60.0 for v in vehicles_data], dtype=np.float64)
+        v_cat = [v["category"] for v in vehicles_data]
+        v_route = [v["route"] for v in vehicles_data]
+
+        # Yol grafı: araç/konteyner düğümleri ve boşaltma noktasından kategori alt graflarında mesafeler
+        road = self.road_graph if cfg.road_distances and "road_node" in day_containers else None
+        if road is not None:
+            container_gids = day_containers["container_gid"].values
+            v_gid = np.full(n_veh, -1, dtype=np.int64)  # Aracın bulunduğu konteyner (-1 = değil)
+            container_nodes = day_containers["road_node"].values
+            container_snap = day_containers["road_snap_km"].values.astype(np.float64)
+            v_node, v_snap = road.snap(v_lat, v_lon)
+            v_snap = v_snap.astype(np.float64)
+            unload_node, unload_snap = road.snap(unload_pos[0], unload_pos[1])
+            unload_node, unload_snap = int(unload_node[0]), float(unload_snap[0])
+            unload_road = {}
+            cat_unload_dist = {}
+            for cat, min_width in VEHICLE_MIN_STREET_WIDTH.items():
+                unload_road[cat] = road.distances_from(unload_node, min_width)
+                drive = unload_road[cat][container_nodes] + container_snap + unload_snap
+                # Alt grafta bağlantısı olmayan konteynerler kuş uçuşu tahmine düşer
+                cat_unload_dist[cat] = np.where(np.isfinite(drive), drive, container_unload_dist * 1.3)
+
+        # Dakika tabloları: dilim indeksi ve peak bayrağı (gün sonundan sonrası da kapsanır)
+        day_minutes = (cfg.day_end_hour - cfg.day_start_hour) * 60
+        table_len = (48 - cfg.day_start_hour) * 60
+        minute_hour = cfg.day_start_hour + np.arange(table_len) // 60
+        minute_peak = np.array([cfg.is_peak_hour(h) for h in range(48)])[minute_hour]
+
+        time_slots = cfg.time_slots(day.low_pop, day.high_pop)
+        peak_slots = {cfg.peak_morning, cfg.peak_evening}
+        minute_slot = np.full(table_len, -1, dtype=np.int64)
+        slot_start_min = []
+        for s_i, (slot_start, slot_end, _, _) in enumerate(time_slots):
+            a = (slot_start - cfg.day_start_hour) * 60
+            b = (slot_end - cfg.day_start_hour) * 60
+            minute_slot[max(a, 0):max(b, 0)] = s_i
+            slot_start_min.append(a)
+
+        collected = np.zeros(n_day, dtype=bool)
+        if container_mask is not None:
+            # Planlama dışındaki konteynerler hiçbir dilimde aday olmaz
+            outside = ~np.asarray(container_mask, dtype=bool)
+        else:
+            outside = np.zeros(n_day, dtype=bool)
+
+        # Erişim kuralları gün başında kategori bazında bir kez uygulanır
+        access_table = self.vehicle_mgr.build_access_table(container_underground, container_street_widths)
         for v in vehicles_data:
-            if v["time"].hour >= slot_end:
+            v["skipped_underground"] = access_table[v["category"]]["skipped_underground"]
+            v["skipped_narrow"] = access_table[v["category"]]["skipped_narrow"]
+
+        # Dilim × kategori uygunluk maskeleri, kalan aday sayıları ve dilim başına aday indeksi
+        slot_access = []
+        slot_remaining = []
+        slot_grids = []
+        for slot_start, slot_end, allowed_mahs, slot_name in time_slots:
+            slot_members = np.isin(container_mah_codes, self.mahalle_codes(allowed_mahs)) & ~outside
+            # Peak slotta yüksek nüfuslu engelle
+            if (slot_start, slot_end) in peak_slots:
+                slot_members &= ~container_high_pop
+            grid = CandidateGrid(container_lats, container_lons)
+            grid.restrict(np.flatnonzero(slot_members))
+            slot_grids.append(grid)
+            slot_access.append({cat: slot_members & entry["mask"] for cat, entry in access_table.items()})
+            slot_remaining.append({cat: int(np.count_nonzero(m)) for cat, m in slot_access[-1].items()})
+            log(f"⏰ [{slot_start:02d}-{slot_end:02d}] {slot_name}: {int(np.count_nonzero(slot_members))} konteyner")
+
+        def mark_collected(idx):
+            collected[idx] = True
+            for s_i in range(len(time_slots)):
+                slot_grids[s_i].remove(idx)
+                for cat, cat_mask in slot_access[s_i].items():
+                    if cat_mask[idx]:
+                        cat_mask[idx] = False
+                        slot_remaining[s_i][cat] -= 1
+
+        def next_open_slot(vi, s_i):
+            """s_i'den itibaren bu aracın kategorisi için aday kalan ilk dilim"""
+            cat = v_cat[vi]
+            for s_j in range(s_i, len(time_slots)):
+                if slot_remaining[s_j][cat] > 0:
+                    return s_j
+            return -1
+
+        log(f"\n🚛 ROTA OLUŞTURULUYOR...")
+
+        # Heap: (dakika, sıra, araç) - eşitlikte kapasite sırası korunur
+        heap = [(v_minute[vi], vi) for vi in range(n_veh) if v_minute[vi] < day_minutes]
+        heapq.heapify(heap)
+
+        while heap:
+            t, vi = heapq.heappop(heap)
+            cat = v_cat[vi]
+
+            # Bulunduğu dilimde aday yoksa sonraki uygun dilimin başına atla
+            s_i = minute_slot[int(t)] if t >= 0 else 0
+            if s_i < 0:
+                s_i = next_open_slot(vi, 0)
+            elif slot_remaining[s_i][cat] == 0:
+                s_i = next_open_slot(vi, s_i + 1)
+                if s_i >= 0:
+                    t = max(t, float(slot_start_min[s_i]))
+            if s_i < 0 or t >= day_minutes:
                 continue
-            
-            if v["time"].hour < slot_start:
-                v["time"] = v["time"].replace(hour=slot_start, minute=0)
-            
-            while v["time"].hour < slot_end:
-                available_mask = slot_mask & ~collected
-                available_indices = np.where(available_mask)[0]
-                
-                if len(available_indices) == 0:
-                    break
-                
-                # Peak slotta yüksek nüfuslu engelle
-                if is_peak_slot:
-                    not_high_pop = ~container_high_pop[available_indices]
-                    available_indices = available_indices[not_high_pop]
-                    if len(available_indices) == 0:
-                        break
-                
-                # ========================================
-                # ARAÇ TİPİ KISITLAMALARI
-                # ========================================
-                
-                # 1. Yeraltı kontrolü - sadece CRANE
-                if not v["is_crane"]:
-                    not_underground = ~container_underground[available_indices]
-                    skipped = np.sum(~not_underground)
-                    if skipped > 0:
-                        v["skipped_underground"] += skipped
-                    available_indices = available_indices[not_underground]
-                    if len(available_indices) == 0:
-                        break
-                
-                # 2. Sokak genişliği kontrolü
-                street_ok = container_street_widths[available_indices] >= v["min_street_width"]
-                skipped_narrow = np.sum(~street_ok)
-                if skipped_narrow > 0:
-                    v["skipped_narrow"] += skipped_narrow
-                available_indices = available_indices[street_ok]
-                if len(available_indices) == 0:
-                    break
-                
-                # ========================================
-                
-                current_hour = v["time"].hour
-                
-                # Mesafeler
-                dists = np.sqrt(
-                    (container_lats[available_indices] - v["pos"][0])**2 +
-                    (container_lons[available_indices] - v["pos"][1])**2
-                ) * 111
-                
-                # Feature matrix (8 feature)
-                n_avail = len(available_indices)
-                features = np.zeros((n_avail, 8))
-                features[:, 0] = dists
-                features[:, 1] = container_demands[available_indices]
-                features[:, 2] = v["load"] / v["capacity"]
-                features[:, 3] = np.where(
-                    is_peak_hour(current_hour) & container_high_pop[available_indices],
-                    10.0, 0.0
-                )
-                features[:, 4] = np.sqrt(
-                    (container_lats[available_indices] - unload_pos[0])**2 +
-                    (container_lons[available_indices] - unload_pos[1])**2
-                ) * 111
-                features[:, 5] = np.where(dists < 0.5, 1.0, 0.0)
-                capacity_match = container_demands[available_indices] / v["capacity"]
-                features[:, 6] = np.where((capacity_match > 0.05) & (capacity_match < 0.3), 1.0, 0.0)
-                # Sokak uyumu bonusu - sokak ne kadar geniş araç için uygunsa o kadar bonus
-                street_margin = container_street_widths[available_indices] - v["min_street_width"]
-                features[:, 7] = np.where(street_margin > 2, 1.0, 0.0)  # 2m+ margin = bonus
-                
-                scores = ml_model.predict_scores_batch(features)
-                
-                best_local_idx = np.argmax(scores)
-                best_idx = available_indices[best_local_idx]
-                best_dist = dists[best_local_idx]
-                
-                demand = container_demands[best_idx]
-                
-                # ========================================
-                # KAPASİTE KONTROLÜ - BOŞALTMA
-                # ========================================
-                if v["load"] + demand > v["capacity"]:
-                    unload_dist = haversine_km_vectorized(
-                        v["pos"][1], v["pos"][0],
-                        unload_pos[1], unload_pos[0]
-                    ) * 1.3
-                    travel_min = (unload_dist / AVG_SPEED_KMH) * 60 + UNLOAD_WAIT_MIN
-                    v["time"] += timedelta(minutes=travel_min)
-                    v["pos"] = unload_pos
-                    v["load"] = 0.0
-                    v["distance"] += unload_dist
-                    v["unloads"] += 1
-                    
-                    v["route"].append({
-                        "container_idx": -1,
-                        "mahalle": UNLOAD_MAH,
-                        "lat": unload_pos[0],
-                        "lon": unload_pos[1],
-                        "tip": "BOŞALTMA",
-                        "demand_ton": 0,
-                        "hour": v["time"].hour,
-                        "load_ton": 0,
-                        "street_width": 99,
-                    })
-                    
-                    if v["time"].hour >= slot_end:
-                        break
-                    continue
-                
-                # ========================================
-                
-                real_dist = best_dist * 1.3
-                travel_min = (real_dist / AVG_SPEED_KMH) * 60 + CONTAINER_SERVICE_SEC / 60
-                
-                new_time = v["time"] + timedelta(minutes=travel_min)
-                is_high_pop_container = container_high_pop[best_idx]
-                
-                if is_high_pop_container and is_peak_hour(new_time.hour):
-                    collected[best_idx] = True
-                    continue
-                
-                v["time"] = new_time
-                v["pos"] = (container_lats[best_idx], container_lons[best_idx])
-                v["load"] += demand
-                v["distance"] += real_dist
-                v["collected_tonnage"] += demand
-                
-                v["route"].append({
-                    "container_idx": int(best_idx),
-                    "mahalle": container_mahalles[best_idx],
-                    "lat": float(container_lats[best_idx]),
-                    "lon": float(container_lons[best_idx]),
-                    "tip": day_containers.iloc[best_idx]["tip_norm"],
-                    "demand_ton": float(demand),
-                    "hour": v["time"].hour,
-                    "load_ton": round(v["load"], 2),
-                    "street_width": float(container_street_widths[best_idx]),
-                })
-                
-                collected[best_idx] = True
-                
-                if v["time"].hour >= DAY_END_HOUR:
-                    break
-    
-    # Sonuçlar
-    all_routes = []
+            if t < slot_start_min[s_i]:
+                t = float(slot_start_min[s_i])
+            v_minute[vi] = t
+
+            # Sadece konuma en yakın k uygun aday skorlanır
+            access_mask = slot_access[s_i][cat]
+            if cfg.candidate_k > 0:
+                available_indices = slot_grids[s_i].query(v_lat[vi], v_lon[vi], cfg.candidate_k, access_mask)
+            else:
+                available_indices = np.flatnonzero(access_mask)
+            if len(available_indices) == 0:
+                continue
+
+            minute_idx = min(int(t), table_len - 1)
+
+            # Mesafeler
+            dists = np.sqrt(
+                (container_lats[available_indices] - v_lat[vi])**2 +
+                (container_lons[available_indices] - v_lon[vi])**2
+            ) * 111
+            if road is not None:
+                # Araç bir konteynerdeyse mmap mesafe tablosuna bak; tablodaki k komşunun
+                # dışında kalan adaylar mahalle çiftinin dolanma oranıyla tahmin edilir
+                table = self.distance_tables.get(float(v_min_width[vi]))
+                if table is not None and v_gid[vi] >= 0:
+                    drive = table.lookup(v_gid[vi], container_gids[available_indices]).astype(np.float64)
+                    estimated = np.isnan(drive)
+                    drive[estimated] = table.estimate(v_gid[vi], container_gids[available_indices][estimated],
+                                                      dists[estimated])
+                else:
+                    # Başlangıç/boşaltma noktasından: gerçek sürüş mesafesi, arama en uzak adayın birkaç katıyla sınırlı
+                    drive = road.one_to_many_km(v_node[vi], container_nodes[available_indices], v_min_width[vi],
+                                                limit=ROAD_SEARCH_DETOUR * dists.max() + 0.5)
+                    drive += v_snap[vi] + container_snap[available_indices]
+                    estimated = ~np.isfinite(drive)
+                    drive[estimated] = dists[estimated] * 1.3
+                dists = drive
+
+            # Feature matrix (8 feature)
+            n_avail = len(available_indices)
+            features = np.zeros((n_avail, 8))
+            features[:, 0] = dists
+            features[:, 1] = container_demands[available_indices]
+            features[:, 2] = v_load[vi] / v_cap[vi]
+            if minute_peak[minute_idx]:
+                features[:, 3] = np.where(container_high_pop[available_indices], 10.0, 0.0)
+            features[:, 4] = (cat_unload_dist[cat] if road is not None else container_unload_dist)[available_indices]
+            features[:, 5] = np.where(dists < 0.5, 1.0, 0.0)
+            capacity_match = container_demands[available_indices] / v_cap[vi]
+            features[:, 6] = np.where((capacity_match > 0.05) & (capacity_match < 0.3), 1.0, 0.0)
+            # Sokak uyumu bonusu - sokak ne kadar geniş araç için uygunsa o kadar bonus
+            street_margin = container_street_widths[available_indices] - v_min_width[vi]
+            features[:, 7] = np.where(street_margin > 2, 1.0, 0.0)  # 2m+ margin = bonus
+
+            scores = ml_model.predict_scores_batch(features)
+
+            best_local_idx = np.argmax(scores)
+            best_idx = available_indices[best_local_idx]
+            best_dist = dists[best_local_idx]
+
+            demand = container_demands[best_idx]
+
+            # ========================================
+            # KAPASİTE KONTROLÜ - BOŞALTMA
+            # ========================================
+            if v_load[vi] + demand > v_cap[vi]:
+                unload_dist = haversine_km_vectorized(
+                    v_lon[vi], v_lat[vi],
+                    unload_pos[1], unload_pos[0]
+                ) * 1.3
+                if road is not None:
+                    drive = unload_road[cat][v_node[vi]] + v_snap[vi] + unload_snap
+                    if np.isfinite(drive):
+                        unload_dist = drive
+                    v_node[vi], v_snap[vi] = unload_node, unload_snap
+                    v_gid[vi] = -1
+                t += (unload_dist / cfg.avg_speed_kmh) * 60 + cfg.unload_wait_min
+                v_minute[vi] = t
+                v_lat[vi], v_lon[vi] = unload_pos
+                v_load[vi] = 0.0
+                v_dist[vi] += unload_dist
+                v_unloads[vi] += 1
+
+                v_route[vi].add_unload(unload_pos[0], unload_pos[1], min(int(t), table_len - 1))
+
+                if t < day_minutes:
+                    heapq.heappush(heap, (t, vi))
+                continue
+
+            # ========================================
+
+            real_dist = best_dist if road is not None else best_dist * 1.3
+            if road is not None and estimated[best_local_idx] and v_gid[vi] >= 0:
+                # Tahminle seçilen durak için gerçek yol mesafesi (ALT sorgusu)
+                drive = road.shortest_path_km(v_node[vi], container_nodes[best_idx], v_min_width[vi])
+                if np.isfinite(drive):
+                    real_dist = drive + v_snap[vi] + container_snap[best_idx]
+            new_t = t + (real_dist / cfg.avg_speed_kmh) * 60 + cfg.container_service_sec / 60
+            new_minute_idx = min(int(new_t), table_len - 1)
+
+            if container_high_pop[best_idx] and minute_peak[new_minute_idx]:
+                # Peak saatte yoğun mahalleye varılacaksa konteyner atlanır, araç bekletilmez
+                mark_collected(best_idx)
+                heapq.heappush(heap, (t, vi))
+                continue
+
+            t = new_t
+            v_minute[vi] = t
+            v_lat[vi], v_lon[vi] = container_lats[best_idx], container_lons[best_idx]
+            if road is not None:
+                v_node[vi], v_snap[vi] = container_nodes[best_idx], container_snap[best_idx]
+                v_gid[vi] = container_gids[best_idx]
+            v_load[vi] += demand
+            v_dist[vi] += real_dist
+            v_collected_ton[vi] += demand
+
+            v_route[vi].add_container(best_idx, container_lats[best_idx], container_lons[best_idx],
+                                      new_minute_idx, v_load[vi])
+
+            mark_collected(best_idx)
+
+            if t < day_minutes:
+                heapq.heappush(heap, (t, vi))
+
+        # Dizi durumunu araç sözlüklerine geri yaz
+        for vi, v in enumerate(vehicles_data):
+            v["pos"] = (v_lat[vi], v_lon[vi])
+            v["load"] = float(v_load[vi])
+            v["distance"] = float(v_dist[vi])
+            v["unloads"] = int(v_unloads[vi])
+            v["collected_tonnage"] = float(v_collected_ton[vi])
+            v["time"] = day_base + timedelta(minutes=float(v_minute[vi]))
+
+        return collected
+
+    def plan(self, target_date, config=None, dow=None, fleet=None):
+        """
+        Tam araç yönetimli rota planlama:
+        - Crane → yeraltı
+        - Large → geniş sokaklar
+        - Small → dar sokaklar dahil her yer
+        - Kapasite dolunca boşaltma
+
+        Args:
+            target_date: Planlanacak tarih
+            config: PlannerConfig (None ise DEFAULT_CONFIG)
+            dow: Haftanın günü (None ise target_date.weekday())
+            fleet: Filo DataFrame'i (None ise context filosu)
+
+        Returns:
+            (vehicles_data, result_df)
+        """
+        cfg = config if config is not None else DEFAULT_CONFIG
+        log = print if cfg.verbose else _silent
+
+        log(f"\n{'='*60}")
+        log(f"🚛 TAM ARAÇ YÖNETİMLİ ROTA - {target_date.strftime('%Y-%m-%d %A')}")
+        log(f"{'='*60}")
+
+        day = self.prepare_day(target_date, cfg, dow)
+        if day is None:
+            return [], pd.DataFrame()
+        day_containers = day.day_containers
+
+        # Konteyner istatistikleri
+        underground_count = day_containers['is_underground'].sum()
+        narrow_street_count = (day_containers['street_width'] < 5).sum()
+
+        log(f"\n📦 KONTEYNER ANALİZİ:")
+        log(f"   Toplam: {len(day_containers)}")
+        log(f"   Yeraltı: {underground_count} (sadece CRANE alabilir)")
+        log(f"   Dar sokak (<5m): {narrow_street_count} (sadece SMALL girebilir)")
+        log(f"   Toplam talep: {day_containers['demand_ton'].sum():.1f} ton")
+
+        # Araçların gerçek başlangıç konumları (start positions JSON'dan)
+        log(f"\n📍 ARAÇ BAŞLANGIÇ KONUMLARI:")
+        vehicles_with_real_start = 0
+        for vid, pos_data in self.vehicle_start_positions.items():
+            log(f"   Araç {vid}: {pos_data['mahalle']} ({pos_data['lat']:.4f}, {pos_data['lon']:.4f})")
+            vehicles_with_real_start += 1
+            if vehicles_with_real_start >= 5:  # İlk 5 tanesini göster
+                remaining = len(self.vehicle_start_positions) - 5
+                if remaining > 0:
+                    log(f"   ... ve {remaining} araç daha")
+                break
+
+        vehicles_data, collected = self.plan_day(day, cfg, fleet)
+        result_df = routes_to_dataframe(vehicles_data, day, cfg)
+        self.report(day, vehicles_data, collected, result_df, cfg)
+        return vehicles_data, result_df
+
+    def plan_day(self, day, config=None, fleet=None):
+        """
+        Hazırlanmış bir gün (prepare_day çıktısı) için araç rotaları: şablon
+        onarımı, yoksa simulate_day + yerel arama. Günü zaten hazırlamış
+        çağıranlar (senaryo taraması vb.) prepare_day'i tekrarlamadan kullanır.
+
+        Returns:
+            (vehicles_data, collected)
+        """
+        cfg = config if config is not None else DEFAULT_CONFIG
+        repaired = self.plan_from_template(day, cfg, fleet) if cfg.plan_templates else None
+        if repaired is not None:
+            return repaired
+        vehicles_data = self.init_vehicles(day, cfg, fleet)
+        collected = self.simulate_day(day, vehicles_data, cfg)
+        if cfg.local_search_sec > 0:
+            self.improve_routes(day, vehicles_data, cfg)
+        if cfg.plan_templates:
+            self.store_template(day, vehicles_data, collected, cfg)
+        return vehicles_data, collected
+
+    def _route_improver(self, day, vehicles_data, cfg):
+        """Günün konteynerleri ve araçları için LegMetric + RouteImprover"""
+        day_containers = day.day_containers
+        lats = day_containers["lat"].values
+        lons = day_containers["lon"].values
+
+        tables = gids = unload_km = road = nodes = snap_km = None
+        if cfg.road_distances and self.road_graph is not None and "road_node" in day_containers:
+            road = self.road_graph
+            tables, gids, unload_km = self.distance_tables, day_containers["container_gid"].values, {}
+            nodes, snap_km = day_containers["road_node"].values, day_containers["road_snap_km"].values
+            unload_node, unload_snap = road.snap(day.unload_pos[0], day.unload_pos[1])
+            straight = haversine_km_vectorized(lons, lats, day.unload_pos[1], day.unload_pos[0]) * 1.3
+            for w in {float(v["min_street_width"]) for v in vehicles_data}:
+                drive = road.distances_from(unload_node[0], w)[day_containers["road_node"].values]
+                drive = drive + day_containers["road_snap_km"].values + float(unload_snap[0])
+                unload_km[w] = np.where(np.isfinite(drive), drive, straight)
+
+        metric = LegMetric(lats, lons, day.unload_pos,
+                           [v["start_pos"] for v in vehicles_data],
+                           [v["min_street_width"] for v in vehicles_data],
+                           tables, gids, unload_km, road, nodes, snap_km, self.road_km_cache)
+        access_table = self.vehicle_mgr.build_access_table(day_containers["is_underground"].values,
+                                                           day_containers["street_width"].values)
+        t = day.target_date
+        return RouteImprover(
+            metric, day_containers["demand_ton"].values, day_containers["is_high_pop"].values,
+            np.array([access_table[v["category"]]["mask"] for v in vehicles_data]).reshape(len(vehicles_data), -1),
+            cfg.slot_group_table(), [v["capacity"] for v in vehicles_data],
+            cfg.avg_speed_kmh, cfg.container_service_sec, cfg.unload_wait_min,
+            datetime(t.year, t.month, t.day, cfg.day_start_hour), cfg.day_end_hour,
+            [cfg.is_peak_hour(h) for h in range(48)])
+
+    def improve_routes(self, day, vehicles_data, config=None, time_budget_s=None):
+        """
+        simulate_day çıktısını yerel aramayla (2-opt, Or-opt, relocate, swap)
+        iyileştir. vehicles_data yerinde güncellenir.
+
+        Returns:
+            Hamle istatistikleri (bkz. RouteImprover.improve)
+        """
+        cfg = config if config is not None else DEFAULT_CONFIG
+        log = print if cfg.verbose else _silent
+        budget = time_budget_s if time_budget_s is not None else cfg.local_search_sec
+        improver = self._route_improver(day, vehicles_data, cfg)
+        before_viol = peak_violations(vehicles_data, day, cfg)
+        if not cfg.road_distances:
+            # Kuş uçuşu modda hamlesiz rota planlayıcının dakikalarını aynen vermeli
+            improver.load_routes(vehicles_data)
+            drift = improver.replay_mismatch(vehicles_data)
+            if drift:
+                log(f"⚠️ Yerel arama zamanlaması {len(drift)} araçta planlayıcıdan farklı")
+        stats = improver.improve(vehicles_data, budget)
+        stats["peak_violations"] = (before_viol, peak_violations(vehicles_data, day, cfg))
+
+        log(f"\n🔧 YEREL ARAMA ({stats['seconds']:.2f}s, {stats['rounds']} tur): "
+            f"{stats['before_km']:.1f} km -> {stats['after_km']:.1f} km")
+        if stats["reverted"]:
+            log("⚠️ Yerel arama toplam mesafeyi artırdı, yüklenen rotalara geri dönüldü")
+        if stats["peak_violations"][1] > before_viol:
+            log(f"⚠️ Peak ihlali arttı: {before_viol} -> {stats['peak_violations'][1]}")
+        for move, m in stats["moves"].items():
+            log(f"   {move}: {m['applied']} uygulandı / {m['rejected']} reddedildi / "
+                f"{m['evaluated']} aday, {m['saved_km']:.1f} km kazanç")
+        return stats
+
+    def plan_anytime(self, target_date, time_budget_s, config=None, dow=None, fleet=None,
+                     report_every_s=ANYTIME_REPORT_SEC):
+        """
+        Anytime planlama (üreteç): greedy planı hemen verir, sonra duvar saati
+        bütçesi dolana kadar yerel aramayla iyileştirip her daha iyi planı
+        (en sık report_every_s saniyede bir) verir. Çağıran döngüyü istediği
+        an bırakabilir; son alınan plan o ana kadarki en iyi plandır.
+        Şablon onarımı kullanılmaz, her zaman tam greedy plan yapılır.
+
+        Args:
+            time_budget_s: Greedy plan dahil toplam süre bütçesi (saniye)
+
+        Yields:
+            {"iteration", "elapsed_s", "rounds", "search_km", "km", "unloads",
+             "stops", "collected_tonnage", "vehicles", "result_df"}
+            Greedy plan dahil tüm planlar yerel arama ölçüsüyle yazılır, km ile
+            search_km aynıdır. Peak saatte varılan yüksek nüfuslu konteyner
+            sayısı greedy plandakini aşan ara sonuç verilmez.
+        """
+        cfg = config if config is not None else DEFAULT_CONFIG
+        log = print if cfg.verbose else _silent
+        started = time.time()
+        day = self.prepare_day(target_date, cfg, dow)
+        if day is None:
+            return
+        vehicles_data = self.init_vehicles(day, cfg, fleet)
+        self.simulate_day(day, vehicles_data, cfg)
+        improver = self._route_improver(day, vehicles_data, cfg)
+        search = improver.search(vehicles_data, max(time_budget_s - (time.time() - started), 0.0))
+
+        def incumbent(iteration, search_km):
+            vehicles = [dict(v, route=v["route"].copy()) for v in vehicles_data]
+            result_df = routes_to_dataframe(vehicles, day, cfg)
+            elapsed = time.time() - started
+            log(f"⏱️ ANYTIME #{iteration} ({elapsed:.1f}s, {improver.rounds} tur): {search_km:.1f} km")
+            return {
+                "iteration": iteration,
+                "elapsed_s": round(elapsed, 3),
+                "rounds": improver.rounds,
+                "search_km": round(search_km, 3),
+                "km": round(sum(v["distance"] for v in vehicles), 3),
+                "unloads": int(sum(v["unloads"] for v in vehicles)),
+                "stops": int((result_df["container_idx"] >= 0).sum()) if not result_df.empty else 0,
+                "collected_tonnage": round(sum(v["collected_tonnage"] for v in vehicles), 2),
+                "vehicles": vehicles,
+                "result_df": result_df,
+            }
+
+        # search ilk adımda sadece rotaları yükler; greedy plan onun ölçüsüyle yazılıp verilir
+        done = next(search, StopIteration) is StopIteration
+        improver.write_routes(vehicles_data)
+        allowed_viol = peak_violations(vehicles_data, day, cfg)
+        best_km = improver.before_km
+        iteration = 0
+        yield incumbent(iteration, best_km)
+        last_report = time.time()
+        while not done:
+            done = next(search, StopIteration) is StopIteration
+            if not done and time.time() - last_report < report_every_s:
+                continue
+            km = improver.current_km()
+            if km < best_km - 1e-6:
+                improver.write_routes(vehicles_data)
+                # Dilim kurallarını bozan ara sonuç verilmez; arama devam eder
+                if peak_violations(vehicles_data, day, cfg) <= allowed_viol:
+                    best_km, iteration = km, iteration + 1
+                    yield incumbent(iteration, km)
+            last_report = time.time()
+
+    def plan_within(self, target_date, time_budget_s, config=None, dow=None, fleet=None, callback=None,
+                    report_every_s=ANYTIME_REPORT_SEC):
+        """
+        Bütçe içindeki en iyi plan: plan_anytime'ı sonuna kadar çalıştırır,
+        her iyileşen planı (varsa) callback(incumbent) ile bildirir.
+
+        Returns:
+            (vehicles_data, result_df)
+        """
+        best = None
+        for best in self.plan_anytime(target_date, time_budget_s, config, dow, fleet, report_every_s):
+            if callback is not None:
+                callback(best)
+        if best is None:
+            return [], pd.DataFrame()
+        return best["vehicles"], best["result_df"]
+
+    # --------------------------------------------------------
+    # Haftalık şablon planlar
+    # --------------------------------------------------------
+    def template_key(self, day, config=None, fleet=None):
+        """Şablon anahtarı: kaynaklar, gün, konfigürasyon, filo, ML ağırlıkları, konteyner kümesi"""
+        cfg = config if config is not None else DEFAULT_CONFIG
+        params = {k: v for k, v in asdict(cfg).items() if k not in ("verbose", "plan_templates")}
+        fleet = fleet if fleet is not None else self.vehicle_mgr.fleet
+        index = day.index if day.index is not None else day.day_containers["container_gid"].values
+        return template_key(self.inputs_hash, day.dow, params,
+                            sorted(fleet["vehicle_id"].tolist()),
+                            np.asarray(self.ml_model.weights, dtype=np.float64),
+                            np.asarray(index, dtype=np.int64))
+
+    def store_template(self, day, vehicles_data, collected, config=None, fleet=None):
+        """Tam planın seferlerini (konteyner sıraları) haftanın günü şablonu olarak kaydet"""
+        cfg = config if config is not None else DEFAULT_CONFIG
+        trips, closed, limits = self._route_improver(day, vehicles_data, cfg).template(vehicles_data)
+        self.plan_templates.put(self.template_key(day, cfg, fleet), {
+            "dow": day.dow,
+            "created_for": day.target_date.strftime("%Y-%m-%d"),
+            "vehicle_ids": [v["id"] for v in vehicles_data],
+            "trips": trips,
+            "closed": closed,
+            "limits": limits,
+            "collected": np.asarray(collected, dtype=bool),
+        })
+
+    def plan_from_template(self, day, config=None, fleet=None):
+        """
+        Haftanın günü şablonunu bugünkü taleplerle onar: araçlar şablondaki
+        konteyner sırasını korur, yük ve boşaltma seferleri yeniden
+        dengelenir. Şablon yoksa, onarım kapasite / vardiya sonunu ihlal
+        ederse veya onarılan planda peak saatte varılan yüksek nüfuslu
+        konteyner varsa None döner (tam plan gerekir).
+
+        Returns:
+            (vehicles_data, collected) veya None
+        """
+        cfg = config if config is not None else DEFAULT_CONFIG
+        log = print if cfg.verbose else _silent
+        start = time.time()
+        template = self.plan_templates.get(self.template_key(day, cfg, fleet))
+        if template is None:
+            log(f"📋 {day.target_date:%A} için şablon plan yok, tam plan yapılıyor")
+            return None
+
+        vehicles_data = self.init_vehicles(day, cfg, fleet)
+        if [v["id"] for v in vehicles_data] != template["vehicle_ids"]:
+            return None
+        improver = self._route_improver(day, vehicles_data, cfg)
+        if not improver.rebalance(vehicles_data, template["trips"], template["closed"], template["limits"]):
+            log(f"♻️ Şablon onarımı kapasite/vardiya ihlali verdi ({template['created_for']} şablonu), tam plan yapılıyor")
+            return None
+        violations = peak_violations(vehicles_data, day, cfg)
+        if violations:
+            log(f"♻️ Onarılan şablonda {violations} peak ihlali ({template['created_for']} şablonu), tam plan yapılıyor")
+            return None
+
+        access_table = self.vehicle_mgr.build_access_table(day.day_containers["is_underground"].values,
+                                                           day.day_containers["street_width"].values)
+        for v in vehicles_data:
+            v["skipped_underground"] = access_table[v["category"]]["skipped_underground"]
+            v["skipped_narrow"] = access_table[v["category"]]["skipped_narrow"]
+        log(f"📋 Şablon plan onarıldı ({template['created_for']} şablonu, "
+            f"{sum(v['unloads'] for v in vehicles_data)} boşaltma, {(time.time() - start) * 1000:.0f} ms)")
+        return vehicles_data, template["collected"].copy()
+
+    def report(self, day, vehicles_data, collected, result_df, config=None):
+        """Plan sonuç istatistiklerini yazdır"""
+        cfg = config if config is not None else DEFAULT_CONFIG
+        if not cfg.verbose:
+            return
+        day_containers = day.day_containers
+        adjusted_target = day.adjusted_target
+
+        # İstatistikler
+        total_collected = np.sum(collected)
+        total_tonnage_collected = sum(v["collected_tonnage"] for v in vehicles_data)
+
+        print(f"\n{'='*60}")
+        print("📊 SONUÇ İSTATİSTİKLERİ")
+        print(f"{'='*60}")
+        print(f"🎯 Hedef tonaj: {adjusted_target:.1f} ton")
+        print(f"✅ Toplanan tonaj: {total_tonnage_collected:.1f} ton ({100*total_tonnage_collected/adjusted_target:.1f}%)")
+        print(f"📦 Toplanan konteyner: {total_collected} / {len(day_containers)} ({100*total_collected/len(day_containers):.1f}%)")
+        print(f"🚛 Aktif araç: {len([v for v in vehicles_data if len(v['route']) > 0])}")
+        print(f"📏 Toplam mesafe: {sum(v['distance'] for v in vehicles_data):.1f} km")
+        print(f"🔄 Toplam boşaltma: {sum(v['unloads'] for v in vehicles_data)}")
+
+        # Araç kategorisi bazlı özet
+        print(f"\n--- Araç Kategorisi Performansı ---")
+        for cat in ['CRANE', 'LARGE', 'SMALL']:
+            cat_vehicles = [v for v in vehicles_data if v['category'] == cat and len(v['route']) > 0]
+            if cat_vehicles:
+                total_ton = sum(v['collected_tonnage'] for v in cat_vehicles)
+                total_stops = sum(len(v['route']) - v['route'].count(KIND_UNLOAD) for v in cat_vehicles)
+                total_unloads = sum(v['unloads'] for v in cat_vehicles)
+                print(f"   {cat}: {len(cat_vehicles)} araç, {total_ton:.1f} ton, {total_stops} durak, {total_unloads} boşaltma")
+
+        # Toplanamayan konteyner analizi
+        not_collected = day_containers[~collected]
+        if len(not_collected) > 0:
+            print(f"\n--- Toplanamayan Konteynerler ({len(not_collected)}) ---")
+            underground_not = not_collected['is_underground'].sum()
+            narrow_not = (not_collected['street_width'] < 5).sum()
+            print(f"   Yeraltı: {underground_not}")
+            print(f"   Dar sokak (<5m): {narrow_not}")
+
+        # Peak analizi
+        if not result_df.empty:
+            print(f"\n--- Peak Saat Analizi ---")
+            for peak_name, (start, end) in [("Sabah Peak", cfg.peak_morning), ("Akşam Peak", cfg.peak_evening)]:
+                peak_data = result_df[
+                    (result_df["hour"] >= start) &
+                    (result_df["hour"] < end) &
+                    (result_df["container_idx"] != -1)
+                ]
+                if len(peak_data) > 0:
+                    high_in_peak = len([m for m in peak_data["mahalle"].unique() if m in self.high_pop_mahs])
+                    print(f"{peak_name} ({start:02d}-{end:02d}): {len(peak_data)} konteyner, yüksek nüfuslu mahalle: {high_in_peak}")
+
+
+class DayProblem:
+    """Bir günün planlama girdileri (PlannerContext.prepare_day çıktısı)"""
+
+    def __init__(self, target_date, dow, adjusted_target, neighborhoods, day_containers,
+                 high_pop, low_pop, default_start_pos, unload_pos, index=None):
+        self.target_date = target_date
+        self.dow = dow
+        self.adjusted_target = adjusted_target
+        self.neighborhoods = neighborhoods
+        self.day_containers = day_containers
+        self.high_pop = high_pop
+        self.low_pop = low_pop
+        self.default_start_pos = default_start_pos
+        self.unload_pos = unload_pos
+        # day_containers satırlarının context konteyner tablosundaki sırası
+        self.index = index
+
+
+VEHICLE_COLUMNS = ["vehicle_id", "vehicle_name", "vehicle_type", "vehicle_category", "vehicle_capacity", "is_crane"]
+STOP_COLUMNS = ["container_idx", "mahalle", "lat", "lon", "tip", "demand_ton", "hour", "load_ton", "street_width"]
+ROUTE_COLUMNS = VEHICLE_COLUMNS + ["step"] + STOP_COLUMNS
+
+def routes_to_dataframe(vehicles_data, day=None, config=None):
+    """
+    Araç rotalarını düz (durak başına bir satır) DataFrame'e çevir.
+
+    Sütunlu rota kayıtları birleştirilir; konteyner alanları (mahalle, tip,
+    talep, sokak genişliği, koordinat) günün konteyner tablosundan indeksle,
+    araç alanları araç tablosundan sahip indeksiyle eklenir. Yük, talebin
+    sefer içi kümülatif toplamı olarak tam hassasiyetle yeniden hesaplanır.
+    """
+    cfg = config if config is not None else DEFAULT_CONFIG
+    if not vehicles_data:
+        return pd.DataFrame(columns=ROUTE_COLUMNS)
+    owner, step, cols = concat_routes([v["route"] for v in vehicles_data])
+    idx = cols["container"].astype(np.int64)
+    is_container = idx >= 0
+    is_start = cols["kind"] == KIND_START
+    is_unload = cols["kind"] == KIND_UNLOAD
+    day_containers = day.day_containers if day is not None else None
+    has_table = day_containers is not None and len(day_containers) > 0
+
+    def take(name, fill, dtype):
+        out = np.full(len(idx), fill, dtype=dtype)
+        if has_table:
+            out[is_container] = day_containers[name].to_numpy()[idx[is_container]]
+        return out
+
+    mahalle = take("mahalle_norm", cfg.unload_mah, object)
+    mahalle[is_start] = np.array([v["start_mahalle"] for v in vehicles_data], dtype=object)[owner[is_start]]
+    tip = take("tip_norm", "BOŞALTMA", object)
+    tip[is_start] = "BASLANGIC"
+    demand = take("demand_ton", 0.0, np.float64)
+    # Koordinatlar float32 kayıt yerine kaynaklarından tam hassasiyetle
+    lat = take("lat", 0.0, np.float64)
+    lon = take("lon", 0.0, np.float64)
+    starts = np.array([v["start_pos"] for v in vehicles_data], dtype=np.float64).reshape(-1, 2)
+    lat[is_start], lon[is_start] = starts[owner[is_start], 0], starts[owner[is_start], 1]
+    if day is not None:
+        lat[is_unload], lon[is_unload] = day.unload_pos
+    else:
+        lat[is_unload], lon[is_unload] = cols["lat"][is_unload], cols["lon"][is_unload]
+    # Yük: her seferde (araç başlangıcı veya boşaltmadan itibaren) kümülatif talep;
+    # planlayıcıdaki toplama sırasıyla aynı olduğundan yuvarlama da aynıdır
+    bounds = np.flatnonzero(is_start | is_unload)
+    load = np.concatenate([np.cumsum(part) for part in np.split(demand, bounds[1:])])
+
+    vehicle_df = pd.DataFrame({
+        "vehicle_id": [v["id"] for v in vehicles_data],
+        "vehicle_name": [v["name"] for v in vehicles_data],
+        "vehicle_type": [v["type"] for v in vehicles_data],
+        "vehicle_category": [v["category"] for v in vehicles_data],
+        "vehicle_capacity": [v["capacity"] for v in vehicles_data],
+        "is_crane": [v["is_crane"] for v in vehicles_data],
+    })
+    stops_df = pd.DataFrame({
+        "step": step,
+        "container_idx": idx,
+        "mahalle": mahalle,
+        "lat": lat,
+        "lon": lon,
+        "tip": tip,
+        "demand_ton": demand,
+        "hour": cfg.day_start_hour + cols["minute"].astype(np.int64) // 60,
+        "load_ton": np.round(load, 2),
+        "street_width": take("street_width", 99.0, np.float64),
+    })
+    return pd.concat([vehicle_df.take(owner).reset_index(drop=True), stops_df], axis=1)
+
+def peak_violations(vehicles_data, day, config=None):
+    """Peak saatte varılan yüksek nüfuslu konteyner sayısı (kayıtlı durak dakikalarına göre)"""
+    cfg = config if config is not None else DEFAULT_CONFIG
+    high_pop = day.day_containers["is_high_pop"].values
+    peak = np.array([cfg.is_peak_hour(h) for h in range(48)])
+    total = 0
     for v in vehicles_data:
-        for i, stop in enumerate(v["route"]):
-            all_routes.append({
-                "vehicle_id": v["id"],
-                "vehicle_name": v["name"],
-                "vehicle_type": v["type"],
-                "vehicle_category": v["category"],
-                "vehicle_capacity": v["capacity"],
-                "is_crane": v["is_crane"],
-                "step": i + 1,
-                **stop
+        c = v["route"].view("container").astype(np.int64)
+        hours = np.minimum(cfg.day_start_hour + v["route"].view("minute").astype(np.int64) // 60, 47)
+        total += int(np.count_nonzero((c >= 0) & high_pop[np.maximum(c, 0)] & peak[hours]))
+    return total
+
+def _silent(*args, **kwargs):
+    pass
+
+# ============================================================
+# VARSAYILAN CONTEXT (tembel yükleme)
+# ============================================================
+_DEFAULT_CONTEXT = None
+_DEFAULT_CONTEXT_LOCK = threading.Lock()
+
+def get_default_context():
+    """DATA_DIR'den bir kez yüklenen paylaşımlı context'i döndür"""
+    global _DEFAULT_CONTEXT
+    if _DEFAULT_CONTEXT is None:
+        with _DEFAULT_CONTEXT_LOCK:
+            if _DEFAULT_CONTEXT is None:
+                _DEFAULT_CONTEXT = PlannerContext.build()
+    return _DEFAULT_CONTEXT
+
+def plan_full_vehicle_routes(dow: int, target_date: datetime, config: Optional[PlannerConfig] = None,
+                             context: Optional[PlannerContext] = None):
+    """
+    Geriye uyumlu giriş noktası. context verilmezse varsayılan context
+    ilk çağrıda yüklenir ve sonraki çağrılarda tekrar kullanılır.
+    """
+    ctx = context if context is not None else get_default_context()
+    return ctx.plan(target_date, config, dow=dow)
+
+def plan_full_vehicle_routes_anytime(dow: int, target_date: datetime, time_budget_s: float,
+                                     config: Optional[PlannerConfig] = None,
+                                     context: Optional[PlannerContext] = None):
+    """
+    plan_full_vehicle_routes'un anytime hali: greedy planı hemen, sonra
+    bütçe içinde her iyileşen planı verir (bkz. PlannerContext.plan_anytime).
+    """
+    ctx = context if context is not None else get_default_context()
+    return ctx.plan_anytime(target_date, time_budget_s, config, dow=dow)
+
+def write_plan_outputs(vehicles, result_df, target_date, output_dir=None):
+    """Planı rota_fullvehicle_YYYYMMDD.csv ve routes_api_YYYYMMDD.json olarak kaydet"""
+    output_dir = Path(output_dir) if output_dir is not None else DATA_DIR
+    if result_df.empty:
+        return None, None
+
+    output_path = output_dir / f"rota_fullvehicle_{target_date.strftime('%Y%m%d')}.csv"
+    result_df.to_csv(output_path, index=False)
+    print(f"✅ Kaydedildi: {output_path}")
+
+    # JSON formatında da kaydet
+    json_output = {
+        "date": target_date.strftime("%Y-%m-%d"),
+        "day": target_date.strftime("%A").upper(),
+        "total_vehicles": len([v for v in vehicles if len(v['route']) > 1]),
+        "total_stops": len(result_df[result_df['container_idx'] >= 0]),
+        "vehicles": []
+    }
+
+    # Durak listeleri sözlük döngüsü yerine tablodan araç bazında bölünür
+    routes_by_vehicle = {vid: group[STOP_COLUMNS].to_dict("records")
+                         for vid, group in result_df.groupby("vehicle_id", sort=False)}
+
+    for v in vehicles:
+        if len(v['route']) > 1:  # Sadece başlangıç dışında durak varsa
+            json_output["vehicles"].append({
+                "vehicle_id": v['id'],
+                "vehicle_name": v['name'],
+                "vehicle_type": v['type'],
+                "vehicle_category": v['category'],
+                "capacity_ton": v['capacity'],
+                "start_position": {
+                    "lat": v['start_pos'][0],
+                    "lon": v['start_pos'][1],
+                    "mahalle": v['start_mahalle']
+                },
+                "total_stops": v['route'].count(KIND_CONTAINER),
+                "collected_tonnage": round(v['collected_tonnage'], 2),
+                "total_distance_km": round(v['distance'], 2),
+                "unloads": v['unloads'],
+                "route": routes_by_vehicle.get(v['id'], [])
             })
-    
-    result_df = pd.DataFrame(all_routes)
-    
-    # İstatistikler
-    total_collected = np.sum(collected)
-    total_tonnage_collected = sum(v["collected_tonnage"] for v in vehicles_data)
-    
-    print(f"\n{'='*60}")
-    print("📊 SONUÇ İSTATİSTİKLERİ")
-    print(f"{'='*60}")
-    print(f"🎯 Hedef tonaj: {adjusted_target:.1f} ton")
-    print(f"✅ Toplanan tonaj: {total_tonnage_collected:.1f} ton ({100*total_tonnage_collected/adjusted_target:.1f}%)")
-    print(f"📦 Toplanan konteyner: {total_collected} / {len(day_containers)} ({100*total_collected/len(day_containers):.1f}%)")
-    print(f"🚛 Aktif araç: {len([v for v in vehicles_data if len(v['route']) > 0])}")
-    print(f"📏 Toplam mesafe: {sum(v['distance'] for v in vehicles_data):.1f} km")
-    print(f"🔄 Toplam boşaltma: {sum(v['unloads'] for v in vehicles_data)}")
-    
-    # Araç kategorisi bazlı özet
-    print(f"\n--- Araç Kategorisi Performansı ---")
-    for cat in ['CRANE', 'LARGE', 'SMALL']:
-        cat_vehicles = [v for v in vehicles_data if v['category'] == cat and len(v['route']) > 0]
-        if cat_vehicles:
-            total_ton = sum(v['collected_tonnage'] for v in cat_vehicles)
-            total_stops = sum(len([r for r in v['route'] if r['container_idx'] != -1]) for v in cat_vehicles)
-            total_unloads = sum(v['unloads'] for v in cat_vehicles)
-            print(f"   {cat}: {len(cat_vehicles)} araç, {total_ton:.1f} ton, {total_stops} durak, {total_unloads} boşaltma")
-    
-    # Toplanamayan konteyner analizi
-    not_collected = day_containers[~collected]
-    if len(not_collected) > 0:
-        print(f"\n--- Toplanamayan Konteynerler ({len(not_collected)}) ---")
-        underground_not = not_collected['is_underground'].sum()
-        narrow_not = (not_collected['street_width'] < 5).sum()
-        print(f"   Yeraltı: {underground_not}")
-        print(f"   Dar sokak (<5m): {narrow_not}")
-    
-    # Peak analizi
-    if not result_df.empty:
-        print(f"\n--- Peak Saat Analizi ---")
-        for peak_name, (start, end) in [("Sabah Peak (07-10)", (7, 10)), ("Akşam Peak (17-20)", (17, 20))]:
-            peak_data = result_df[
-                (result_df["hour"] >= start) & 
-                (result_df["hour"] < end) & 
-                (result_df["container_idx"] != -1)
-            ]
-            if len(peak_data) > 0:
-                high_in_peak = len([m for m in peak_data["mahalle"].unique() if m in high_pop_mahs])
-                print(f"{peak_name}: {len(peak_data)} konteyner, yüksek nüfuslu mahalle: {high_in_peak}")
-    
-    return vehicles_data, result_df
+
+    json_path = output_dir / f"routes_api_{target_date.strftime('%Y%m%d')}.json"
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(json_output, f, ensure_ascii=False, indent=2)
+    print(f"✅ JSON kaydedildi: {json_path}")
+    return output_path, json_path
 
 # ============================================================
 # ÇALIŞTIR
@@ -970,48 +1930,13 @@ if __name__ == "__main__":
     # 19 Aralık 2025 - Start positions referans tarihi
     target_date = datetime(2025, 12, 19)
     dow = target_date.weekday()  # Cuma = 4
-    
+
+    ctx = get_default_context()
+
     start_ts = time.time()
-    vehicles, result_df = plan_full_vehicle_routes(dow, target_date)
+    vehicles, result_df = ctx.plan(target_date, dow=dow)
     elapsed = time.time() - start_ts
-    
+
     print(f"\n⏱️ Toplam süre: {elapsed:.2f} saniye")
-    
-    if not result_df.empty:
-        output_path = DATA_DIR / f"rota_fullvehicle_{target_date.strftime('%Y%m%d')}.csv"
-        result_df.to_csv(output_path, index=False)
-        print(f"✅ Kaydedildi: {output_path}")
-        
-        # JSON formatında da kaydet
-        json_output = {
-            "date": target_date.strftime("%Y-%m-%d"),
-            "day": target_date.strftime("%A").upper(),
-            "total_vehicles": len([v for v in vehicles if len(v['route']) > 1]),
-            "total_stops": len(result_df[result_df['container_idx'] >= 0]),
-            "vehicles": []
-        }
-        
-        for v in vehicles:
-            if len(v['route']) > 1:  # Sadece başlangıç dışında durak varsa
-                json_output["vehicles"].append({
-                    "vehicle_id": v['id'],
-                    "vehicle_name": v['name'],
-                    "vehicle_type": v['type'],
-                    "vehicle_category": v['category'],
-                    "capacity_ton": v['capacity'],
-                    "start_position": {
-                        "lat": v['start_pos'][0],
-                        "lon": v['start_pos'][1],
-                        "mahalle": v['start_mahalle']
-                    },
-                    "total_stops": len([r for r in v['route'] if r['container_idx'] >= 0]),
-                    "collected_tonnage": round(v['collected_tonnage'], 2),
-                    "total_distance_km": round(v['distance'], 2),
-                    "unloads": v['unloads'],
-                    "route": v['route']
-                })
-        
-        json_path = DATA_DIR / f"routes_api_{target_date.strftime('%Y%m%d')}.json"
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(json_output, f, ensure_ascii=False, indent=2)
-        print(f"✅ JSON kaydedildi: {json_path}")
+
+    write_plan_outputs(vehicles, result_df, target_date)
@@ -0,0 +1,65 @@
+"""
+Konteyner Verisi Yardımcıları
+Mahalle adı normalizasyonu ve konteyner CSV okuyucu.
+
+Sadece pandas / numpy kullanır: Flask API'leri ve veritabanı importu
+(ör. mahalle_merkezleri üzerinden) planlayıcının ağır bağımlılıklarını
+(scipy, yol grafı, model eğitimi) yüklemeden bunları kullanabilir.
+güncel_v6_fullvehicle aynı fonksiyonları buradan alır.
+"""
+
+import re
+import numpy as np
+import pandas as pd
+
+TR_MAP = str.maketrans({
+    "Ç":"C","Ğ":"G","İ":"I","Ö":"O","Ş":"S","Ü":"U",
+    "ç":"C","ğ":"G","i":"I","ı":"I","ö":"O","ş":"S","ü":"U",
+})
+
+
+def normalize_text_tr(s):
+    if pd.isna(s): return ""
+    s = str(s).strip().translate(TR_MAP).upper()
+    for suffix in [" MAHALLESI", " MAHALLESİ", " MH.", " MH"]:
+        s = s.replace(suffix, "")
+    s = re.sub(r"[^0-9A-Z\s]", " ", s)
+    return re.sub(r"\s+", " ", s).strip()
+
+
+def container_capacity(tips):
+    """Konteyner tipinden kapasite (ton): yeraltı 3.0, 770L/400L/diğer × 0.25 doluluk"""
+    caps = np.zeros(len(tips))
+    tip_arr = pd.Series(tips).astype(str).str.upper()
+    caps[tip_arr.str.contains("YERALTI", na=False).values] = 3.0
+    mask_770 = tip_arr.str.contains("770", na=False) & ~tip_arr.str.contains("YERALTI", na=False)
+    caps[mask_770.values] = 0.77 * 0.25
+    mask_400 = tip_arr.str.contains("400", na=False) & ~tip_arr.str.contains("YERALTI", na=False)
+    caps[mask_400.values] = 0.40 * 0.25
+    caps[caps == 0] = 0.5 * 0.25
+    return caps
+
+
+def load_containers(path):
+    """Konteyner CSV'sini oku ve normalize et"""
+    containers_df = pd.read_csv(path)
+    containers_df.columns = [c.strip().lower() for c in containers_df.columns]
+    lat_col = next((c for c in containers_df.columns if 'lat' in c or 'enlem' in c), None)
+    lon_col = next((c for c in containers_df.columns if 'lon' in c or 'boylam' in c), None)
+    mah_col = next((c for c in containers_df.columns if 'mahalle' in c), None)
+    tip_col = next((c for c in containers_df.columns if 'tip' in c or 'type' in c), None)
+
+    containers_df = containers_df.dropna(subset=[lat_col, lon_col])
+    containers_df["lat"] = pd.to_numeric(containers_df[lat_col], errors="coerce")
+    containers_df["lon"] = pd.to_numeric(containers_df[lon_col], errors="coerce")
+    containers_df = containers_df.dropna(subset=["lat", "lon"])
+    containers_df["mahalle_norm"] = containers_df[mah_col].apply(normalize_text_tr) if mah_col else "UNKNOWN"
+    containers_df["tip_norm"] = containers_df[tip_col].apply(lambda x: str(x).upper().strip() if pd.notna(x) else "UNKNOWN") if tip_col else "UNKNOWN"
+    containers_df["is_collectible"] = ~containers_df["tip_norm"].str.contains("BILINMIYOR|UNKNOWN", case=False, na=True)
+    containers_df["is_underground"] = containers_df["tip_norm"].str.contains("YERALTI", case=False, na=False)
+    # Mahalle ve tip tamsayı kodları; kapasite tip başına bir kez hesaplanır
+    containers_df["mahalle_code"] = pd.factorize(containers_df["mahalle_norm"])[0].astype(np.int32)
+    tip_codes, tip_names = pd.factorize(containers_df["tip_norm"])
+    containers_df["tip_code"] = tip_codes.astype(np.int32)
+    containers_df["container_capacity"] = container_capacity(np.asarray(tip_names))[tip_codes]
+    return containers_df
@@ -0,0 +1,708 @@
+"""
+Rota İyileştirme (Yerel Arama)
+Greedy planlayıcının ürettiği rotaları süre bütçesi içinde iyileştirir.
+
+Rota, boşaltmalarla ayrılmış seferlerden oluşur (başlangıç -> sefer 0 ->
+boşaltma -> sefer 1 -> ...). Hamleler:
+- 2-opt: sefer içinde bir parçayı ters çevir
+- Or-opt: sefer içinde 1-3 konteynerlik parçayı başka yere taşı
+- relocate: konteyneri komşusunun bulunduğu başka bir sefere taşı
+- swap: farklı seferlerdeki iki komşu konteyneri yer değiştir
+
+Sefer içi hamleler seferin mesafe matrisi üzerinde tüm adaylar için
+vektörel hesaplanır; seferler arası hamleler sadece k en yakın komşu
+çiftlerine bakar. Her hamle sefer kapasitesini, araç kategorisinin
+erişim maskesini (yeraltı / sokak genişliği) korur; zaman dilimi (peak)
+ihlali sayısını artıran, vardiyayı uzatan veya rota mesafesini (yazılan
+ölçüyle, route_legs) düşürmeyen hamleler geri alınır. Boşaltma sayısı ve
+sefer yapısı değişmez.
+
+Mesafe ve zamanlama planlayıcıyla (simulate_day) aynıdır: kuş uçuşu
+bacaklar derece farkı × 111 × 1.3, boşaltmaya gidiş haversine × 1.3
+(yol mesafeleriyle tabloda olmayan rota bacakları gerçek en kısa yoldan,
+aday skorlamasında mahalle çiftinin dolanma oranıyla tahmin);
+araç gerçek başlangıç dakikasından çıkar ve konteynerin nüfus grubuna
+izin olmayan saatte izinli ilk saat başına kadar bekler. Hamle yapılmayan
+bir rota planlayıcının mesafe ve dakikalarını aynen verir.
+"""
+
+import time
+import numpy as np
+from datetime import timedelta
+from scipy.spatial import cKDTree
+
+UNLOAD = -1
+START = -2
+OPEN_END = -3            # Son seferin boşaltmasız ucu (mesafe 0)
+STRAIGHT_LINE_FACTOR = 1.3
+N_NEIGHBORS = 8          # Seferler arası hamlelerde konteyner başına bakılan komşu
+OR_OPT_MAX_LEN = 3
+MAX_TRIES = 5            # Uygunsuz çıkan en iyi hamleden sonra denenecek aday sayısı
+EPS_KM = 1e-6
+MOVES = ("2opt", "or_opt", "relocate", "swap")
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return 2 * 6371.0088 * np.arcsin(np.sqrt(a))
+
+
+def _planar_km(lat1, lon1, lat2, lon2):
+    """Planlayıcının aday mesafesi: derece farkı × 111"""
+    return np.sqrt((lat2 - lat1)**2 + (lon2 - lon1)**2) * 111
+
+
+def straight_km(lat1, lon1, lat2, lon2, to_unload):
+    """Kuş uçuşu bacak tahmini (planlayıcıyla aynı): boşaltmaya haversine, diğerleri derece × 111; × 1.3"""
+    return np.where(to_unload, _haversine_km(lat1, lon1, lat2, lon2),
+                    _planar_km(lat1, lon1, lat2, lon2)) * STRAIGHT_LINE_FACTOR
+
+
+def intra_moves(D, trip, stats=None):
+    """
+    Tek sefer için tüm 2-opt / Or-opt hamleleri: [(delta, tür, yeni sıra)]
+    iyiden kötüye. D, [önceki nokta, *trip, son nokta] dizisinin mesafe
+    matrisidir; stats verilirse tür başına "evaluated" sayacı artırılır.
+    """
+    m = len(trip)
+    if m < 2:
+        return []
+    cands = []
+
+    # 2-opt: ext[i..j] (1 <= i < j <= m) ters çevrilir
+    I, J = np.triu_indices(m, k=1)
+    I, J = I + 1, J + 1
+    delta = D[I - 1, J] + D[I, J + 1] - D[I - 1, I] - D[J, J + 1]
+    if stats is not None:
+        stats["2opt"]["evaluated"] += len(delta)
+    for k in np.argsort(delta)[:MAX_TRIES]:
+        if delta[k] < -EPS_KM:
+            i, j = I[k] - 1, J[k] - 1
+            new = np.concatenate([trip[:i], trip[i:j + 1][::-1], trip[j + 1:]])
+            cands.append((float(delta[k]), "2opt", new))
+
+    # Or-opt: ext[i..i+L-1] parçası ext[p] - ext[p+1] arasına (gerekirse ters) taşınır
+    for L in range(1, min(OR_OPT_MAX_LEN, m - 1) + 1):
+        S, Pm = np.meshgrid(np.arange(1, m - L + 2), np.arange(0, m + 1), indexing="ij")
+        E = S + L - 1
+        # Parçanın kendi kenarlarına ekleme hamle sayılmaz
+        valid = (Pm < S - 1) | (Pm > E)
+        gain = D[S - 1, S] + D[E, E + 1] - D[S - 1, E + 1]
+        ins = D[Pm, S] + D[E, Pm + 1] - D[Pm, Pm + 1]
+        ins_rev = D[Pm, E] + D[S, Pm + 1] - D[Pm, Pm + 1]
+        best_ins = np.minimum(ins, ins_rev)
+        delta = np.where(valid, best_ins - gain, np.inf)
+        if stats is not None:
+            stats["or_opt"]["evaluated"] += int(valid.sum())
+        flat = np.argsort(delta, axis=None)[:MAX_TRIES]
+        for f in flat:
+            si, pi = np.unravel_index(f, delta.shape)
+            d = delta[si, pi]
+            if not d < -EPS_KM:
+                break
+            s, p = S[si, pi] - 1, Pm[si, pi]  # trip içinde parça başı, ext'te ekleme kenarı
+            seg = trip[s:s + L]
+            if ins_rev[si, pi] < ins[si, pi]:
+                seg = seg[::-1]
+            rest = np.concatenate([trip[:s], trip[s + L:]])
+            # ext[p] sonrasına ekle: p, parçadan sonraysa çıkarılan L kadar kayar
+            at = p if p < s + 1 else p - L
+            new = np.concatenate([rest[:at], seg, rest[at:]])
+            cands.append((float(d), "or_opt", new))
+
+    cands.sort(key=lambda c: c[0])
+    return cands
+
+
+class LegMetric:
+    """
+    Nokta çiftleri arası mesafe (km), vektörel.
+    Noktalar: konteyner indeksi (>= 0), UNLOAD, START (aracın başlangıcı), OPEN_END.
+
+    Yol tabloları verilirse konteyner-konteyner bacakları araç genişliğine
+    ait mesafe tablosundan (tabloda yoksa mahalle dolanma oranıyla tahmin),
+    boşaltma bacakları unload_km'den okunur; diğerleri straight_km ile
+    tahmin edilir (planlayıcıyla aynı yedek). Yol grafı da
+    verilirse rota bacakları (route_legs) tahmin yerine planlayıcı gibi
+    gerçek en kısa yolla hesaplanır; hamle adayları tahminle skorlanır.
+    """
+
+    def __init__(self, lats, lons, unload_pos, starts, vehicle_width,
+                 tables=None, gids=None, unload_km=None, road=None, nodes=None, snap_km=None,
+                 road_cache=None):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.unload_pos = (float(unload_pos[0]), float(unload_pos[1]))
+        self.starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+        self.vehicle_width = np.asarray(vehicle_width, dtype=np.float64)
+        self.tables = tables or {}
+        self.gids = None if gids is None else np.asarray(gids, dtype=np.int64)
+        self.unload_km = unload_km or {}
+        self.road = road
+        if road is not None:
+            self.nodes = np.asarray(nodes, dtype=np.int64)
+            self.snap_km = np.asarray(snap_km, dtype=np.float64)
+            start_nodes, start_snap = road.snap(self.starts[:, 0], self.starts[:, 1])
+            self.start_nodes = start_nodes.astype(np.int64)
+            self.start_snap = start_snap.astype(np.float64)
+        # (kaynak düğüm, hedef düğüm, genişlik) -> km; aynı grafla çalışan metrikler paylaşabilir
+        self._road_km = road_cache if road_cache is not None else {}
+
+    def coords(self, p, veh):
+        c = np.maximum(p, 0)
+        lat = np.where(p >= 0, self.lats[c], np.where(p == UNLOAD, self.unload_pos[0], self.starts[veh, 0]))
+        lon = np.where(p >= 0, self.lons[c], np.where(p == UNLOAD, self.unload_pos[1], self.starts[veh, 1]))
+        return lat, lon
+
+    def legs(self, a, b, veh):
+        return self._legs(a, b, veh)[0]
+
+    def _legs(self, a, b, veh):
+        """(mesafeler, tahmin mi) - tahmin: tablo / boşaltma mesafesi bulunamayan bacak"""
+        a, b, veh = np.broadcast_arrays(np.asarray(a, dtype=np.int64), np.asarray(b, dtype=np.int64),
+                                        np.asarray(veh, dtype=np.int64))
+        shape = a.shape
+        a, b, veh = a.ravel(), b.ravel(), veh.ravel()
+        lat1, lon1 = self.coords(a, veh)
+        lat2, lon2 = self.coords(b, veh)
+        out = straight_km(lat1, lon1, lat2, lon2, b == UNLOAD)
+        estimated = np.ones(len(out), dtype=bool)
+
+        if self.gids is not None:
+            widths = self.vehicle_width[veh]
+            for w in np.unique(widths):
+                sel = widths == w
+                table = self.tables.get(float(w))
+                both = sel & (a >= 0) & (b >= 0) & (a != b)
+                if table is not None and both.any():
+                    drive = table.pair_lookup(self.gids[a[both]], self.gids[b[both]]).astype(np.float64)
+                    # Tablo tek yönlü komşuluk tutar: ters yönden de bak
+                    miss = np.isnan(drive)
+                    if miss.any():
+                        drive[miss] = table.pair_lookup(self.gids[b[both]][miss], self.gids[a[both]][miss])
+                    idx = np.flatnonzero(both)
+                    ok = ~np.isnan(drive)
+                    out[idx[ok]] = drive[ok]
+                    estimated[idx[ok]] = False
+                    # Tabloda olmayan çiftler: planlayıcı gibi mahalle dolanma oranıyla tahmin
+                    est = idx[~ok]
+                    out[est] = table.estimate(self.gids[a[est]], self.gids[b[est]],
+                                              _planar_km(lat1[est], lon1[est], lat2[est], lon2[est]))
+                unload = self.unload_km.get(float(w))
+                if unload is not None:
+                    to_u = sel & (a >= 0) & (b == UNLOAD)
+                    out[to_u] = unload[a[to_u]]
+                    from_u = sel & (a == UNLOAD) & (b >= 0)
+                    out[from_u] = unload[b[from_u]]
+                    estimated[to_u | from_u] = False
+
+        zero = (a == b) | (a == OPEN_END) | (b == OPEN_END)
+        out[zero] = 0.0
+        estimated[zero] = False
+        return out.reshape(shape), estimated.reshape(shape)
+
+    def route_legs(self, pts, veh):
+        """
+        Rota noktaları (pts) arası ardışık bacaklar. Yol grafı varsa tahmin
+        edilen konteyner bacakları (tabloda olmayan çift, başlangıçtan çıkış)
+        planlayıcı gibi gerçek en kısa yolla hesaplanır; yol yoksa tahmin kalır.
+        """
+        a, b = pts[:-1], pts[1:]
+        out, estimated = self._legs(a, b, veh)
+        if self.road is None:
+            return out
+        width = float(self.vehicle_width[veh])
+        for i in np.flatnonzero(estimated & (b >= 0) & ((a >= 0) | (a == START))):
+            src = self.nodes[a[i]] if a[i] >= 0 else self.start_nodes[veh]
+            key = (int(src), int(self.nodes[b[i]]), width)
+            drive = self._road_km.get(key)
+            if drive is None:
+                drive = self._road_km[key] = self.road.shortest_path_km(key[0], key[1], width)
+            if np.isfinite(drive):
+                if a[i] >= 0:
+                    out[i] = drive + self.snap_km[a[i]] + self.snap_km[b[i]]
+                else:
+                    out[i] = drive + (self.start_snap[veh] + self.snap_km[b[i]])
+        return out
+
+
+class RouteImprover:
+    """
+    Kullanım:
+        improver = RouteImprover(metric, demand, high_pop, access, slot_groups, ...)
+        stats = improver.improve(vehicles_data, time_budget_s=2.0)
+    vehicles_data yerinde güncellenir (rota, mesafe, tonaj, zaman).
+    Adım adım ilerleme için search() üreteci kullanılır.
+    """
+
+    def __init__(self, metric, demand, high_pop, vehicle_access, slot_groups, vehicle_capacity,
+                 avg_speed_kmh, container_service_sec, unload_wait_min, day_base, day_end_hour,
+                 peak_hours=None):
+        """
+        Args:
+            metric: LegMetric
+            demand, high_pop: (n,) konteyner talebi (ton) ve yüksek nüfus bayrağı
+            vehicle_access: (V, n) aracın alabileceği konteynerler (kategori kuralları)
+            slot_groups: (saat, 2) o saatte [düşük, yüksek] nüfuslu konteynere izin var mı
+            day_base: Vardiya başlangıcı (datetime)
+            peak_hours: (saat,) yüksek nüfuslu konteynere varılamayan saatler
+                (None ise yüksek nüfusa dilim izni olmayan saatler)
+        """
+        self.metric = metric
+        self.demand = np.asarray(demand, dtype=np.float64)
+        self.group = np.asarray(high_pop, dtype=np.int64)
+        self.access = np.asarray(vehicle_access, dtype=bool)
+        self.slot_groups = np.asarray(slot_groups, dtype=bool)  # (saat, [düşük, yüksek])
+        self.peak = (np.asarray(peak_hours, dtype=bool) if peak_hours is not None
+                     else ~self.slot_groups[:, 1])
+        # Bekleme sonrası çıkılabilecek saatler: dilim izni var ve (yüksek nüfusta) peak değil
+        self.open_hours = self.slot_groups & ~(self.peak[:, None] & np.array([False, True]))
+        self.cap = np.asarray(vehicle_capacity, dtype=np.float64)
+        self.speed = avg_speed_kmh
+        self.service_min = container_service_sec / 60
+        self.unload_wait = unload_wait_min
+        self.day_base = day_base
+        self.day_start_hour = day_base.hour
+        self.shift_min = (day_end_hour - day_base.hour) * 60
+        self.stats = {m: {"evaluated": 0, "applied": 0, "rejected": 0, "saved_km": 0.0} for m in MOVES}
+
+    # --------------------------------------------------------
+    # Rota <-> sefer dönüşümü
+    # --------------------------------------------------------
+    def load_routes(self, vehicles_data):
+        """Rota kayıtlarını boşaltmalardan seferlere böl (vehicles_data sadece okunur)"""
+        self.trips, self.closed = [], []
+        for v in vehicles_data:
+            # Rota boşaltmalardan bölünür; son parça boşaltmasız açık sefer
+            route = v["route"].view("container").astype(np.int64)
+            cuts = np.flatnonzero(route == UNLOAD)
+            self.trips.append([part[part >= 0] for part in np.split(route, cuts)])
+            self.closed.append([True] * len(cuts) + [False])
+        self._set_starts(vehicles_data)
+        self.loads = [[float(self.demand[t].sum()) for t in trips] for trips in self.trips]
+
+    def _set_starts(self, vehicles_data):
+        """Araçların gerçek başlangıç dakikası (rotanın başlangıç kaydı)"""
+        self.start_min = [float(v["route"].minute[0]) if len(v["route"]) else 0.0 for v in vehicles_data]
+
+    def _points(self, vi):
+        parts = [np.array([START])]
+        for t, trip in enumerate(self.trips[vi]):
+            parts.append(trip)
+            if self.closed[vi][t]:
+                parts.append(np.array([UNLOAD]))
+        return np.concatenate(parts)
+
+    def schedule(self, pts, legs, start):
+        """
+        pts[1:] noktalarının varış dakikaları (servis / boşaltma beklemesi dahil),
+        planlayıcının zaman kurallarıyla: araç bir konteynere ancak grubunun
+        (düşük / yüksek nüfus) dilim izni olan saatte yola çıkar ve yüksek
+        nüfuslu konteynere peak saatte varmaz; izin yoksa bulunduğu yerde
+        izinli ilk saat başına kadar bekler.
+
+        Args:
+            pts: Başlangıç noktası dahil nokta dizisi
+            legs: (len(pts) - 1,) bacak mesafeleri (km)
+            start: Başlangıç dakikası
+
+        Returns:
+            (varış dakikaları, dilim ihlali sayısı, bitiş dakikası) - ihlal:
+            tablo sonuna kadar izinli saati bulunamayan konteyner
+        """
+        nxt = pts[1:]
+        m = len(nxt)
+        is_c = nxt >= 0
+        grp = np.where(is_c, self.group[np.maximum(nxt, 0)], -1)  # -1: boşaltma, kural yok
+        high = grp == 1
+        # Planlayıcıyla aynı toplama sırası: konteynerde (t + yol) + servis, boşaltmada t + (yol + bekleme)
+        travel = legs / self.speed * 60
+        steps = np.empty((m, 2))
+        steps[:, 0] = np.where(nxt == UNLOAD, travel + self.unload_wait, travel)
+        steps[:, 1] = np.where(is_c, self.service_min, 0.0)
+
+        last_hour = len(self.slot_groups) - 1
+        arrive = np.empty(m)
+        viol, pos, t0 = 0, 0, float(start)
+        while pos < m:
+            acc = np.cumsum(np.concatenate([[t0], steps[pos:].ravel()]))
+            dep, arr = acc[0:-1:2], acc[2::2]
+            dep_h = np.minimum(self.day_start_hour + dep.astype(np.int64) // 60, last_hour)
+            arr_h = np.minimum(self.day_start_hour + arr.astype(np.int64) // 60, last_hour)
+            g = grp[pos:]
+            ok = (g < 0) | self.slot_groups[dep_h, np.maximum(g, 0)]
+            ok &= ~(high[pos:] & self.peak[arr_h])
+            bad = np.flatnonzero(~ok)
+            if len(bad) == 0:
+                arrive[pos:] = arr
+                break
+            k = int(bad[0])
+            arrive[pos:pos + k] = arr[:k]
+            i = pos + k
+            h0 = int(dep_h[k]) + 1
+            open_h = np.flatnonzero(self.open_hours[h0:, grp[i]])
+            if len(open_h):
+                # Çıkış izinli ilk saat başına kadar beklenir; i'den itibaren yeniden zamanlanır
+                t0 = float((h0 + open_h[0] - self.day_start_hour) * 60)
+                pos = i
+            else:
+                viol += 1
+                arrive[i] = arr[k]
+                t0, pos = float(arr[k]), i + 1
+        return arrive, viol, float(arrive[-1])
+
+    def _timeline(self, vi):
+        """(noktalar, varış dakikaları, bacaklar, dilim ihlali sayısı, bitiş dakikası)"""
+        pts = self._points(vi)
+        if len(pts) == 1:
+            return pts, np.zeros(0), np.zeros(0), 0, self.start_min[vi]
+        legs = self.metric.route_legs(pts, vi)
+        arrive, viol, end = self.schedule(pts, legs, self.start_min[vi])
+        return pts, arrive, legs, viol, end
+
+    def replay_mismatch(self, vehicles_data):
+        """
+        Yüklü rotaları yeniden zamanlayınca kayıtlı dakikaları tutmayan araçlar
+        (hamle yapılmadan yazılan rota planlayıcı çıktısını aynen vermeli)
+        """
+        last_minute = (48 - self.day_start_hour) * 60 - 1
+        out = []
+        for vi, v in enumerate(vehicles_data):
+            arrive = self._timeline(vi)[1]
+            stored = v["route"].view("minute")[1:]
+            if not np.array_equal(np.minimum(arrive.astype(np.int64), last_minute), stored):
+                out.append(vi)
+        return out
+
+    def route_km(self, vi):
+        return float(self._timeline(vi)[2].sum())
+
+    def _feasible(self, vis, before):
+        """Hamle sonrası araçlar: dilim ihlali artmamış ve vardiya uzamamış olmalı"""
+        for vi in vis:
+            _, _, _, viol, end = self._timeline(vi)
+            old_viol, old_end = before[vi][:2]
+            if viol > old_viol or end > max(old_end, self.shift_min) + 1e-6:
+                return False
+        return True
+
+    def _saving(self, vis, before):
+        """
+        Hamle sonrası araçların gerçek mesafe kazancı (km, route_legs ile).
+        Aday skoru tahminidir (yol modunda tabloda olmayan bacaklar kuş
+        uçuşu); kabul bu ölçüyle yapılır. Dilim ihlali artmış, vardiya
+        uzamış veya kazanç EPS_KM'yi geçmiyorsa None.
+        """
+        saved = 0.0
+        for vi in vis:
+            _, _, legs, viol, end = self._timeline(vi)
+            old_viol, old_end, old_km = before[vi]
+            if viol > old_viol or end > max(old_end, self.shift_min) + 1e-6:
+                return None
+            saved += old_km - float(legs.sum())
+        return saved if saved > EPS_KM else None
+
+    def _snapshot(self, vis):
+        """Araç başına (dilim ihlali, bitiş dakikası, rota mesafesi)"""
+        out = {}
+        for vi in vis:
+            _, _, legs, viol, end = self._timeline(vi)
+            out[vi] = (viol, end, float(legs.sum()))
+        return out
+
+    # --------------------------------------------------------
+    # Sefer içi: 2-opt ve Or-opt
+    # --------------------------------------------------------
+    def _trip_ends(self, vi, t):
+        prev = START if t == 0 else UNLOAD
+        end = UNLOAD if self.closed[vi][t] else OPEN_END
+        return prev, end
+
+    def _intra_candidates(self, vi, t):
+        """Seferdeki tüm 2-opt / Or-opt hamleleri: [(delta, tür, yeni sıra)] iyiden kötüye"""
+        trip = self.trips[vi][t]
+        if len(trip) < 2:
+            return []
+        prev, end = self._trip_ends(vi, t)
+        ext = np.concatenate([[prev], trip, [end]])
+        return intra_moves(self.metric.legs(ext[:, None], ext[None, :], vi), trip, self.stats)
+
+    def _intra_pass(self, deadline):
+        """Üreteç: her uygulanan hamleden sonra hamle türünü verir, sonunda iyileşme olup olmadığını döndürür"""
+        improved = False
+        for vi in range(len(self.trips)):
+            for t in range(len(self.trips[vi])):
+                while time.time() < deadline:
+                    cands = self._intra_candidates(vi, t)
+                    if not cands:
+                        break
+                    before = self._snapshot([vi])
+                    old = self.trips[vi][t]
+                    applied = False
+                    for delta, move, new in cands[:MAX_TRIES]:
+                        self.trips[vi][t] = new
+                        saved = self._saving([vi], before)
+                        if saved is not None:
+                            self.stats[move]["applied"] += 1
+                            self.stats[move]["saved_km"] += saved
+                            applied = improved = True
+                            yield move
+                            break
+                        self.trips[vi][t] = old
+                        self.stats[move]["rejected"] += 1
+                    if not applied:
+                        break
+        return improved
+
+    # --------------------------------------------------------
+    # Seferler arası: relocate ve swap
+    # --------------------------------------------------------
+    def _positions(self):
+        n = len(self.demand)
+        pos_v = np.full(n, -1, dtype=np.int64)
+        pos_t = np.full(n, -1, dtype=np.int64)
+        trip_load = np.zeros(n)
+        trip_len = np.zeros(n, dtype=np.int64)
+        prev = np.full(n, OPEN_END, dtype=np.int64)
+        nxt = np.full(n, OPEN_END, dtype=np.int64)
+        for vi, trips in enumerate(self.trips):
+            for t, trip in enumerate(trips):
+                if len(trip) == 0:
+                    continue
+                p, e = self._trip_ends(vi, t)
+                pos_v[trip], pos_t[trip] = vi, t
+                trip_load[trip], trip_len[trip] = self.loads[vi][t], len(trip)
+                prev[trip] = np.concatenate([[p], trip[:-1]])
+                nxt[trip] = np.concatenate([trip[1:], [e]])
+        return pos_v, pos_t, trip_load, trip_len, prev, nxt
+
+    def _inter_pass(self, deadline):
+        """Üreteç: _intra_pass gibi, her uygulanan relocate/swap hamlesinden sonra verir"""
+        pos_v, pos_t, trip_load, trip_len, prev, nxt = self._positions()
+        routed = np.flatnonzero(pos_v >= 0)
+        if len(routed) < 2:
+            return False
+        yield None
+        L = self.metric.legs
+        lats, lons = self.metric.lats[routed], self.metric.lons[routed]
+        xy = np.column_stack([lats, lons * np.cos(np.radians(lats.mean()))])
+        k = min(N_NEIGHBORS + 1, len(routed))
+        _, nn = cKDTree(xy).query(xy, k=k)
+        c = np.repeat(routed, k - 1)
+        n = routed[nn[:, 1:].ravel()]
+        va, vb = pos_v[c], pos_v[n]
+        diff_trip = (va != vb) | (pos_t[c] != pos_t[n])
+        c, n, va, vb = c[diff_trip], n[diff_trip], va[diff_trip], vb[diff_trip]
+        ta, tb = pos_t[c], pos_t[n]
+        load_a, load_b = trip_load[c], trip_load[n]
+        dem_c, dem_n = self.demand[c], self.demand[n]
+        acc_b_c = self.access[vb, c]
+        acc_a_n = self.access[va, n]
+        trip_len_a = trip_len[c]
+
+        # Çıkarma kazancı (A'da) ve ekleme maliyeti (B'de n'den sonra / önce)
+        gain_c = L(prev[c], c, va) + L(c, nxt[c], va) - L(prev[c], nxt[c], va)
+        ins_after = L(n, c, vb) + L(c, nxt[n], vb) - L(n, nxt[n], vb)
+        ins_before = L(prev[n], c, vb) + L(c, n, vb) - L(prev[n], n, vb)
+        reloc_ok = acc_b_c & (load_b + dem_c <= self.cap[vb] + 1e-9) & (trip_len_a > 1)
+        reloc_delta = np.where(reloc_ok, np.minimum(ins_after, ins_before) - gain_c, np.inf)
+        self.stats["relocate"]["evaluated"] += int(reloc_ok.sum())
+
+        swap_a = L(prev[c], n, va) + L(n, nxt[c], va) - L(prev[c], c, va) - L(c, nxt[c], va)
+        swap_b = L(prev[n], c, vb) + L(c, nxt[n], vb) - L(prev[n], n, vb) - L(n, nxt[n], vb)
+        swap_ok = (acc_b_c & acc_a_n
+                   & (load_a - dem_c + dem_n <= self.cap[va] + 1e-9)
+                   & (load_b - dem_n + dem_c <= self.cap[vb] + 1e-9))
+        swap_delta = np.where(swap_ok, swap_a + swap_b, np.inf)
+        self.stats["swap"]["evaluated"] += int(swap_ok.sum())
+
+        cand = [(reloc_delta[i], "relocate", i) for i in np.flatnonzero(reloc_delta < -EPS_KM)]
+        cand += [(swap_delta[i], "swap", i) for i in np.flatnonzero(swap_delta < -EPS_KM)]
+        cand.sort(key=lambda x: x[0])
+
+        touched = set()
+        improved = False
+        for delta, move, i in cand:
+            if time.time() >= deadline:
+                break
+            A, B = (int(va[i]), int(ta[i])), (int(vb[i]), int(tb[i]))
+            if A in touched or B in touched:
+                continue
+            ci, ni = int(c[i]), int(n[i])
+            vis = sorted({A[0], B[0]})
+            before = self._snapshot(vis)
+            old_a, old_b = self.trips[A[0]][A[1]], self.trips[B[0]][B[1]]
+            ia = int(np.flatnonzero(old_a == ci)[0])
+            ib = int(np.flatnonzero(old_b == ni)[0])
+            if move == "relocate":
+                new_a = np.delete(old_a, ia)
+                at = ib + 1 if ins_after[i] <= ins_before[i] else ib
+                new_b = np.insert(old_b, at, ci)
+                load_delta = (-self.demand[ci], self.demand[ci])
+            else:
+                new_a, new_b = old_a.copy(), old_b.copy()
+                new_a[ia], new_b[ib] = ni, ci
+                load_delta = (self.demand[ni] - self.demand[ci], self.demand[ci] - self.demand[ni])
+            self.trips[A[0]][A[1]], self.trips[B[0]][B[1]] = new_a, new_b
+            saved = self._saving(vis, before)
+            if saved is not None:
+                self.loads[A[0]][A[1]] += load_delta[0]
+                self.loads[B[0]][B[1]] += load_delta[1]
+                self.stats[move]["applied"] += 1
+                self.stats[move]["saved_km"] += saved
+                touched.update([A, B])
+                improved = True
+                yield move
+            else:
+                self.trips[A[0]][A[1]], self.trips[B[0]][B[1]] = old_a, old_b
+                self.stats[move]["rejected"] += 1
+        return improved
+
+    # --------------------------------------------------------
+    # Şablon onarımı
+    # --------------------------------------------------------
+    def template(self, vehicles_data):
+        """
+        Rotaların sefer yapısı ve araç başına (dilim ihlali, bitiş dakikası)
+        - şablon plan kaydı için: (seferler, kapalı bayrakları, limitler)
+        """
+        self.load_routes(vehicles_data)
+        limits = [self._snapshot([vi])[vi][:2] for vi in range(len(self.trips))]
+        return [list(t) for t in self.trips], [list(c) for c in self.closed], limits
+
+    def _split_trips(self, vi, trips, closed):
+        """Kapasiteyi aşan seferleri sırayı bozmadan böl (None: tek konteyner kapasiteyi aşıyor)"""
+        cap = self.cap[vi]
+        out_trips, out_closed = [], []
+        for trip, is_closed in zip(trips, closed):
+            trip = np.asarray(trip, dtype=np.int64)
+            start, load = 0, 0.0
+            for j, d in enumerate(self.demand[trip]):
+                if d > cap:
+                    return None
+                if load + d > cap:
+                    out_trips.append(trip[start:j])
+                    out_closed.append(True)
+                    start, load = j, 0.0
+                load += d
+            out_trips.append(trip[start:])
+            out_closed.append(is_closed)
+        return out_trips, out_closed
+
+    def _merge_trips(self, vi, trips, closed):
+        """Birlikte kapasiteye sığan ardışık seferleri birleştir (aradaki boşaltma kalkar)"""
+        out_trips, out_closed = [trips[0]], [closed[0]]
+        for trip, is_closed in zip(trips[1:], closed[1:]):
+            if self.demand[out_trips[-1]].sum() + self.demand[trip].sum() <= self.cap[vi]:
+                out_trips[-1] = np.concatenate([out_trips[-1], trip])
+                out_closed[-1] = is_closed
+            else:
+                out_trips.append(trip)
+                out_closed.append(is_closed)
+        return out_trips, out_closed
+
+    def rebalance(self, vehicles_data, trips, closed, limits):
+        """
+        Şablon seferlerini bugünkü taleplerle yeniden dengele: sıra korunur,
+        kapasiteyi aşan seferler bölünür (araç önce boşaltmaya gider), birlikte
+        sığan ardışık seferler birleştirilir. Birleştirme aracı uygunsuz
+        yapıyorsa sadece bölünmüş hali denenir.
+
+        Bir konteyner tek başına kapasiteyi aşıyorsa veya bir araçta dilim
+        ihlali şablondakinden fazla / bitiş max(şablon bitişi, vardiya sonu)'ndan
+        geç kalıyorsa False döner ve vehicles_data'ya dokunulmaz.
+        """
+        self.trips, self.closed = [], []
+        self._set_starts(vehicles_data)
+        for vi in range(len(trips)):
+            split = self._split_trips(vi, trips[vi], closed[vi])
+            if split is None:
+                return False
+            for option in (self._merge_trips(vi, *split), split):
+                self.trips.append(option[0])
+                self.closed.append(option[1])
+                if self._feasible([vi], {vi: limits[vi]}):
+                    break
+                self.trips.pop()
+                self.closed.pop()
+            else:
+                return False
+        self.write_routes(vehicles_data)
+        return True
+
+    # --------------------------------------------------------
+    # Ana döngü
+    # --------------------------------------------------------
+    def search(self, vehicles_data, time_budget_s=2.0):
+        """
+        improve()'un adım adım hali (üreteç). Rotalar yüklenince ve her
+        geçişin aday hesabından önce None, her uygulanan hamleden sonra
+        hamle türünü verir;
+        çağıran bu noktalarda current_km() ile ilerlemeyi okuyabilir,
+        write_routes ile ara sonucu rotalara yazabilir veya döngüyü bırakabilir.
+        vehicles_data sadece okunur.
+        """
+        self.started = time.time()
+        deadline = self.started + time_budget_s
+        self.load_routes(vehicles_data)
+        self.before_km = self.current_km()
+        self.rounds = 0
+        yield None
+        while time.time() < deadline:
+            self.rounds += 1
+            improved = yield from self._intra_pass(deadline)
+            improved |= yield from self._inter_pass(deadline)
+            if not improved:
+                break
+
+    def current_km(self):
+        """Mevcut seferlerin toplam mesafesi (yerel arama ölçüsü)"""
+        return sum(self.route_km(vi) for vi in range(len(self.trips)))
+
+    def improve(self, vehicles_data, time_budget_s=2.0):
+        """
+        Rotaları iyileştir; vehicles_data yerinde güncellenir. Toplam mesafe
+        başlangıçtakini aşarsa yüklenen rotalara geri dönülür.
+
+        Returns:
+            {"before_km", "after_km", "seconds", "rounds", "reverted",
+             "moves": {tür: sayaçlar}}
+        """
+        for _ in self.search(vehicles_data, time_budget_s):
+            pass
+        reverted = self.current_km() > self.before_km + EPS_KM
+        if reverted:
+            self.load_routes(vehicles_data)
+        self.write_routes(vehicles_data)
+        after_km = sum(v["distance"] for v in vehicles_data)
+        return {
+            "before_km": round(self.before_km, 3),
+            "after_km": round(after_km, 3),
+            "seconds": round(time.time() - self.started, 3),
+            "rounds": self.rounds,
+            "reverted": reverted,
+            "moves": self.stats,
+        }
+
+    def write_routes(self, vehicles_data):
+        """Seferleri rota kayıtlarına geri yaz: dakika, yük, mesafe, tonaj, bitiş"""
+        last_minute = (48 - self.day_start_hour) * 60 - 1
+        for vi, v in enumerate(vehicles_data):
+            pts, arrive, legs, _, end = self._timeline(vi)
+            store = v["route"]
+            is_container = pts >= 0
+            # Yük: sefer içi kümülatif talep, her boşaltmada sıfırlanır
+            cum = np.cumsum(np.where(is_container, self.demand[np.maximum(pts, 0)], 0.0))
+            load = cum - np.maximum.accumulate(np.where(pts == UNLOAD, cum, 0.0))
+            lat, lon = self.metric.coords(pts, vi)
+            minute = np.concatenate([[store.minute[0]], np.minimum(arrive.astype(np.int64), last_minute)])
+            store.assign(pts, lat, lon, minute, load)
+            v["distance"] = float(legs.sum())
+            v["collected_tonnage"] = float(sum(self.demand[t].sum() for t in self.trips[vi]))
+            v["load"] = float(load[-1])
+            v["unloads"] = int(np.count_nonzero(pts == UNLOAD))
+            if len(pts) > 1:
+                v["time"] = self.day_base + timedelta(minutes=end)
+                last = pts[-1]
+                v["pos"] = (float(self.metric.lats[last]), float(self.metric.lons[last])) if last >= 0 else self.metric.unload_pos
@@ -0,0 +1,155 @@
+"""
+Mahalle Merkezleri Tablosu
+optimize_rotalar ve API'lerin kullandığı mahalle koordinatları
+
+Ham GPS dökümü (all_merged_data.csv) her çağrıda okunmaz: merkezler bir
+kez hesaplanıp normalize edilmiş mahalle anahtarıyla (normalize_text_tr)
+indekslenen küçük bir tabloya yazılır. Her mahalle için:
+- gps_lat, gps_lon: GPS kayıtlarının ortalaması (dosya parça parça okunur)
+- konteyner_lat, konteyner_lon: konteyner_tipli.csv'deki konteynerlerin ortalaması
+- lat, lon: konteyner merkezi, yoksa GPS merkezi
+
+Tablo veri yükleme adımında oluşturulur (veritabanı importu veya komut
+satırı); mahalle_merkezleri() sadece okur, tablo yoksa FileNotFoundError
+verir. Modül sadece pandas'a dayanır (konteyner_verisi), API'ler
+planlayıcıyı yüklemeden kullanabilir.
+
+Kullanım:
+    python -m ai.mahalle_merkezleri          # tabloyu (yeniden) oluştur
+    tablo = mahalle_merkezleri()             # mahalle_key indeksli DataFrame
+    lat, lon = mahalle_merkezi("Görükle")
+"""
+
+import os
+import pandas as pd
+from pathlib import Path
+from ai.konteyner_verisi import normalize_text_tr, load_containers
+
+PROJE_KOKU = Path(__file__).resolve().parent.parent
+GPS_YOLU = PROJE_KOKU / 'full_dataset' / 'Nilufer_bin_collection_dataset' / 'all_merged_data.csv'
+# İkincisi güncel_v6_fullvehicle.PATH_CONTAINERS_DETAIL
+KONTEYNER_YOLLARI = (PROJE_KOKU / 'full_dataset' / 'container' / 'konteyner_tipli.csv',
+                     Path(__file__).resolve().parent / 'full_dataset' / 'container' / 'konteyner_tipli.csv')
+TABLO_YOLU = PROJE_KOKU / 'full_dataset' / 'mahalle_merkezleri.csv'
+GPS_PARCA_SATIR = 500_000  # GPS dökümü bu kadar satırlık parçalarla okunur
+
+# Okunan tablolar: {yol: (değişiklik zamanı, DataFrame)}
+_TABLOLAR = {}
+
+
+def mahalle_anahtari(mahalle):
+    """Kanonik mahalle anahtarı ("Görükle Mahallesi" -> "GORUKLE")"""
+    if isinstance(mahalle, str):
+        mahalle = mahalle.replace("\u0307", "")  # "İ".lower() -> "i̇" birleşik noktası
+    return normalize_text_tr(mahalle)
+
+
+def _gps_merkezleri(gps_yolu):
+    """GPS dökümünden mahalle başına ortalama koordinat (parça parça, sabit bellek)"""
+    anahtarlar = {}
+    parcalar = []
+    for parca in pd.read_csv(gps_yolu, usecols=['Mahalle', 'Enlem', 'Boylam'], encoding='utf-8',
+                             chunksize=GPS_PARCA_SATIR):
+        parca = parca.assign(Enlem=pd.to_numeric(parca['Enlem'], errors='coerce'),
+                             Boylam=pd.to_numeric(parca['Boylam'], errors='coerce')).dropna()
+        # Normalizasyon her farklı isim için bir kez yapılır
+        for ad in parca['Mahalle'].unique():
+            if ad not in anahtarlar:
+                anahtarlar[ad] = mahalle_anahtari(ad)
+        parca['mahalle_key'] = parca['Mahalle'].map(anahtarlar)
+        parcalar.append(parca.groupby('mahalle_key').agg(
+            gps_lat=('Enlem', 'sum'), gps_lon=('Boylam', 'sum'), gps_kayit=('Enlem', 'size'),
+            mahalle=('Mahalle', 'first')))
+    if not parcalar:
+        return pd.DataFrame(columns=['gps_lat', 'gps_lon', 'gps_kayit', 'mahalle'])
+    toplam = pd.concat(parcalar).groupby(level=0).agg(
+        gps_lat=('gps_lat', 'sum'), gps_lon=('gps_lon', 'sum'), gps_kayit=('gps_kayit', 'sum'),
+        mahalle=('mahalle', 'first'))
+    toplam['gps_lat'] /= toplam['gps_kayit']
+    toplam['gps_lon'] /= toplam['gps_kayit']
+    return toplam
+
+
+def _konteyner_merkezleri(konteyner_yolu):
+    """Konteyner ağırlıklı merkez: mahalledeki konteyner koordinatlarının ortalaması"""
+    df = load_containers(konteyner_yolu)
+    mah_col = next((c for c in df.columns if 'mahalle' in c and c != 'mahalle_norm'), 'mahalle_norm')
+    return df.groupby('mahalle_norm').agg(
+        konteyner_lat=('lat', 'mean'), konteyner_lon=('lon', 'mean'), konteyner_sayisi=('lat', 'size'),
+        mahalle=(mah_col, 'first')).rename_axis('mahalle_key')
+
+
+def merkez_tablosu_olustur(gps_yolu=GPS_YOLU, konteyner_yolu=None, tablo_yolu=TABLO_YOLU):
+    """
+    Mahalle merkezleri tablosunu hesapla ve tablo_yolu'na yaz
+
+    Args:
+        gps_yolu: all_merged_data.csv (yoksa sadece konteyner merkezleri)
+        konteyner_yolu: konteyner_tipli.csv (None ise KONTEYNER_YOLLARI'ndan ilk bulunan)
+        tablo_yolu: Çıktı CSV'si
+
+    Returns:
+        mahalle_key indeksli DataFrame
+    """
+    if konteyner_yolu is None:
+        konteyner_yolu = next((p for p in KONTEYNER_YOLLARI if Path(p).exists()), None)
+    kaynaklar = []
+    if gps_yolu is not None and Path(gps_yolu).exists():
+        kaynaklar.append(_gps_merkezleri(gps_yolu))
+    if konteyner_yolu is not None and Path(konteyner_yolu).exists():
+        kaynaklar.append(_konteyner_merkezleri(konteyner_yolu))
+    if not kaynaklar:
+        raise FileNotFoundError(f"Mahalle merkezleri için kaynak yok: {gps_yolu}, {konteyner_yolu}")
+
+    tablo = kaynaklar[0]
+    for diger in kaynaklar[1:]:
+        tablo = tablo.join(diger.drop(columns='mahalle'), how='outer').fillna({'mahalle': diger['mahalle']})
+    for kolon in ('gps_lat', 'gps_lon', 'gps_kayit', 'konteyner_lat', 'konteyner_lon', 'konteyner_sayisi'):
+        if kolon not in tablo:
+            tablo[kolon] = float('nan')
+    tablo['lat'] = tablo['konteyner_lat'].fillna(tablo['gps_lat'])
+    tablo['lon'] = tablo['konteyner_lon'].fillna(tablo['gps_lon'])
+    tablo['gps_kayit'] = tablo['gps_kayit'].fillna(0).astype(int)
+    tablo['konteyner_sayisi'] = tablo['konteyner_sayisi'].fillna(0).astype(int)
+    tablo = tablo[['mahalle', 'lat', 'lon', 'gps_lat', 'gps_lon', 'gps_kayit',
+                   'konteyner_lat', 'konteyner_lon', 'konteyner_sayisi']].sort_index()
+    tablo.index.name = 'mahalle_key'
+
+    tablo_yolu = Path(tablo_yolu)
+    tablo_yolu.parent.mkdir(parents=True, exist_ok=True)
+    tablo.to_csv(tablo_yolu, encoding='utf-8')
+    _TABLOLAR.pop(str(tablo_yolu), None)
+    print(f"✅ Mahalle merkezleri: {len(tablo)} mahalle -> {tablo_yolu}")
+    return tablo
+
+
+def mahalle_merkezleri(tablo_yolu=TABLO_YOLU):
+    """
+    Mahalle merkezleri tablosu (mahalle_key indeksli); dosya değişmedikçe
+    bellekteki kopya döner. Tablo burada oluşturulmaz (GPS dökümünün
+    tamamını okur): yoksa FileNotFoundError, bkz. merkez_tablosu_olustur.
+    """
+    yol = str(tablo_yolu)
+    if not os.path.exists(yol):
+        raise FileNotFoundError(f"Mahalle merkezleri tablosu yok: {yol} (python -m ai.mahalle_merkezleri)")
+    zaman = os.path.getmtime(yol)
+    onbellek = _TABLOLAR.get(yol)
+    if onbellek is None or onbellek[0] != zaman:
+        tablo = pd.read_csv(yol, index_col='mahalle_key', encoding='utf-8', keep_default_na=False,
+                            na_values=[''])
+        onbellek = _TABLOLAR[yol] = (zaman, tablo)
+    return onbellek[1]
+
+
+def mahalle_merkezi(mahalle, tablo=None):
+    """Mahallenin (lat, lon) merkezi; tabloda yoksa None"""
+    tablo = tablo if tablo is not None else mahalle_merkezleri()
+    anahtar = mahalle_anahtari(mahalle)
+    if anahtar not in tablo.index:
+        return None
+    satir = tablo.loc[anahtar]
+    return float(satir['lat']), float(satir['lon'])
+
+
+if __name__ == '__main__':
+    merkez_tablosu_olustur()
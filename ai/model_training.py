@@ -0,0 +1,304 @@
+"""
+Rota Skorlayıcı Eğitimi
+araclarin_durdugu_noktalar/arac_*_duragan.csv GPS durak kayıtlarından
+MLRouteOptimizer ağırlıklarını öğrenir.
+
+Her araç-gün için duraklar en yakın konteynere eşlenir ve ardışık
+konteyner ziyaretleri "karar" olarak yeniden kurulur: bulunulan
+konteynerde, gerçekte gidilen sonraki konteyner ile o anda gidilebilecek
+en yakın alternatifler. Planlayıcıdaki 8 özellik bu karar kümeleri için
+toplu (vektörel) hesaplanır ve ağırlıklar softmax sıralama kaybıyla
+(seçilen durağın olasılığı) bilinen başlangıç ağırlıklarına doğru L2
+düzenlemesiyle öğrenilir. Dosyalar işçi süreçlere araç bazında dağıtılır.
+"""
+
+import glob
+import os
+import re
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from scipy.optimize import minimize
+from scipy.spatial import cKDTree
+
+N_FEATURES = 8
+N_ALTERNATIVES = 16        # Karar başına seçilen + en fazla bu kadar alternatif
+SNAP_RADIUS_KM = 0.03      # Durak bu mesafede konteyner yoksa toplama sayılmaz
+UNLOAD_RADIUS_KM = 0.3     # Boşaltma noktasına bu kadar yakın durak yükü sıfırlar
+L2_TO_PRIOR = 0.05         # Başlangıç ağırlıklarına doğru düzenleme katsayısı
+VALIDATION_EVERY = 5       # Her 5. gün doğrulama kümesine ayrılır
+KM_PER_DEG = 111           # Planlayıcıyla aynı derece -> km katsayısı
+
+_SHARED = {}
+
+
+def _init_worker(shared):
+    _SHARED.clear()
+    _SHARED.update(shared)
+    _SHARED["tree"] = cKDTree(np.column_stack([shared["lat"], shared["lon"] * shared["lon_scale"]]))
+
+
+def vehicle_id_from_path(path):
+    m = re.search(r"arac_(\d+)_duragan", os.path.basename(path))
+    return int(m.group(1)) if m else None
+
+
+def build_features(cur, cand, load_ratio, is_peak, vehicle_cap, min_width, s, demand=None):
+    """
+    Planlayıcıdaki 8 özelliği (N, K) karar kümeleri için hesapla.
+    cur: (N,) bulunulan konteyner, cand: (N, K) aday konteynerler,
+    demand: (N, K) aday talepleri (verilmezse s["demand"]).
+    """
+    lat, lon = s["lat"], s["lon"]
+    dists = np.sqrt((lat[cand] - lat[cur][:, None])**2 + (lon[cand] - lon[cur][:, None])**2) * KM_PER_DEG
+    demand = s["demand"][cand] if demand is None else demand
+    X = np.zeros(cand.shape + (N_FEATURES,))
+    X[..., 0] = dists
+    X[..., 1] = demand
+    X[..., 2] = load_ratio[:, None]
+    X[..., 3] = np.where(is_peak[:, None] & s["high_pop"][cand], 10.0, 0.0)
+    X[..., 4] = s["unload_dist"][cand]
+    X[..., 5] = np.where(dists < 0.5, 1.0, 0.0)
+    capacity_match = demand / vehicle_cap[:, None]
+    X[..., 6] = np.where((capacity_match > 0.05) & (capacity_match < 0.3), 1.0, 0.0)
+    X[..., 7] = np.where(s["street_width"][cand] - min_width[:, None] > 2, 1.0, 0.0)
+    return X
+
+
+def snap_stops(path):
+    """
+    Tek araç dosyasındaki durakları konteynerlere eşle.
+
+    Returns:
+        {"vehicle_id", "day" (str), "ts" (saniye), "hour", "container" (-1 = boşaltma)}
+        - ardışık aynı konteyner tek ziyaret sayılır; eşlenemeyen duraklar atılır
+    """
+    s = _SHARED
+    empty = {"vehicle_id": vehicle_id_from_path(path), "day": np.zeros(0, dtype=object),
+             "ts": np.zeros(0, dtype=np.int64), "hour": np.zeros(0, dtype=np.int64),
+             "container": np.zeros(0, dtype=np.int64)}
+    df = pd.read_csv(path, encoding="utf-8-sig")
+    if df.empty:
+        return empty
+    df["Enlem"] = pd.to_numeric(df["Enlem"], errors="coerce")
+    df["Boylam"] = pd.to_numeric(df["Boylam"], errors="coerce")
+    ts = pd.to_datetime(df["Tarih"].astype(str) + " " + df["Saat"].astype(str),
+                        format="%d.%m.%Y %H:%M:%S", errors="coerce")
+    df = df.assign(ts=ts).dropna(subset=["Enlem", "Boylam", "ts"]).sort_values("ts", kind="stable")
+    if df.empty:
+        return empty
+
+    lat, lon = df["Enlem"].values, df["Boylam"].values
+    d, idx = s["tree"].query(np.column_stack([lat, lon * s["lon_scale"]]))
+    container = np.where(d * KM_PER_DEG <= SNAP_RADIUS_KM, idx, -2)
+    unload = np.hypot(lat - s["unload_pos"][0], lon - s["unload_pos"][1]) * KM_PER_DEG <= UNLOAD_RADIUS_KM
+    container[unload] = -1
+    day = df["ts"].dt.strftime("%Y-%m-%d").values
+    keep = container != -2
+    container, day = container[keep], day[keep]
+    ts = df["ts"].values[keep].astype("datetime64[s]").astype(np.int64)
+    hour = df["ts"].dt.hour.values[keep]
+    # Aynı gün içindeki ardışık tekrarları at
+    first = np.ones(len(container), dtype=bool)
+    first[1:] = (container[1:] != container[:-1]) | (day[1:] != day[:-1])
+    return {"vehicle_id": empty["vehicle_id"], "day": day[first], "ts": ts[first],
+            "hour": hour[first], "container": container[first]}
+
+
+def extract_decisions(task):
+    """
+    Tek araç için karar kümeleri.
+
+    task: (snap_stops çıktısı, {gün: (o gün toplanan konteynerler, ilk toplanma zamanları)})
+    Bir kararın alternatifleri, karar anında henüz hiçbir araçça toplanmamış
+    ve o gün toplanan, aracın erişebileceği en yakın konteynerlerdir. Yük ve
+    talep özelliği o günün talebiyle (s["day_demand"], yoksa s["demand"]) hesaplanır.
+
+    Returns:
+        (X, mask, day_ids): X (N, K, 8) özellikler - 0. sütun gerçekte seçilen durak,
+        mask (N, K) geçerli adaylar, day_ids (N,) karar günü (doğrulama ayrımı için)
+    """
+    s = _SHARED
+    stops, pending = task
+    k_total = N_ALTERNATIVES + 1
+    empty = (np.zeros((0, k_total, N_FEATURES)), np.zeros((0, k_total), dtype=bool),
+             np.zeros(0, dtype=object))
+    vehicle = s["fleet"].get(stops["vehicle_id"])
+    if vehicle is None or len(stops["container"]) < 2:
+        return empty
+    access = s["access"][vehicle["category"]]
+    cap, min_w = vehicle["capacity"], vehicle["min_width"]
+
+    parts = []
+    for day in np.unique(stops["day"]):
+        rows = np.flatnonzero(stops["day"] == day)
+        seq = stops["container"][rows]
+        day_demand = s.get("day_demand", {}).get(day, s["demand"])
+        # Yük: son boşaltmadan bu durağa kadar toplanan konteynerlerin talebi
+        demand = np.where(seq >= 0, day_demand[np.maximum(seq, 0)], 0.0)
+        csum = np.cumsum(demand)
+        last_unload = np.maximum.accumulate(np.where(seq < 0, np.arange(len(seq)), -1))
+        load = csum - np.where(last_unload >= 0, csum[np.maximum(last_unload, 0)], 0.0)
+        a, b = seq[:-1], seq[1:]
+        valid = (a >= 0) & (b >= 0) & (a != b)
+        valid[valid] &= access[b[valid]]
+        if not valid.any():
+            continue
+        cur, chosen = a[valid], b[valid]
+        t_now = stops["ts"][rows][:-1][valid]
+
+        day_c, day_t = pending[day]
+        reachable = access[day_c]
+        day_c, day_t = day_c[reachable], day_t[reachable]
+        # Karar anında bekleyen konteynerler (seçilen hariç), mesafeye göre ilk K
+        dist = np.hypot(s["lat"][day_c][None, :] - s["lat"][cur][:, None],
+                        s["lon"][day_c][None, :] - s["lon"][cur][:, None])
+        # Zaman dilimi kuralı: o saatte izin verilmeyen nüfus grubundaki konteynerler aday olamaz
+        hour = stops["hour"][rows][:-1][valid]
+        slot_ok = s["slot_groups"][hour[:, None], s["high_pop"][day_c][None, :].astype(np.int64)]
+        open_ = (day_t[None, :] > t_now[:, None]) & (day_c[None, :] != chosen[:, None]) & slot_ok
+        dist = np.where(open_, dist, np.inf)
+        k = min(N_ALTERNATIVES, dist.shape[1])
+        nearest = np.argpartition(dist, k - 1, axis=1)[:, :k] if k > 0 else np.zeros((len(cur), 0), dtype=np.int64)
+        alt_ok = np.isfinite(np.take_along_axis(dist, nearest, axis=1))
+        alts = np.where(alt_ok, day_c[nearest], -1)
+        has_alt = alt_ok.any(axis=1)
+        if not has_alt.any():
+            continue
+        cand = np.full((int(has_alt.sum()), k_total), -1, dtype=np.int64)
+        cand[:, 0] = chosen[has_alt]
+        cand[:, 1:1 + k] = alts[has_alt]
+        parts.append((cur[has_alt], cand, np.minimum(load[:-1][valid][has_alt] / cap, 1.0),
+                      hour[has_alt], day, day_demand[np.where(cand >= 0, cand, cur[has_alt][:, None])]))
+
+    if not parts:
+        return empty
+    cur = np.concatenate([p[0] for p in parts])
+    cand = np.concatenate([p[1] for p in parts])
+    load_ratio = np.concatenate([p[2] for p in parts])
+    hours = np.concatenate([p[3] for p in parts])
+    day_ids = np.concatenate([np.full(len(p[0]), p[4], dtype=object) for p in parts])
+    cand_demand = np.concatenate([p[5] for p in parts])
+    mask = cand >= 0
+    n = len(cur)
+    X = build_features(cur, np.where(mask, cand, cur[:, None]), load_ratio, s["peak_hours"][hours],
+                       np.full(n, cap), np.full(n, min_w), s, cand_demand)
+    return X, mask, day_ids
+
+
+def _decision_tasks(stops):
+    """
+    Her gün için tüm araçların ilk toplama zamanları: bir konteyner, ilk
+    toplandığı ana kadar diğer araçlar için de bekleyen bir alternatiftir.
+    """
+    day = np.concatenate([st["day"] for st in stops])
+    ts = np.concatenate([st["ts"] for st in stops])
+    container = np.concatenate([st["container"] for st in stops])
+    collected = pd.DataFrame({"day": day, "ts": ts, "container": container})
+    collected = collected[collected["container"] >= 0].groupby(["day", "container"])["ts"].min().reset_index()
+    pending = {d: (g["container"].values, g["ts"].values) for d, g in collected.groupby("day")}
+    return [(st, {d: pending[d] for d in np.unique(st["day"]) if d in pending}) for st in stops]
+
+
+def _loss_and_grad(w, X, mask, prior, l2):
+    """Softmax sıralama kaybı: -log P(seçilen) ortalaması + l2/2 ||w - prior||²"""
+    scores = X @ w
+    scores = np.where(mask, scores, -np.inf)
+    scores -= scores.max(axis=1, keepdims=True)
+    exp = np.exp(scores)
+    total = exp.sum(axis=1, keepdims=True)
+    p = exp / total
+    # log-softmax doğrudan: seçilen durağın olasılığı çok küçükken de kayıp sürekli kalır
+    nll = (np.log(total[:, 0]) - scores[:, 0]).mean()
+    # d/dw: E_p[x] - x_seçilen
+    grad = (np.einsum("nk,nkf->f", p, X) - X[:, 0, :].sum(axis=0)) / len(X)
+    diff = w - prior
+    return nll + 0.5 * l2 * diff @ diff, grad + l2 * diff
+
+
+def evaluate(w, X, mask):
+    """(ortalama kayıp, top-1 doğruluk) - seçilen durak en yüksek skoru alıyor mu"""
+    if len(X) == 0:
+        return float("nan"), float("nan")
+    loss, _ = _loss_and_grad(w, X, mask, w, 0.0)
+    scores = np.where(mask, X @ w, -np.inf)
+    return float(loss), float(np.mean(np.argmax(scores, axis=1) == 0))
+
+
+def fit_weights(X, mask, prior, l2=L2_TO_PRIOR):
+    res = minimize(_loss_and_grad, prior.astype(np.float64), args=(X, mask, prior, l2),
+                   jac=True, method="L-BFGS-B")
+    return res.x
+
+
+def train_from_gps(stop_files, shared, prior, workers=None):
+    """
+    GPS durak dosyalarından ağırlık öğren.
+
+    Args:
+        stop_files: arac_*_duragan.csv yolları
+        shared: konteyner dizileri, filo, erişim maskeleri vb. (işçilere bir kez gönderilir)
+        prior: Başlangıç ağırlıkları (8,)
+
+    Returns:
+        (weights, metrics) - öğrenilen ağırlıklar doğrulama kümesinde kaybı
+        düşürmüyor ya da top-1 doğruluğu başlangıç ağırlıklarının altına
+        indiriyorsa başlangıç ağırlıkları döner. Tepe saati özelliği (10 x -100)
+        kaybı tek başına sürükleyebildiğinden kayıptaki düşüş yeterli sayılmaz.
+    """
+    prior = np.asarray(prior, dtype=np.float64)
+    workers = workers or min(len(stop_files), os.cpu_count() or 1)
+    print(f"🧠 GPS duraklarından karar kümeleri çıkarılıyor ({len(stop_files)} araç, {workers} süreç)...")
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shared,)) as pool:
+            stops = list(pool.map(snap_stops, stop_files))
+            tasks = _decision_tasks(stops)
+            parts = list(pool.map(extract_decisions, tasks))
+    else:
+        _init_worker(shared)
+        stops = [snap_stops(p) for p in stop_files]
+        parts = [extract_decisions(t) for t in _decision_tasks(stops)]
+
+    X = np.concatenate([p[0] for p in parts])
+    mask = np.concatenate([p[1] for p in parts])
+    day_ids = np.concatenate([p[2] for p in parts])
+    if len(X) == 0:
+        print("⚠️ Eşlenebilen karar bulunamadı, başlangıç ağırlıkları kullanılacak")
+        return prior, {"decisions": 0}
+
+    uniq_days = np.unique(day_ids)
+    val_days = set(uniq_days[VALIDATION_EVERY - 1::VALIDATION_EVERY])
+    val = np.array([d in val_days for d in day_ids], dtype=bool)
+    if not val.any() or val.all():
+        val = np.zeros(len(X), dtype=bool)
+        val[VALIDATION_EVERY - 1::VALIDATION_EVERY] = True
+
+    weights = fit_weights(X[~val], mask[~val], prior)
+    prior_loss, prior_acc = evaluate(prior, X[val], mask[val])
+    loss, acc = evaluate(weights, X[val], mask[val])
+    metrics = {
+        "decisions": int(len(X)), "train": int((~val).sum()), "validation": int(val.sum()),
+        "prior_val_loss": prior_loss, "prior_val_top1": prior_acc,
+        "val_loss": loss, "val_top1": acc,
+    }
+    print(f"   Karar: {len(X)} (eğitim {metrics['train']}, doğrulama {metrics['validation']})")
+    print(f"   Doğrulama kaybı: {prior_loss:.3f} -> {loss:.3f}, top-1: {prior_acc:.1%} -> {acc:.1%}")
+    if not (loss < prior_loss and acc >= prior_acc):
+        print("⚠️ Öğrenilen ağırlıklar doğrulamada daha iyi değil (kayıp ve top-1), başlangıç ağırlıkları korunuyor")
+        metrics["adopted"] = False
+        return prior, metrics
+    metrics["adopted"] = True
+    return weights, metrics
+
+
+def list_stop_files(stops_dir):
+    return sorted(glob.glob(os.path.join(str(stops_dir), "arac_*_duragan.csv")))
+
+
+def stop_dates(stop_files):
+    """Durak kayıtlarındaki günler (sıralı datetime listesi); eğitim talebinin referans tarihleri"""
+    days = set()
+    for path in stop_files:
+        tarih = pd.read_csv(path, usecols=["Tarih"], encoding="utf-8-sig")["Tarih"].astype(str)
+        days.update(pd.to_datetime(tarih, format="%d.%m.%Y", errors="coerce").dropna())
+    return [d.to_pydatetime() for d in sorted(days)]
@@ -0,0 +1,93 @@
+"""
+Haftalık Şablon Plan Önbelleği
+Mahalle rotasyonu haftalık olduğundan aynı haftanın gününe düşen tarihlerin
+konteyner kümesi genellikle aynıdır. Tam planın araç başına konteyner
+sıraları bir şablon olarak saklanır; yeni bir tarihte sadece bugünkü
+taleplerle yük/boşaltma seferleri yeniden dengelenir.
+
+Şablon anahtarı girdilerin özetidir: kaynak dosya imzaları, haftanın günü,
+konfigürasyon, filo, ML ağırlıkları ve günün konteyner kümesi. Bunlardan
+biri değişince anahtar da değişir ve tam plan yeniden yapılır. Talep
+(tonaj) anahtara girmez - onarılan kısım odur.
+
+Şablonlar bellekte ve (klasör verilmişse) diskte pickle olarak tutulur.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+
+TEMPLATE_FORMAT_VERSION = 2  # 2: limitler dilim beklemeli zamanlamayla
+
+
+def template_key(*parts):
+    """Parçaların (bytes, numpy dizisi veya JSON'a çevrilebilir değer) sha256 özeti"""
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            data = np.ascontiguousarray(part).tobytes()
+        elif isinstance(part, bytes):
+            data = part
+        else:
+            data = json.dumps(part, sort_keys=True, default=str).encode("utf-8")
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class PlanTemplateStore:
+    """
+    Kullanım:
+        store = PlanTemplateStore("veri/plan_templates_v6")
+        template = store.get(key)
+        if template is None:
+            ...tam plan...
+            store.put(key, {"dow": 4, "sequences": [...], "limits": [...], ...})
+    """
+
+    def __init__(self, directory=None):
+        self.directory = Path(directory) if directory is not None else None
+        self._memory = {}
+
+    def _path(self, key):
+        return self.directory / f"plan_template_{key[:24]}.pkl"
+
+    def get(self, key):
+        template = self._memory.get(key)
+        if template is not None or self.directory is None:
+            return template
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if data.get("format_version") != TEMPLATE_FORMAT_VERSION or data.get("key") != key:
+            return None
+        self._memory[key] = data
+        return data
+
+    def put(self, key, template):
+        data = dict(template, key=key, format_version=TEMPLATE_FORMAT_VERSION)
+        self._memory[key] = data
+        if self.directory is None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Paralel işçiler aynı şablonu yazabilir: geçici dosyaya yazıp yer değiştir
+        path = self._path(key)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, 'wb') as f:
+            pickle.dump(data, f)
+        os.replace(tmp, path)
+
+    def clear(self):
+        self._memory.clear()
+        if self.directory is not None and self.directory.exists():
+            for path in self.directory.glob("plan_template_*.pkl"):
+                path.unlink()
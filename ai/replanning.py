@@ -0,0 +1,514 @@
+"""
+Gün İçi Artımlı Yeniden Planlama
+Hazır bir planı gün ortasında gelen değişikliklere göre günceller; tüm
+günü baştan planlamaz, sadece etkilenen araçların ve komşularının bekleyen
+duraklarını yeniden düzenler.
+
+1. Her aracın rotası `now` anında ikiye ayrılır: tamamlanan duraklar
+   (dakikası <= now) olduğu gibi kalır, kalanlar bekleyen duraklardır
+2. Değişen konteynerler toplanır: servis dışı kalan aracın bekleyen
+   durakları, yeni eklenen toplama noktaları ve acil işaretlenenler
+3. Her değişen konteyner, en yakın birkaç aracın bekleyen durak dizisine
+   en ucuz yerden eklenir (sıra korunur; acil olanlar dizinin başına).
+   Ekleme sonrası dizi mevcut konum/yük/saatten itibaren yeniden
+   zamanlanır; boşaltmalar kapasiteye göre yeniden yerleşir. Vardiya sonunu
+   aşan veya dilim kuralı ihlalini artıran ekleme bir sonraki araca denenir
+4. Hiçbir araca sığmayan konteynerler info["unassigned"] olarak döner;
+   acil konteyner sığmazsa yine eklenir ve aracın dizisinin vardiya sonuna
+   sığmayan son durakları düşürülür
+5. Kalan süre bütçesinde (time_budget_s) etkilenen araçlar ve aday
+   komşularının bekleyen dizileri yerel aramayla iyileştirilir: araç içinde
+   2-opt / Or-opt (acil baş sabit), araçlar arasında relocate. Hamle gerçek
+   mesafeyi düşürmüyor ya da dilim ihlalini / bitişi artırıyorsa uygulanmaz
+
+Mesafe ve süreler yerel aramanın LegMetric'i ve dilim beklemeli
+zamanlamasıyla (RouteImprover.schedule) hesaplanır; değişmeyen araçların
+mesafesi de aynı ölçüyle yeniden yazılır (bkz. local_search). 30 bin
+konteynerlik günde tipik bir değişiklik, yerel arama dahil ~300 ms'de işlenir.
+
+Kullanım:
+    changes = PlanChanges(removed_vehicles=(3615,), added_containers=yeni_df, urgent=(120, 4512))
+    day, vehicles, result_df, info = replan(ctx, day, vehicles, datetime(2025, 12, 19, 11, 0), changes)
+"""
+
+import time
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from scipy.spatial import cKDTree
+
+try:
+    from .güncel_v6_fullvehicle import (DEFAULT_CONFIG, DayProblem, routes_to_dataframe, container_capacity,
+                                        normalize_text_tr, _silent)
+    from .local_search import EPS_KM, MAX_TRIES, OPEN_END, UNLOAD, intra_moves, straight_km
+except ImportError:  # script olarak çalıştırıldığında
+    from güncel_v6_fullvehicle import (DEFAULT_CONFIG, DayProblem, routes_to_dataframe, container_capacity,
+                                       normalize_text_tr, _silent)
+    from local_search import EPS_KM, MAX_TRIES, OPEN_END, UNLOAD, intra_moves, straight_km
+
+N_CANDIDATES = 32         # Değişen konteyner başına bakılan en yakın rota noktası
+N_VEHICLE_OPTIONS = 3     # Ekleme denenecek en fazla araç
+ADDED_DEMAND_RATIO = 0.8  # Talebi verilmeyen yeni konteyner: kapasitenin bu kadarı
+REPLAN_BUDGET_S = 0.3     # Toplam gecikme bütçesi; eklemeden kalan süre yerel aramaya
+
+
+@dataclass(frozen=True)
+class PlanChanges:
+    """
+    Gün içi değişiklikler.
+
+    removed_vehicles: Servis dışı kalan araç id'leri (bekleyen durakları dağıtılır)
+    added_containers: Yeni toplama noktaları; lat, lon ve isteğe bağlı
+        demand_ton, tip, mahalle sütunlu DataFrame
+    urgent: Öncelikli toplanacak konteynerler (day_containers satır indeksi)
+    """
+    removed_vehicles: Tuple = ()
+    added_containers: Optional[pd.DataFrame] = None
+    urgent: Tuple = ()
+
+
+def vehicle_states(day, vehicles, now, config=None, positions=None):
+    """
+    Araç başına now anındaki durum.
+
+    Args:
+        positions: {vehicle_id: {"lat", "lon", "load"}} GPS'ten gelen güncel
+            konum/yük; verilmeyen araçlar için plandan çıkarılır
+
+    Returns:
+        [{"done": tamamlanan durak sayısı, "lat", "lon", "load", "minute"}]
+        (positions'tan gelen araçlarda ayrıca "reported": True)
+    """
+    cfg = config if config is not None else DEFAULT_CONFIG
+    positions = positions or {}
+    demand = day.day_containers["demand_ton"].values
+    day_base = datetime(day.target_date.year, day.target_date.month, day.target_date.day, cfg.day_start_hour)
+    now_min = (now - day_base).total_seconds() / 60.0
+    states = []
+    for v in vehicles:
+        route = v["route"]
+        minutes = route.view("minute")
+        done = max(1, int(np.searchsorted(minutes, now_min, side="right")))
+        containers = route.view("container")[:done]
+        # Son boşaltmadan sonra toplanan talep
+        unloads = np.flatnonzero(containers == UNLOAD)
+        since = containers[(unloads[-1] + 1) if len(unloads) else 0:]
+        state = {"done": done, "lat": float(route.lat[done - 1]), "lon": float(route.lon[done - 1]),
+                 "load": float(demand[since[since >= 0]].sum()), "minute": max(now_min, float(minutes[done - 1]))}
+        if v["id"] in positions:
+            state.update({k: float(positions[v["id"]][k]) for k in ("lat", "lon", "load") if k in positions[v["id"]]})
+            state["reported"] = True
+        states.append(state)
+    return states
+
+
+def extend_day(ctx, day, added):
+    """
+    Günün konteyner tablosuna yeni toplama noktalarını ekle. Sokak genişliği
+    en yakın yol parçasından, mahalle/nüfus bilgisi (verilmemişse) en yakın
+    mevcut konteynerden alınır. Yeni satırların mesafe tablosu satırı yoktur
+    (container_gid = -1); mesafeleri kuş uçuşu tahmine düşer.
+
+    Returns:
+        (yeni DayProblem, yeni satırların indeksleri)
+    """
+    dc = day.day_containers
+    if added is None or len(added) == 0:
+        return day, np.zeros(0, dtype=np.int64)
+    added = added.reset_index(drop=True)
+    lats = added["lat"].to_numpy(dtype=np.float64)
+    lons = added["lon"].to_numpy(dtype=np.float64)
+
+    base = ctx.containers_df
+    _, nearest = cKDTree(np.column_stack([base["lat"].values, base["lon"].values])).query(np.column_stack([lats, lons]))
+    rows = base.iloc[nearest].reset_index(drop=True)
+    tips = added["tip"].astype(str).str.upper().str.strip() if "tip" in added else pd.Series(["EK TOPLAMA"] * len(added))
+    caps = container_capacity(tips.values)
+
+    new = pd.DataFrame({
+        "lat": lats,
+        "lon": lons,
+        "tip_norm": tips.values,
+        "container_capacity": caps,
+        "is_collectible": True,
+        "is_underground": tips.str.contains("YERALTI", na=False).values,
+        "mahalle_norm": rows["mahalle_norm"].values,
+        "mahalle_code": rows["mahalle_code"].values,
+        "nufus": rows["nufus"].values,
+        "is_high_pop": rows["is_high_pop"].values,
+        "street_width": rows["street_width"].values,
+        "container_gid": np.full(len(added), -1, dtype=np.int32),
+    })
+    if "mahalle" in added:
+        names = added["mahalle"].map(normalize_text_tr)
+        codes = names.map(ctx.mahalle_index)
+        known = codes.notna().values
+        new.loc[known, "mahalle_norm"] = names[known].values
+        new.loc[known, "mahalle_code"] = codes[known].astype(np.int32).values
+    if ctx.street_mgr.n_segments > 0:
+        lines, _ = ctx.street_mgr.nearest_segments(lats, lons)
+        new["street_width"] = ctx.street_mgr.width[lines]
+    if "road_node" in dc and ctx.road_graph is not None:
+        nodes, snap_km = ctx.road_graph.snap(lats, lons)
+        new["road_node"] = nodes
+        new["road_snap_km"] = snap_km
+    new["demand_ton"] = (added["demand_ton"].to_numpy(dtype=np.float64) if "demand_ton" in added
+                         else caps * ADDED_DEMAND_RATIO)
+
+    extended = pd.concat([dc, new[[c for c in new.columns if c in dc.columns]]], ignore_index=True)
+    index = None if day.index is None else np.concatenate([day.index, np.full(len(new), -1, dtype=np.int64)])
+    extended_day = DayProblem(day.target_date, day.dow, day.adjusted_target, day.neighborhoods, extended,
+                              day.high_pop, day.low_pop, day.default_start_pos, day.unload_pos, index)
+    return extended_day, np.arange(len(dc), len(extended))
+
+
+class PendingRoutes:
+    """
+    Araçların bekleyen durak dizileri ve now'dan itibaren zamanlaması.
+    Diziler sadece konteyner içerir; boşaltmalar zamanlamada kapasiteye göre
+    yerleştirilir (planlayıcıyla aynı kural: sonraki konteyner sığmıyorsa).
+    """
+
+    def __init__(self, improver, vehicles, states):
+        self.imp = improver
+        self.states = states
+        # Aracın tamamlanan son durağı (konteyner, boşaltma veya başlangıç)
+        self.anchor = np.array([v["route"].view("container")[st["done"] - 1] for v, st in zip(vehicles, states)],
+                               dtype=np.int64)
+        self.seqs = []
+        for v, st in zip(vehicles, states):
+            c = v["route"].view("container")[st["done"]:].astype(np.int64)
+            self.seqs.append(c[c >= 0])
+        self.n_urgent = [0] * len(vehicles)
+        self.limits = {}
+
+    def timeline(self, vi, seq):
+        """(noktalar, varış dakikaları, bacaklar, dilim ihlali sayısı, bitiş dakikası)"""
+        imp, st = self.imp, self.states[vi]
+        pts, load = [self.anchor[vi]], st["load"]
+        for c, d in zip(seq, imp.demand[seq]):
+            if load + d > imp.cap[vi] and load > 0:
+                pts.append(UNLOAD)
+                load = 0.0
+            pts.append(c)
+            load += d
+        pts = np.array(pts, dtype=np.int64)
+        if len(pts) == 1:
+            return pts, np.zeros(0), np.zeros(0), 0, st["minute"]
+        legs = imp.metric.route_legs(pts, vi)
+        # Konumu bildirilen araçta ilk bacak bildirilen konumdan başlar (kuş uçuşu tahmin)
+        if st.get("reported") and legs[0] > 0:
+            lat, lon = imp.metric.coords(pts[1:2], vi)
+            legs[0] = straight_km(st["lat"], st["lon"], lat[0], lon[0], pts[1] == UNLOAD)
+        # Planlayıcıyla aynı zaman kuralları: dilim izni olmayan konteynere izinli saate kadar beklenir
+        arrive, viol, end = imp.schedule(pts, legs, st["minute"])
+        return pts, arrive, legs, viol, end
+
+    def limit(self, vi):
+        """Aracın değişiklik öncesi (dilim ihlali, bitiş sınırı)"""
+        if vi not in self.limits:
+            _, _, _, viol, end = self.timeline(vi, self.seqs[vi])
+            self.limits[vi] = (viol, max(end, self.imp.shift_min))
+        return self.limits[vi]
+
+    def feasible(self, vi, seq, slots=True):
+        """Dilim ihlali artmamış (slots) ve bitiş, değişiklik öncesi sınırı aşmamış olmalı"""
+        _, _, _, viol, end = self.timeline(vi, seq)
+        max_viol, max_end = self.limit(vi)
+        return (viol <= max_viol or not slots) and end <= max_end + 1e-6
+
+    def insertion(self, vi, c, urgent):
+        """En ucuz ekleme yeri ve km artışı (acil konteyner sadece dizinin acil başına)"""
+        seq = self.seqs[vi]
+        lo, hi = (0, self.n_urgent[vi]) if urgent else (self.n_urgent[vi], len(seq))
+        prev = np.concatenate([[self.anchor[vi]], seq])[lo:hi + 1]
+        nxt = seq[lo:hi]
+        legs = self.imp.metric.legs
+        add = legs(prev, c, vi)
+        add[:len(nxt)] += legs(c, nxt, vi) - legs(prev[:len(nxt)], nxt, vi)
+        j = int(np.argmin(add))
+        return lo + j, float(add[j])
+
+    def insert(self, vi, pos, c, urgent):
+        self.limit(vi)
+        self.seqs[vi] = np.insert(self.seqs[vi], pos, c)
+        if urgent:
+            self.n_urgent[vi] += 1
+
+    def optimize(self, vis, deadline):
+        """
+        Ekleme sonrası yerel arama: vis araçlarının acil başı dışındaki
+        bekleyen dizilerinde 2-opt / Or-opt ve vis içinde araçlar arası
+        relocate. Hamle, araçların gerçek mesafesini (timeline) düşürüyor ve
+        dilim ihlali / bitişi aracın mevcut ve değişiklik öncesi sınırını
+        aşmıyorsa kabul edilir.
+
+        Returns:
+            {hamle türü: uygulanan hamle sayısı}
+        """
+        moves = dict.fromkeys(("2opt", "or_opt", "relocate"), 0)
+        self.bounds, self.km = {}, {}
+        for vi in vis:
+            _, _, legs, viol, end = self.timeline(vi, self.seqs[vi])
+            max_viol, max_end = self.limit(vi)
+            self.bounds[vi] = (max(viol, max_viol), max(end, max_end))
+            self.km[vi] = float(legs.sum())
+        improved = True
+        while improved and time.time() < deadline:
+            improved = False
+            for vi in vis:
+                while time.time() < deadline and self._intra_move(vi, deadline, moves):
+                    improved = True
+            if time.time() < deadline and self._relocate(vis, deadline, moves):
+                improved = True
+        return moves
+
+    def _checked_km(self, vi, seq):
+        """Dizi optimize sınırları içindeyse gerçek mesafesi (km), değilse None"""
+        _, _, legs, viol, end = self.timeline(vi, seq)
+        max_viol, max_end = self.bounds[vi]
+        if viol > max_viol or end > max_end + 1e-6:
+            return None
+        return float(legs.sum())
+
+    def _intra_move(self, vi, deadline, moves):
+        """Araç içinde ilk iyileştiren 2-opt / Or-opt hamlesini uygula"""
+        seq, fixed = self.seqs[vi], self.n_urgent[vi]
+        free = seq[fixed:]
+        if len(free) < 2:
+            return False
+        head = seq[fixed - 1] if fixed else self.anchor[vi]
+        ext = np.concatenate([[head], free, [OPEN_END]])
+        for _, move, new in intra_moves(self.imp.metric.legs(ext[:, None], ext[None, :], vi), free)[:MAX_TRIES]:
+            if time.time() >= deadline:
+                break
+            cand = np.concatenate([seq[:fixed], new])
+            km = self._checked_km(vi, cand)
+            if km is not None and km < self.km[vi] - EPS_KM:
+                self.seqs[vi], self.km[vi] = cand, km
+                moves[move] += 1
+                return True
+        return False
+
+    def _relocate(self, vis, deadline, moves):
+        """Bekleyen konteynerleri vis içinde en yakın araçlara taşı (tahmini kazanca göre sıralı)"""
+        members = set(vis)
+        frees = [(vi, int(c)) for vi in vis for c in self.seqs[vi][self.n_urgent[vi]:]]
+        if not frees:
+            return False
+        others = set(range(len(self.seqs))) - members
+        options = candidate_vehicles(self, np.array([c for _, c in frees], dtype=np.int64), others)
+        legs = self.imp.metric.legs
+        ranked = []
+        for (vi, c), opts in zip(frees, options):
+            opts = [vj for vj in opts if vj != vi]
+            if time.time() >= deadline:
+                return False
+            if not opts:
+                continue
+            seq = self.seqs[vi]
+            k = int(np.flatnonzero(seq == c)[0])
+            prev = seq[k - 1] if k > 0 else self.anchor[vi]
+            nxt = seq[k + 1] if k + 1 < len(seq) else OPEN_END
+            gain = float(legs(prev, c, vi) + legs(c, nxt, vi) - legs(prev, nxt, vi))
+            for vj in opts:
+                pos, add = self.insertion(vj, c, False)
+                if add - gain < -EPS_KM:
+                    ranked.append((add - gain, vi, vj, c))
+        ranked.sort(key=lambda r: r[0])
+        # Bir turda her araç en fazla bir taşımada yer alır; sıralar değişince tahminler eskir
+        used, applied = set(), False
+        for _, vi, vj, c in ranked:
+            if time.time() >= deadline:
+                break
+            if vi in used or vj in used:
+                continue
+            pos, _ = self.insertion(vj, c, False)
+            new_i = self.seqs[vi][self.seqs[vi] != c]
+            new_j = np.insert(self.seqs[vj], pos, c)
+            km_i = self._checked_km(vi, new_i)
+            km_j = None if km_i is None else self._checked_km(vj, new_j)
+            if km_j is not None and km_i + km_j < self.km[vi] + self.km[vj] - EPS_KM:
+                self.seqs[vi], self.seqs[vj] = new_i, new_j
+                self.km[vi], self.km[vj] = km_i, km_j
+                used.update((vi, vj))
+                moves["relocate"] += 1
+                applied = True
+        return applied
+
+
+def candidate_vehicles(pending, changed, removed, k=N_CANDIDATES, n_options=N_VEHICLE_OPTIONS):
+    """
+    Değişen konteyner başına kategorisi erişebilen en yakın araçlar (mevcut
+    konum veya bekleyen duraklarından birine uzaklığa göre), en fazla n_options
+    """
+    imp, states = pending.imp, pending.states
+    candidates = [vi for vi in range(len(states)) if vi not in removed]
+    if len(changed) == 0 or not candidates:
+        return [[] for _ in changed]
+    lats, lons = imp.metric.lats, imp.metric.lons
+    scale = np.cos(np.radians(float(lats.mean())))
+    pt_lat, pt_lon, pt_veh = [], [], []
+    for vi in candidates:
+        seq = pending.seqs[vi]
+        pt_lat.append(np.append(lats[seq], states[vi]["lat"]))
+        pt_lon.append(np.append(lons[seq], states[vi]["lon"]))
+        pt_veh.append(np.full(len(seq) + 1, vi, dtype=np.int64))
+    pt_veh = np.concatenate(pt_veh)
+    tree = cKDTree(np.column_stack([np.concatenate(pt_lat), np.concatenate(pt_lon) * scale]))
+    _, near = tree.query(np.column_stack([lats[changed], lons[changed] * scale]), k=min(k, len(pt_veh)))
+    near = np.asarray(near).reshape(len(changed), -1)
+
+    out = []
+    for row, c in zip(near, changed):
+        options = []
+        for vi in pt_veh[row]:
+            if vi not in options and imp.access[vi, c]:
+                options.append(int(vi))
+                if len(options) == n_options:
+                    break
+        out.append(options)
+    return out
+
+
+def replan(ctx, day, vehicles_data, now, changes=None, config=None, positions=None, time_budget_s=REPLAN_BUDGET_S):
+    """
+    Planı now anından itibaren değişikliklere göre artımlı olarak güncelle.
+
+    Args:
+        ctx: PlannerContext
+        day: Planın DayProblem'i (ctx.prepare_day ile aynı tarih/konfigürasyon)
+        vehicles_data: Mevcut plan (değiştirilmez; kopyası güncellenir)
+        now: Yeniden planlama anı (datetime)
+        changes: PlanChanges
+        positions: {vehicle_id: {"lat", "lon", "load"}} güncel araç durumu
+        time_budget_s: Toplam süre bütçesi; eklemeden kalanı etkilenen araçlar
+            ve komşularında yerel aramaya harcanır
+
+    Returns:
+        (day, vehicles_data, result_df, info) - day yeni konteynerler eklenmiş
+        gün (sonraki replan çağrıları bununla yapılır); info: etkilenen
+        araçlar, atanamayan konteynerler, geçersiz acil indeksleri, yerel
+        arama hamleleri, süre
+    """
+    cfg = config if config is not None else DEFAULT_CONFIG
+    log = print if cfg.verbose else _silent
+    changes = changes if changes is not None else PlanChanges()
+    started = time.time()
+
+    day, added_rows = extend_day(ctx, day, changes.added_containers)
+    n_day = len(day.day_containers)
+    vehicles = [dict(v, route=v["route"].copy()) for v in vehicles_data]
+    states = vehicle_states(day, vehicles, now, cfg, positions)
+    removed = {vi for vi, v in enumerate(vehicles) if v["id"] in set(changes.removed_vehicles)}
+    improver = ctx._route_improver(day, vehicles, cfg)
+    pending = PendingRoutes(improver, vehicles, states)
+
+    # Tamamlanan duraklardaki konteynerler (acil işaretlense de) yeniden planlanmaz
+    done = np.zeros(n_day, dtype=bool)
+    owner_of = np.full(n_day, -1, dtype=np.int64)
+    for vi, v in enumerate(vehicles):
+        c = v["route"].view("container")[:states[vi]["done"]]
+        done[c[c >= 0]] = True
+        if vi not in removed:
+            owner_of[pending.seqs[vi]] = vi
+
+    urgent = np.unique(np.asarray(changes.urgent, dtype=np.int64))
+    valid = (urgent >= 0) & (urgent < n_day)
+    invalid_urgent = urgent[~valid]
+    if len(invalid_urgent):
+        log(f"⚠️ Günde olmayan acil konteyner indeksleri atlandı: {invalid_urgent.tolist()}")
+    urgent = urgent[valid]
+    urgent = urgent[~done[urgent]]
+    orphans = np.concatenate([added_rows] + [pending.seqs[vi] for vi in sorted(removed)]).astype(np.int64)
+    for vi in removed:
+        pending.seqs[vi] = pending.seqs[vi][:0]
+    # Başka bir aracın bekleyen durağı olan acil konteyner o araçta kalır, dizinin başına alınır
+    for c in urgent:
+        vi = owner_of[c]
+        if vi >= 0:
+            pending.limit(vi)
+            pending.seqs[vi] = pending.seqs[vi][pending.seqs[vi] != c]
+    changed = np.concatenate([urgent, orphans[~np.isin(orphans, urgent)]])
+    options = candidate_vehicles(pending, changed, removed)
+
+    touched, unassigned = set(removed), []
+    for i, (c, opts) in enumerate(zip(changed, options)):
+        is_urgent = i < len(urgent)
+        if is_urgent and owner_of[c] >= 0:
+            opts = [int(owner_of[c])]
+        ranked = sorted((pending.insertion(vi, c, is_urgent) + (vi,) for vi in opts), key=lambda x: x[1])
+        for pos, _, vi in ranked:
+            if pending.feasible(vi, np.insert(pending.seqs[vi], pos, c)):
+                pending.insert(vi, pos, c, is_urgent)
+                touched.add(vi)
+                break
+        else:
+            if not (is_urgent and ranked):
+                unassigned.append(c)
+                continue
+            # Acil konteyner her durumda eklenir; vardiyaya sığmayan son duraklar düşer
+            pos, _, vi = ranked[0]
+            pending.insert(vi, pos, c, is_urgent)
+            touched.add(vi)
+            seq = pending.seqs[vi]
+            while len(seq) > pending.n_urgent[vi] and not pending.feasible(vi, seq, slots=False):
+                unassigned.append(seq[-1])
+                seq = seq[:-1]
+            pending.seqs[vi] = seq
+
+    # Kalan bütçeyle etkilenen araçlar ve aday komşuları yerel aramayla iyileştirilir
+    scope = sorted((touched | {vi for opts in options for vi in opts}) - removed)
+    before = {vi: pending.seqs[vi] for vi in scope}
+    moves = pending.optimize(scope, started + time_budget_s)
+    touched |= {vi for vi in scope if not np.array_equal(pending.seqs[vi], before[vi])}
+
+    # Değişen araçların rotaları: tamamlanan kısım + yeniden zamanlanan bekleyen dizi
+    metric, demand = improver.metric, improver.demand
+    last_minute = (48 - improver.day_start_hour) * 60 - 1
+    for vi in sorted(touched):
+        v, st = vehicles[vi], states[vi]
+        route = v["route"]
+        route.truncate(st["done"])
+        prefix = route.view("container").astype(np.int64)
+        prefix_km = float(metric.route_legs(prefix, vi).sum()) if len(prefix) > 1 else 0.0
+        pts, arrive, legs, _, end = pending.timeline(vi, pending.seqs[vi])
+        lat, lon = metric.coords(pts[1:], vi)
+        load = st["load"]
+        for p, p_lat, p_lon, minute in zip(pts[1:], lat, lon, np.minimum(arrive.astype(np.int64), last_minute)):
+            if p == UNLOAD:
+                load = 0.0
+                route.add_unload(p_lat, p_lon, minute)
+            else:
+                load += demand[p]
+                route.add_container(p, p_lat, p_lon, minute, load)
+        containers = route.view("container")
+        v["distance"] = prefix_km + float(legs.sum())
+        v["collected_tonnage"] = float(demand[containers[containers >= 0]].sum())
+        v["unloads"] = int(np.count_nonzero(containers == UNLOAD))
+        v["load"] = float(load)
+        v["pos"] = (float(route.lat[len(route) - 1]), float(route.lon[len(route) - 1]))
+        v["time"] = improver.day_base + timedelta(minutes=end)
+        if vi in removed:
+            v["removed_at"] = now
+    # Filo toplamı tek ölçüde olsun: değişmeyen araçların mesafesi de LegMetric ile
+    for vi in sorted(set(range(len(vehicles))) - touched):
+        pts = vehicles[vi]["route"].view("container").astype(np.int64)
+        vehicles[vi]["distance"] = float(metric.route_legs(pts, vi).sum()) if len(pts) > 1 else 0.0
+
+    result_df = routes_to_dataframe(vehicles, day, cfg)
+    info = {
+        "affected": [vehicles[vi]["id"] for vi in sorted(touched - removed)],
+        "removed": [vehicles[vi]["id"] for vi in sorted(removed)],
+        "changed": int(len(changed)),
+        "added_rows": added_rows,
+        "unassigned": np.array(unassigned, dtype=np.int64),
+        "invalid_urgent": invalid_urgent,
+        "moves": moves,
+        "seconds": round(time.time() - started, 3),
+    }
+    log(f"🔁 YENİDEN PLANLAMA ({now:%H:%M}): {len(changed)} konteyner, {len(info['affected'])} araç, "
+        f"{len(unassigned)} atanamadı ({info['seconds'] * 1000:.0f} ms)")
+    return day, vehicles, result_df, info
@@ -0,0 +1,319 @@
+"""
+Yol Ağı Mesafe Motoru
+Yol GeoJSON'undaki LineString'lerden yönlendirilebilir bir graf kurar.
+- Kenarlar km uzunluk ve sokak genişliği (m) taşır; minimum genişliğe göre
+  LARGE/CRANE araçların girebildiği alt graflar elde edilir
+- Nokta-nokta sorgular: landmark (ALT) potansiyelli çift yönlü Dijkstra
+- Çoktan-çoka sorgular: scipy csgraph Dijkstra (blok halinde)
+- Graf ve landmark mesafeleri tek bir .npz dosyasına kaydedilir
+"""
+
+import heapq
+import numpy as np
+from pathlib import Path
+from scipy.spatial import cKDTree
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
+
+try:
+    from .geojson_stream import read_road_lines
+except ImportError:  # script olarak çalıştırıldığında
+    from geojson_stream import read_road_lines
+
+GRAPH_FORMAT_VERSION = 2       # 2: ters yönlü paralel kenarlar artık toplanmıyor
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON_EQ = 111.320
+
+SNAP_TOLERANCE_M = 3.0     # Bu mesafedeki köşeler aynı kavşak düğümü sayılır
+N_LANDMARKS = 8
+M2M_BLOCK = 64             # Çoktan-çoka sorguda aynı anda çözülen kaynak sayısı
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+    a = np.sin((lat2 - lat1) / 2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+class RoadGraph:
+    """
+    Yönsüz yol grafı.
+
+    Düğümler kavşak ve şekil noktalarıdır (SNAP_TOLERANCE_M içindeki köşeler
+    birleştirilir). Her kenar bir kez tutulur (edge_u, edge_v, edge_km,
+    edge_width); alt graflar `min_width` eşiğine göre istek anında simetrik
+    CSR olarak kurulup önbelleğe alınır.
+    """
+
+    def __init__(self, node_lat, node_lon, edge_u, edge_v, edge_km, edge_width):
+        self.node_lat = np.asarray(node_lat, dtype=np.float64)
+        self.node_lon = np.asarray(node_lon, dtype=np.float64)
+        self.edge_u = np.asarray(edge_u, dtype=np.int32)
+        self.edge_v = np.asarray(edge_v, dtype=np.int32)
+        self.edge_km = np.asarray(edge_km, dtype=np.float32)
+        self.edge_width = np.asarray(edge_width, dtype=np.float32)
+        self.n_nodes = len(self.node_lat)
+
+        self._csr = {}        # min_width -> scipy csr_matrix
+        self._adj = {}        # min_width -> (indptr, indices, weights) Python listeleri
+        self.landmarks = {}   # min_width -> (L, n_nodes) float32 landmark mesafeleri
+
+        # Düğüm yakalama için yerel km projeksiyonu
+        lat0 = float(self.node_lat.mean()) if self.n_nodes else 0.0
+        self._kx = KM_PER_DEG_LON_EQ * np.cos(np.radians(lat0))
+        self._node_tree = cKDTree(self._project(self.node_lat, self.node_lon)) if self.n_nodes else None
+
+    # --------------------------------------------------------
+    # Kurulum
+    # --------------------------------------------------------
+    @classmethod
+    def from_arrays(cls, vertex_lat, vertex_lon, line_start, width, snap_tolerance_m=SNAP_TOLERANCE_M):
+        """
+        geojson_stream.read_road_lines() çıktısından graf kur: köşeler art arda,
+        i. çizgi [line_start[i], line_start[i+1]) aralığında, width çizgi başına.
+        """
+        v_lat = np.asarray(vertex_lat, dtype=np.float64)
+        v_lon = np.asarray(vertex_lon, dtype=np.float64)
+        line_start = np.asarray(line_start, dtype=np.int64)
+        offset = len(v_lat)
+        if offset == 0:
+            raise ValueError("Yol dosyasında çizgi bulunamadı")
+
+        # Parça = aynı çizgideki ardışık iki köşe
+        seg_a = np.arange(offset - 1)
+        seg_a = seg_a[~np.isin(seg_a + 1, line_start)]
+        seg_b = seg_a + 1
+        seg_w = np.asarray(width, dtype=np.float32)[np.searchsorted(line_start, seg_a, side='right') - 1]
+
+        # Yakın köşeleri tek düğüme birleştir (çizgi uçları ve kesişimler)
+        kx = KM_PER_DEG_LON_EQ * np.cos(np.radians(float(v_lat.mean())))
+        xy = np.column_stack([v_lon * kx, v_lat * KM_PER_DEG_LAT])
+        pairs = cKDTree(xy).query_pairs(snap_tolerance_m / 1000.0, output_type='ndarray')
+        merge = csr_matrix((np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])),
+                           shape=(offset, offset))
+        n_nodes, label = connected_components(merge, directed=False)
+        counts = np.bincount(label, minlength=n_nodes)
+        node_lat = np.bincount(label, weights=v_lat, minlength=n_nodes) / counts
+        node_lon = np.bincount(label, weights=v_lon, minlength=n_nodes) / counts
+
+        u, v = label[seg_a], label[seg_b]
+        km = haversine_km(v_lat[seg_a], v_lon[seg_a], v_lat[seg_b], v_lon[seg_b]).astype(np.float32)
+        keep = u != v
+        u, v, km, seg_w = u[keep], v[keep], km[keep], seg_w[keep]
+        lo, hi = np.minimum(u, v), np.maximum(u, v)
+
+        # Paralel kenarlar: her genişlik için en kısa olan kalır
+        order = np.lexsort((km, -seg_w, hi, lo))
+        lo, hi, km, seg_w = lo[order], hi[order], km[order], seg_w[order]
+        first = np.ones(len(lo), dtype=bool)
+        first[1:] = (lo[1:] != lo[:-1]) | (hi[1:] != hi[:-1]) | (seg_w[1:] != seg_w[:-1])
+        return cls(node_lat, node_lon, lo[first], hi[first], km[first], seg_w[first])
+
+    @classmethod
+    def from_geojson(cls, path, snap_tolerance_m=SNAP_TOLERANCE_M, lines=None):
+        """lines: önceden okunmuş read_road_lines() çıktısı (verilirse dosya tekrar okunmaz)"""
+        print("🛣️ Yol ağı grafı kuruluyor...")
+        if lines is None:
+            lines = read_road_lines(path)
+        graph = cls.from_arrays(lines["vertex_lat"], lines["vertex_lon"], lines["line_start"],
+                                lines["width"], snap_tolerance_m)
+        print(f"✅ Yol grafı: {graph.n_nodes} düğüm, {len(graph.edge_u)} kenar, "
+              f"{graph.edge_km.sum():.1f} km")
+        return graph
+
+    # --------------------------------------------------------
+    # Alt graflar
+    # --------------------------------------------------------
+    def csr(self, min_width=0.0):
+        """min_width'ten dar olmayan kenarlardan oluşan simetrik CSR matrisi"""
+        key = float(min_width)
+        if key not in self._csr:
+            keep = self.edge_width >= key
+            u, v, w = self.edge_u[keep], self.edge_v[keep], self.edge_km[keep].astype(np.float64)
+            if len(u):
+                # Genişliği farklı paralel kenarlardan en kısası (csr tekrarları toplar);
+                # ters yönde çizilmiş aynı kenar da paraleldir
+                lo, hi = np.minimum(u, v), np.maximum(u, v)
+                pair = lo.astype(np.int64) * self.n_nodes + hi
+                order = np.lexsort((w, pair))
+                first = np.ones(len(order), dtype=bool)
+                first[1:] = pair[order][1:] != pair[order][:-1]
+                sel = order[first]
+                u, v, w = u[sel], v[sel], w[sel]
+            # Sıfır uzunluklu kenarlar csr'da kaybolmasın
+            w = np.maximum(w, 1e-6)
+            self._csr[key] = csr_matrix(
+                (np.concatenate([w, w]), (np.concatenate([u, v]), np.concatenate([v, u]))),
+                shape=(self.n_nodes, self.n_nodes))
+        return self._csr[key]
+
+    def _adjacency(self, min_width):
+        key = float(min_width)
+        if key not in self._adj:
+            m = self.csr(key)
+            self._adj[key] = (m.indptr.tolist(), m.indices.tolist(), m.data.tolist())
+        return self._adj[key]
+
+    def prepare_landmarks(self, min_width=0.0, n_landmarks=N_LANDMARKS):
+        """
+        En uzak nokta sezgisiyle landmark seç ve tüm düğümlere mesafelerini sakla.
+        Ulaşılamayan düğümler 0 alır; bu, aynı bileşen içindeki alt sınırları bozmaz.
+        """
+        key = float(min_width)
+        m = self.csr(key)
+        n_comp, comp = connected_components(m, directed=False)
+        main = np.flatnonzero(comp == np.argmax(np.bincount(comp)))
+        current = int(main[0])
+        rows = []
+        best = np.full(self.n_nodes, np.inf)
+        for _ in range(min(n_landmarks, len(main))):
+            d = dijkstra(m, indices=current)
+            d[~np.isfinite(d)] = 0.0
+            rows.append(d.astype(np.float32))
+            best = np.minimum(best, d)
+            current = int(main[np.argmax(best[main])])
+        self.landmarks[key] = np.vstack(rows) if rows else np.zeros((0, self.n_nodes), dtype=np.float32)
+        return self.landmarks[key]
+
+    # --------------------------------------------------------
+    # Düğüm yakalama
+    # --------------------------------------------------------
+    def _project(self, lats, lons):
+        return np.column_stack([np.asarray(lons, dtype=np.float64) * self._kx,
+                                np.asarray(lats, dtype=np.float64) * KM_PER_DEG_LAT])
+
+    def snap(self, lats, lons):
+        """Koordinatları en yakın düğüme eşle: (düğüm indeksleri, km cinsinden uzaklık)"""
+        d, idx = self._node_tree.query(self._project(np.atleast_1d(lats), np.atleast_1d(lons)))
+        return idx.astype(np.int32), d.astype(np.float32)
+
+    # --------------------------------------------------------
+    # Sorgular
+    # --------------------------------------------------------
+    def shortest_path_km(self, source, target, min_width=0.0):
+        """
+        İki düğüm arası en kısa yol (km). Landmark'lar hazırsa ALT
+        potansiyelleriyle, değilse düz çift yönlü Dijkstra. Yol yoksa inf.
+        """
+        source, target = int(source), int(target)
+        if source == target:
+            return 0.0
+        indptr, indices, weights = self._adjacency(min_width)
+        lm = self.landmarks.get(float(min_width))
+
+        if lm is not None and len(lm):
+            # Ortalama potansiyel: (π_t(v) - π_s(v)) / 2, her iki yönde tutarlı
+            pi_t = np.abs(lm - lm[:, target:target + 1]).max(axis=0)
+            pi_s = np.abs(lm - lm[:, source:source + 1]).max(axis=0)
+            potential = (0.5 * (pi_t - pi_s)).tolist()
+        else:
+            potential = None
+
+        dist = ({source: 0.0}, {target: 0.0})
+        done = (set(), set())
+        p0 = potential[source] if potential else 0.0
+        p1 = potential[target] if potential else 0.0
+        heaps = ([(p0, source)], [(-p1, target)])
+        best = np.inf
+
+        while heaps[0] and heaps[1]:
+            # Azaltılmış grafta standart durma koşulu: k_ileri + k_geri >= μ
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            sign = 1.0 if side == 0 else -1.0
+            _, u = heapq.heappop(heaps[side])
+            if u in done[side]:
+                continue
+            done[side].add(u)
+            du = dist[side][u]
+            other = dist[1 - side]
+            for j in range(indptr[u], indptr[u + 1]):
+                v = indices[j]
+                nd = du + weights[j]
+                if nd < dist[side].get(v, np.inf):
+                    dist[side][v] = nd
+                    key = nd + sign * potential[v] if potential else nd
+                    heapq.heappush(heaps[side], (key, v))
+                    if v in other and nd + other[v] < best:
+                        best = nd + other[v]
+        return float(best)
+
+    def one_to_many_km(self, source, targets, min_width=0.0, limit=np.inf):
+        """
+        Tek kaynaktan hedeflere en kısa yollar. Arama `limit` km'de kesilir
+        (yerel sorgular için asıl hızlandırma budur); ulaşılamayanlar inf.
+        """
+        targets = np.asarray(targets, dtype=np.int64)
+        if len(targets) == 0:
+            return np.empty(0)
+        return dijkstra(self.csr(min_width), indices=int(source), limit=limit)[targets]
+
+    def distances_from(self, source, min_width=0.0, limit=np.inf):
+        """Tek kaynaktan tüm düğümlere mesafe dizisi (km, ulaşılamayan inf)"""
+        return dijkstra(self.csr(min_width), indices=int(source), limit=limit)
+
+    def many_to_many_km(self, sources, targets, min_width=0.0, limit=np.inf):
+        """
+        (len(sources), len(targets)) mesafe matrisi (km, float32).
+        Graf yönsüz olduğu için küçük taraftan aranır; kaynaklar
+        M2M_BLOCK'luk bloklar halinde çözülerek bellek sınırlı tutulur.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        if len(sources) > len(targets):
+            return self.many_to_many_km(targets, sources, min_width, limit).T
+        m = self.csr(min_width)
+        out = np.empty((len(sources), len(targets)), dtype=np.float32)
+        uniq, inverse = np.unique(sources, return_inverse=True)
+        for b in range(0, len(uniq), M2M_BLOCK):
+            block = uniq[b:b + M2M_BLOCK]
+            d = dijkstra(m, indices=block, limit=limit)[:, targets]
+            rows = np.flatnonzero((inverse >= b) & (inverse < b + len(block)))
+            out[rows] = d[inverse[rows] - b]
+        return out
+
+    # --------------------------------------------------------
+    # Kalıcılık
+    # --------------------------------------------------------
+    def save(self, path):
+        widths = sorted(self.landmarks)
+        arrays = {
+            "format_version": np.int32(GRAPH_FORMAT_VERSION),
+            "node_lat": self.node_lat, "node_lon": self.node_lon,
+            "edge_u": self.edge_u, "edge_v": self.edge_v,
+            "edge_km": self.edge_km, "edge_width": self.edge_width,
+            "landmark_widths": np.asarray(widths, dtype=np.float64),
+        }
+        for i, w in enumerate(widths):
+            arrays[f"landmarks_{i}"] = self.landmarks[w]
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Kaydedilmiş grafı yükle; dosya yoksa veya sürüm farklıysa None"""
+        if not Path(path).exists():
+            return None
+        with np.load(path) as data:
+            if int(data["format_version"]) != GRAPH_FORMAT_VERSION:
+                return None
+            graph = cls(data["node_lat"], data["node_lon"], data["edge_u"], data["edge_v"],
+                        data["edge_km"], data["edge_width"])
+            for i, w in enumerate(data["landmark_widths"].tolist()):
+                graph.landmarks[float(w)] = data[f"landmarks_{i}"]
+        return graph
+
+    @classmethod
+    def load_or_build(cls, graph_path, road_path, min_widths=(0.0,), rebuild=False, lines=None):
+        """Önbellekteki grafı yükle, yoksa (veya rebuild) GeoJSON'dan kurup landmark'larla kaydet"""
+        graph = None if rebuild else cls.load(graph_path)
+        if graph is not None:
+            print(f"✅ Yol grafı önbellekten yüklendi ({graph.n_nodes} düğüm)")
+            return graph
+        graph = cls.from_geojson(road_path, lines=lines)
+        for w in min_widths:
+            graph.prepare_landmarks(w)
+        graph.save(graph_path)
+        return graph
@@ -4,17 +4,44 @@ VRP (Vehicle Routing Problem) çözümü
 Nearest Neighbor + 2-opt algoritması
 """
 
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from datetime import datetime
 import pandas as pd
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from math import radians, cos, sin, asin, sqrt
+from scipy.spatial import cKDTree
 from ai.talep_tahmin import talep_tahmin_tum_mahalleler
+from ai.mahalle_merkezleri import (mahalle_merkezleri, mahalle_merkezi, mahalle_anahtari, merkez_tablosu_olustur,
+                                   PROJE_KOKU, KONTEYNER_YOLLARI)
+from ai.konteyner_verisi import load_containers
+
+DUNYA_YARICAPI = 6371  # km
+YOL_FAKTORU = 1.4  # Kuş uçuşu -> yol mesafesi
+BLOK_ELEMAN = 4_000_000  # Mesafe matrisinde bir blokta hesaplanan hücre sayısı (float32 ~16 MB)
+BELLEK_SINIRI = 2 * 1024 ** 3  # Bu boyutu (bayt) aşan matrisler diske (memmap) yazılır
+KD_ILK_K = 8  # KD-ağacı aramasında ilk bakılan komşu sayısı (sığan yoksa 4 katına çıkar)
+IKI_OPT_KOMSU = 10  # 2-opt / Or-opt'ta her durak için bakılan en yakın komşu sayısı
+OR_OPT_UZUNLUK = 3  # Or-opt ile taşınan en uzun parça (durak)
+DEPO = (40.2063, 28.9023)  # Depo koordinatı (Nilüfer Belediyesi merkez)
+FILO_YOLU = PROJE_KOKU / 'full_dataset' / 'fleet.csv'
+GPS_KLASORU = PROJE_KOKU / 'araclarin_durdugu_noktalar'
+ROTASYON_YOLU = PROJE_KOKU / 'full_dataset' / 'neighbor_days_rotations.csv'
+GPS_ESLEME_KM = 0.03  # GPS durağı bu mesafede planlanan konteyner varsa toplama sayılır
+DEPO_YARICAPI_KM = 0.3  # Depoya bu kadar yakın GPS durağı boşaltma sayılır
 
 def haversine(lat1, lon1, lat2, lon2):
     """
     İki koordinat arası mesafe (km)
     Haversine formülü
     """
-    R = 6371  # Dünya yarıçapı (km)
+    R = DUNYA_YARICAPI
     
     lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
     dlat = lat2 - lat1
@@ -24,31 +51,82 @@ def haversine(lat1, lon1, lat2, lon2):
     c = 2 * asin(sqrt(a))
     
     kus_ucusu = R * c
-    yol_mesafesi = kus_ucusu * 1.4  # Yol faktörü
+    yol_mesafesi = kus_ucusu * YOL_FAKTORU
     
     return yol_mesafesi
 
-def mesafe_matrisi_olustur(koordinatlar):
+def _radyan(koordinatlar):
+    """[(lat, lon), ...] -> (lat, lon, cos(lat)) float32 radyan dizileri"""
+    k = np.asarray(koordinatlar, dtype=np.float64).reshape(-1, 2)
+    lat, lon = np.radians(k[:, 0]), np.radians(k[:, 1])
+    return lat.astype(np.float32), lon.astype(np.float32), np.cos(lat).astype(np.float32)
+
+def _haversine_blok(kaynak, hedef, satirlar, cikti):
+    """kaynak[satirlar] x hedef bloğunu çıktıya yaz (yayınlama ile, float32)"""
+    lat1, lon1, cos1 = (d[satirlar, None] for d in kaynak)
+    lat2, lon2, cos2 = (d[None, :] for d in hedef)
+    a = np.subtract(lat2, lat1)
+    np.multiply(a, 0.5, out=a)
+    np.sin(a, out=a)
+    np.square(a, out=a)
+    b = np.subtract(lon2, lon1)
+    np.multiply(b, 0.5, out=b)
+    np.sin(b, out=b)
+    np.square(b, out=b)
+    b *= cos1
+    b *= cos2
+    a += b
+    np.clip(a, 0.0, 1.0, out=a)
+    np.sqrt(a, out=a)
+    np.arcsin(a, out=a)
+    a *= np.float32(2 * DUNYA_YARICAPI * YOL_FAKTORU)
+    cikti[satirlar] = a
+
+def mesafe_matrisi_olustur(koordinatlar, hedefler=None, dosya=None, blok_satir=None, is_parcacigi=1):
     """
-    Tüm noktalar arası mesafe matrisi oluştur
-    
+    Noktalar arası yol mesafesi matrisi (km, float32)
+
+    Satır blokları yayınlama (broadcasting) ile vektörel hesaplanır. Matris
+    BELLEK_SINIRI'nı aşıyorsa veya dosya verilmişse bloklar diske
+    (memory-mapped) yazılır.
+
     Args:
-        koordinatlar: [(lat, lon), ...] listesi
-    
+        koordinatlar: [(lat, lon), ...] listesi (başlangıç noktaları)
+        hedefler: [(lat, lon), ...] varış noktaları (None ise koordinatlar, kare matris)
+        dosya: .npy yolu; verilirse matris bu dosyaya yazılır (np.load(mmap_mode="r") ile açılabilir)
+        blok_satir: Bir blokta hesaplanan satır sayısı (None ise BLOK_ELEMAN / sütun sayısı)
+        is_parcacigi: Blokları dağıtan iş parçacığı sayısı (numpy GIL'i bırakır)
+
     Returns:
-        2D numpy array
+        (n, m) numpy array veya np.memmap
     """
-    n = len(koordinatlar)
-    matris = np.zeros((n, n))
-    
-    for i in range(n):
-        for j in range(n):
-            if i != j:
-                matris[i][j] = haversine(
-                    koordinatlar[i][0], koordinatlar[i][1],
-                    koordinatlar[j][0], koordinatlar[j][1]
-                )
-    
+    kaynak = _radyan(koordinatlar)
+    hedef = kaynak if hedefler is None else _radyan(hedefler)
+    n, m = len(kaynak[0]), len(hedef[0])
+
+    if dosya is not None:
+        matris = np.lib.format.open_memmap(dosya, mode="w+", dtype=np.float32, shape=(n, m))
+    elif n * m * 4 > BELLEK_SINIRI:
+        # Adsız geçici dosya: matris bırakılınca disk alanı da serbest kalır
+        matris = np.memmap(tempfile.TemporaryFile(), mode="w+", dtype=np.float32, shape=(n, m))
+    else:
+        matris = np.empty((n, m), dtype=np.float32)
+    if n == 0 or m == 0:
+        return matris
+
+    blok_satir = blok_satir or max(1, BLOK_ELEMAN // m)
+    bloklar = [slice(i, min(i + blok_satir, n)) for i in range(0, n, blok_satir)]
+    if is_parcacigi > 1 and len(bloklar) > 1:
+        with ThreadPoolExecutor(max_workers=is_parcacigi) as havuz:
+            list(havuz.map(lambda b: _haversine_blok(kaynak, hedef, b, matris), bloklar))
+    else:
+        for b in bloklar:
+            _haversine_blok(kaynak, hedef, b, matris)
+
+    if hedefler is None:
+        np.fill_diagonal(matris, 0.0)
+    if isinstance(matris, np.memmap):
+        matris.flush()
     return matris
 
 def nearest_neighbor(mesafe_matrisi, talepler, kapasite, baslangic=0):
@@ -105,44 +183,249 @@ def nearest_neighbor(mesafe_matrisi, talepler, kapasite, baslangic=0):
     
     return tum_rotalar
 
-def iki_opt(rota, mesafe_matrisi, depo=0):
+def _kure(koordinatlar):
+    """[(lat, lon), ...] -> birim küre üzerinde (x, y, z); kiriş uzunluğu haversine ile aynı sırayı verir"""
+    k = np.radians(np.asarray(koordinatlar, dtype=np.float64).reshape(-1, 2))
+    cos_lat = np.cos(k[:, 0])
+    return np.column_stack([cos_lat * np.cos(k[:, 1]), cos_lat * np.sin(k[:, 1]), np.sin(k[:, 0])])
+
+def nearest_neighbor_kd(koordinatlar, talepler, kapasite, baslangic=0, arac_dondur=False):
     """
-    2-opt algoritması ile rotayı iyileştir
-    
+    KD-ağacı ile kapasiteli Nearest Neighbor (nearest_neighbor'ın büyük
+    nokta kümeleri için hali; mesafe matrisi gerekmez)
+
+    Her adımda bulunulan noktanın en yakın komşuları artan k ile aranır;
+    ziyaret edilmiş ve kalan kapasiteye sığmayan noktalar elenir. Ziyaret
+    edilenler ağacın yarısını geçince ağaç kalan noktalarla yeniden kurulur.
+    Kalan en küçük talep bile sığmıyorsa rota hemen kapanır.
+
+    Args:
+        koordinatlar: [(lat, lon), ...] listesi (depo dahil)
+        talepler: Her noktanın talebi (ton)
+        kapasite: Araç kapasitesi (ton) veya araç kapasiteleri listesi; liste
+            verilirse araçlar sırayla (gerekirse tekrar tekrar) kullanılır,
+            kalan hiçbir noktayı alamayan araç atlanır
+        baslangic: Başlangıç noktası indeksi (depo)
+        arac_dondur: True ise her rotanın araç indeksleri de döner
+
+    Returns:
+        list: Rota listesi [[durak1, durak2, ...], [durak1, ...], ...]
+        (arac_dondur ise (rotalar, araclar)). En büyük kapasiteyi aşan
+        noktalar en büyük araca tek duraklı rota olur.
+    """
+    xy = _kure(koordinatlar)
+    talep = np.asarray(talepler, dtype=np.float64)
+    kapasiteler = np.atleast_1d(np.asarray(kapasite, dtype=np.float64))
+    n = len(talep)
+    kalan = np.ones(n, dtype=bool)
+    kalan[baslangic] = False
+    kalan_sayisi = n - 1
+    sira = np.argsort(talep, kind="stable")  # en küçük kalan talep için
+    en_kucuk = 0
+
+    tum_rotalar, araclar = [], []
+    # Hiçbir araca sığmayan noktalar tek başına sefer
+    for nokta in np.flatnonzero(kalan & (talep > kapasiteler.max() + 1e-9)):
+        tum_rotalar.append([int(nokta)])
+        araclar.append(int(np.argmax(kapasiteler)))
+        kalan[nokta] = False
+        kalan_sayisi -= 1
+
+    agac_noktalari = np.flatnonzero(kalan)
+    agac = cKDTree(xy[agac_noktalari]) if len(agac_noktalari) else None
+    olu = 0  # ağaçta kalan ziyaret edilmiş nokta sayısı
+
+    arac = -1
+    while kalan_sayisi > 0:
+        arac = (arac + 1) % len(kapasiteler)
+        bos_kapasite = kapasiteler[arac]
+        rota = []
+        konum = xy[baslangic]
+        while kalan_sayisi > 0:
+            while not kalan[sira[en_kucuk]]:
+                en_kucuk += 1
+            if talep[sira[en_kucuk]] > bos_kapasite + 1e-9:
+                break
+            if olu > len(agac_noktalari) // 2:
+                agac_noktalari = np.flatnonzero(kalan)
+                agac = cKDTree(xy[agac_noktalari])
+                olu = 0
+
+            # Sığabilecek en yakın noktayı bul
+            en_yakin = None
+            k = min(KD_ILK_K, len(agac_noktalari))
+            while en_yakin is None:
+                _, j = agac.query(konum, k=k)
+                aday = agac_noktalari[np.atleast_1d(j)]
+                uygun = kalan[aday] & (talep[aday] <= bos_kapasite + 1e-9)
+                if uygun.any():
+                    en_yakin = int(aday[np.argmax(uygun)])
+                elif k >= len(agac_noktalari):
+                    break
+                else:
+                    k = min(k * 4, len(agac_noktalari))
+            if en_yakin is None:
+                break
+
+            # Noktaya git
+            rota.append(en_yakin)
+            bos_kapasite -= talep[en_yakin]
+            konum = xy[en_yakin]
+            kalan[en_yakin] = False
+            kalan_sayisi -= 1
+            olu += 1
+
+        if rota:
+            tum_rotalar.append(rota)
+            araclar.append(arac)
+
+    if arac_dondur:
+        return tum_rotalar, araclar
+    return tum_rotalar
+
+class _Tur:
+    """
+    Depo dahil kapalı tur: dizi (tur) + konum dizisi (konum[düğüm]).
+    Ters çevirme numpy dilimiyle yapılır; tur döngü olduğundan depo her
+    yerde olabilir, sonuçta başa döndürülür.
+    """
+
+    def __init__(self, n):
+        self.tur = np.arange(n)
+        self.konum = np.arange(n)
+        self.n = n
+
+    def sonraki(self, x):
+        return self.tur[(self.konum[x] + 1) % self.n]
+
+    def onceki(self, x):
+        return self.tur[self.konum[x] - 1]
+
+    def ters_cevir(self, bas, son):
+        """bas'tan ileri doğru son'a kadar olan parçayı ters çevir (gerekirse tümleyenini)"""
+        i, j = self.konum[bas], self.konum[son]
+        if i > j:
+            i, j = j + 1, i - 1  # sarmalayan parça yerine tümleyeni (aynı tur)
+        if i < j:
+            self.tur[i:j + 1] = self.tur[i:j + 1][::-1]
+            self.konum[self.tur[i:j + 1]] = np.arange(i, j + 1)
+
+    def tasi(self, parca, sonra, ters):
+        """parca'yı (ardışık düğümler) sonra'nın arkasına taşı"""
+        dondurulmus = np.roll(self.tur, -self.konum[parca[0]])
+        kalan = dondurulmus[len(parca):]
+        k = int(np.flatnonzero(kalan == sonra)[0]) + 1
+        eklenen = dondurulmus[:len(parca)][::-1] if ters else dondurulmus[:len(parca)]
+        self.tur = np.concatenate([kalan[:k], eklenen, kalan[k:]])
+        self.konum[self.tur] = np.arange(self.n)
+
+def iki_opt(rota, mesafe_matrisi, depo=0, komsu=IKI_OPT_KOMSU):
+    """
+    2-opt + Or-opt ile rotayı iyileştir
+
+    Hamleler sadece her durağın komşu en yakın duraklarıyla aranır;
+    iyileşme bulunamayan durağa (don't-look biti) hamle komşuluğu
+    değişene kadar tekrar bakılmaz. Or-opt 1-OR_OPT_UZUNLUK duraklık
+    parçayı (gerekirse ters) yakın bir durağın yanına taşır.
+
     Args:
         rota: Durak listesi
-        mesafe_matrisi: Mesafe matrisi
+        mesafe_matrisi: Mesafe matrisi (simetrik)
         depo: Depo indeksi
-    
+        komsu: Durak başına bakılan en yakın komşu sayısı
+
     Returns:
         list: İyileştirilmiş rota
     """
     if len(rota) < 3:
         return rota
-    
-    # Tam rotayı oluştur (depo dahil)
-    tam_rota = [depo] + rota + [depo]
-    
-    iyilesti = True
-    while iyilesti:
-        iyilesti = False
-        for i in range(1, len(tam_rota) - 2):
-            for j in range(i + 1, len(tam_rota) - 1):
-                # Mevcut mesafe
-                mevcut = (mesafe_matrisi[tam_rota[i-1]][tam_rota[i]] +
-                         mesafe_matrisi[tam_rota[j]][tam_rota[j+1]])
-                
-                # Yeni mesafe (i ile j arası tersine çevrilince)
-                yeni = (mesafe_matrisi[tam_rota[i-1]][tam_rota[j]] +
-                       mesafe_matrisi[tam_rota[i]][tam_rota[j+1]])
-                
-                if yeni < mevcut:
-                    # Tersine çevir
-                    tam_rota[i:j+1] = tam_rota[i:j+1][::-1]
-                    iyilesti = True
-    
-    # Depoları çıkar
-    return tam_rota[1:-1]
+
+    # Tur yerel indekslerle kurulur: 0 = depo
+    tam_rota = np.array([depo] + list(rota), dtype=np.int64)
+    n = len(tam_rota)
+    matris = mesafe_matrisi if isinstance(mesafe_matrisi, np.ndarray) else np.asarray(mesafe_matrisi)
+    D = np.asarray(matris[np.ix_(tam_rota, tam_rota)], dtype=np.float64)
+    k = min(komsu, n - 1)
+    uzak = D + np.diag(np.full(n, np.inf))
+    komsular = np.argpartition(uzak, k - 1, axis=1)[:, :k]
+    komsular = np.take_along_axis(komsular, np.argsort(np.take_along_axis(uzak, komsular, 1), axis=1), 1).tolist()
+
+    tur = _Tur(n)
+    bakilacak = deque(range(n))
+    kuyrukta = [True] * n
+    eps = 1e-9
+
+    def uyandir(*dugumler):
+        for x in dugumler:
+            if not kuyrukta[x]:
+                kuyrukta[x] = True
+                bakilacak.append(x)
+
+    def iki_opt_hamlesi(a):
+        for yon in (1, -1):
+            b = tur.sonraki(a) if yon == 1 else tur.onceki(a)
+            d_ab = D[a, b]
+            for c in komsular[a]:
+                d_ac = D[a, c]
+                if d_ac >= d_ab:
+                    break
+                d = tur.sonraki(c) if yon == 1 else tur.onceki(c)
+                if c == b or d == a:
+                    continue
+                if d_ab + D[c, d] - d_ac - D[b, d] > eps:
+                    # a-b, c-d kenarları yerine a-c, b-d
+                    if yon == 1:
+                        tur.ters_cevir(b, c)
+                    else:
+                        tur.ters_cevir(a, d)
+                    uyandir(a, b, c, d)
+                    return True
+        return False
+
+    def or_opt_hamlesi(a):
+        parca = [a]
+        for _ in range(OR_OPT_UZUNLUK):
+            if 0 in parca:
+                return False
+            s, e = parca[0], parca[-1]
+            p, q = tur.onceki(s), tur.sonraki(e)
+            if q == s or p == e:
+                return False
+            kazanc = D[p, s] + D[e, q] - D[p, q]
+            for uc, diger in ((s, e), (e, s)):
+                for c in komsular[uc]:
+                    if D[uc, c] >= kazanc:
+                        break
+                    if c in parca:
+                        continue
+                    # c'nin iki yanındaki kenara, uc c'ye bitişik olacak şekilde ekle:
+                    # ileri: c -> uc ... diger -> c2, geri: c2 -> diger ... uc -> c
+                    for c2, ileri in ((tur.sonraki(c), True), (tur.onceki(c), False)):
+                        if c2 in parca:
+                            continue
+                        ek = D[c, uc] + D[diger, c2] - D[c, c2]
+                        if kazanc - ek > eps:
+                            if ileri:
+                                tur.tasi(parca, c, ters=(uc == e))
+                            else:
+                                tur.tasi(parca, c2, ters=(uc == s))
+                            uyandir(p, q, s, e, c, c2)
+                            return True
+            nxt = tur.sonraki(e)
+            if nxt == p:
+                return False
+            parca.append(nxt)
+        return False
+
+    while bakilacak:
+        a = bakilacak.popleft()
+        kuyrukta[a] = False
+        if iki_opt_hamlesi(a) or or_opt_hamlesi(a):
+            uyandir(a)
+
+    # Depoyu başa al
+    sonuc = np.roll(tur.tur, -tur.konum[0])[1:]
+    return tam_rota[sonuc].tolist()
 
 def rota_mesafesi_hesapla(rota, mesafe_matrisi, depo=0):
     """Bir rotanın toplam mesafesini hesapla"""
@@ -156,35 +439,33 @@ def rota_mesafesi_hesapla(rota, mesafe_matrisi, depo=0):
     
     toplam += mesafe_matrisi[rota[-1]][depo]  # Son duraktan depoya
     
-    return toplam
+    return float(toplam)
 
-def optimize_rotalar(tarih=None):
+def optimize_rotalar(tarih=None, konteyner_olcekli=False):
     """
     Ana optimizasyon fonksiyonu
     
     Args:
-        tarih: Tarih (şimdilik kullanılmıyor)
+        tarih: Tarih (konteyner ölçeğinde talep ayı ve GPS karşılaştırma günü)
+        konteyner_olcekli: True ise tüm konteynerler ve gerçek filo ile
+            optimize_konteyner_rotalari; False ise ilk 20 mahalle merkezi
     
     Returns:
         dict: Optimizasyon sonuçları
     """
     try:
-        # Koordinatları yükle (all_merged_data.csv'den - gerçek GPS verileri)
-        df_gps = pd.read_csv('full_dataset/Nilufer_bin_collection_dataset/all_merged_data.csv',
-                             usecols=['Mahalle', 'Enlem', 'Boylam'],
-                             encoding='utf-8')
-        koordinat_df = df_gps.groupby('Mahalle').agg({
-            'Enlem': 'mean',
-            'Boylam': 'mean'
-        }).reset_index()
-        koordinat_df.columns = ['neighborhood', 'lat', 'lon']
+        if konteyner_olcekli:
+            return optimize_konteyner_rotalari(tarih)
+
+        # Mahalle merkezleri (GPS ve konteyner verilerinden bir kez hesaplanan tablo)
+        try:
+            merkezler = mahalle_merkezleri()
+        except FileNotFoundError:
+            merkezler = merkez_tablosu_olustur()
         
         # Talep tahminlerini al
         tahminler = talep_tahmin_tum_mahalleler()
         
-        # Depo koordinatı (Nilüfer Belediyesi merkez)
-        DEPO = (40.2063, 28.9023)
-        
         # Koordinat listesi oluştur (depo + mahalleler)
         koordinatlar = [DEPO]
         mahalle_isimleri = ['DEPO']
@@ -193,9 +474,9 @@ def optimize_rotalar(tarih=None):
         for t in tahminler[:20]:  # İlk 20 mahalle ile test
             mahalle = t['mahalle']
             # Koordinatı bul
-            coord_row = koordinat_df[koordinat_df['neighborhood'].str.upper() == mahalle.upper()]
-            if not coord_row.empty:
-                koordinatlar.append((coord_row.iloc[0]['lat'], coord_row.iloc[0]['lon']))
+            merkez = mahalle_merkezi(mahalle, merkezler)
+            if merkez is not None:
+                koordinatlar.append(merkez)
                 mahalle_isimleri.append(mahalle)
                 talepler.append(t['tahmin'])
         
@@ -206,13 +487,15 @@ def optimize_rotalar(tarih=None):
         KAPASITE = 12  # ton
         
         # Nearest Neighbor ile rotalar oluştur
-        rotalar = nearest_neighbor(mesafe_mat, talepler, KAPASITE, baslangic=0)
+        rotalar = nearest_neighbor_kd(koordinatlar, talepler, KAPASITE, baslangic=0)
         
         # 2-opt ile iyileştir
         iyilestirilmis_rotalar = []
         toplam_mesafe = 0
+        insa_mesafesi = 0
         
         for rota in rotalar:
+            insa_mesafesi += rota_mesafesi_hesapla(rota, mesafe_mat, depo=0)
             iyilestirilmis = iki_opt(rota, mesafe_mat, depo=0)
             mesafe = rota_mesafesi_hesapla(iyilestirilmis, mesafe_mat, depo=0)
             
@@ -223,15 +506,15 @@ def optimize_rotalar(tarih=None):
             })
             toplam_mesafe += mesafe
         
-        # Sonuç
+        # Sonuç (öncesi: Nearest Neighbor rotaları, 2-opt'tan önce)
         return {
             'basarili': True,
             'rotalar': iyilestirilmis_rotalar,
             'toplam_arac': len(rotalar),
             'toplam_mesafe': round(toplam_mesafe, 1),
-            'optimize_oncesi_mesafe': round(toplam_mesafe * 1.25, 1),  # Tahmini
-            'tasarruf_km': round(toplam_mesafe * 0.25, 1),
-            'tasarruf_yuzde': 20
+            'optimize_oncesi_mesafe': round(insa_mesafesi, 1),
+            'tasarruf_km': round(insa_mesafesi - toplam_mesafe, 1),
+            'tasarruf_yuzde': round(100 * (insa_mesafesi - toplam_mesafe) / insa_mesafesi, 1) if insa_mesafesi else 0
         }
     
     except Exception as e:
@@ -240,8 +523,308 @@ def optimize_rotalar(tarih=None):
             'hata': str(e)
         }
 
+def gps_gunluk_mesafeler(klasor=GPS_KLASORU, konteynerler=None):
+    """
+    Gerçek GPS rotalarından gün başına toplam mesafe (km)
+
+    Araç durağan nokta dosyalarındaki (arac_*_duragan.csv) duraklar araç ve
+    gün içinde saat sırasıyla birleştirilir; ölçü optimizasyonla aynıdır
+    (haversine × YOL_FAKTORU).
+
+    Args:
+        konteynerler: (N, 2) lat/lon; verilirse sadece bu konteynerlerden
+            birine (GPS_ESLEME_KM) veya depoya (DEPO_YARICAPI_KM) eşlenen
+            duraklar sayılır, böylece mesafe planla aynı iş üzerinden ölçülür
+
+    Returns:
+        dict: {'19.12.2025': km, ...}
+    """
+    # Planlayıcı (yol grafı, model eğitimi...) sadece konteyner ölçeğinde yüklenir
+    from ai.güncel_v6_fullvehicle import haversine_km_vectorized
+
+    dosyalar = sorted(glob.glob(os.path.join(str(klasor), 'arac_*_duragan.csv')))
+    if not dosyalar:
+        return {}
+    df = pd.concat([pd.read_csv(d, usecols=['Tarih', 'Saat', 'Enlem', 'Boylam'], encoding='utf-8-sig')
+                    .assign(arac=i) for i, d in enumerate(dosyalar)], ignore_index=True)
+    df = df.dropna()
+    df['zaman'] = pd.to_datetime(df['Tarih'] + ' ' + df['Saat'], format='%d.%m.%Y %H:%M:%S', errors='coerce')
+    df = df.dropna(subset=['zaman']).sort_values(['arac', 'zaman'], kind='stable')
+    lat, lon = df['Enlem'].to_numpy(float), df['Boylam'].to_numpy(float)
+    if konteynerler is not None:
+        konteynerler = np.asarray(konteynerler, dtype=float).reshape(-1, 2)
+        olcek = cos(radians(DEPO[0]))
+        eslesen = np.zeros(len(df), dtype=bool)
+        if len(konteynerler):
+            d, _ = cKDTree(np.column_stack([konteynerler[:, 0], konteynerler[:, 1] * olcek])).query(
+                np.column_stack([lat, lon * olcek]))
+            eslesen = d * 111 <= GPS_ESLEME_KM
+        eslesen |= haversine_km_vectorized(lon, lat, DEPO[1], DEPO[0]) <= DEPO_YARICAPI_KM
+        df, lat, lon = df[eslesen], lat[eslesen], lon[eslesen]
+    ayni = (df['arac'].to_numpy()[1:] == df['arac'].to_numpy()[:-1]) & \
+           (df['Tarih'].to_numpy()[1:] == df['Tarih'].to_numpy()[:-1])
+    bacak = haversine_km_vectorized(lon[:-1], lat[:-1], lon[1:], lat[1:]) * YOL_FAKTORU
+    gunluk = pd.Series(np.where(ayni, bacak, 0.0)).groupby(df['Tarih'].to_numpy()[1:]).sum()
+    return {gun: round(float(km), 1) for gun, km in gunluk.items()}
+
+def _konteyner_talepleri(konteynerler, ay=None):
+    """Mahalle talep tahminini mahalledeki konteynerlere kapasite payıyla dağıt (ton)"""
+    tahminler = talep_tahmin_tum_mahalleler(str(PROJE_KOKU / 'full_dataset' / 'container_counts.csv'), ay)
+    mahalle_ton = {mahalle_anahtari(t['mahalle']): t['tahmin'] for t in tahminler}
+    kapasite = konteynerler['container_capacity']
+    pay = kapasite / kapasite.groupby(konteynerler['mahalle_norm']).transform('sum')
+    talep = konteynerler['mahalle_norm'].map(mahalle_ton) * pay
+    # Tahmini olmayan mahalleler: eşleşenlerin ton / kapasite oranı
+    eslesen = talep.notna()
+    oran = talep[eslesen].sum() / kapasite[eslesen].sum() if eslesen.any() else 1.0
+    return talep.fillna(kapasite * oran).to_numpy(float)
+
+def _sokak_genislikleri(konteynerler, yol):
+    """Planlayıcının konteyner -> sokak genişliği önbelleğinden genişlik (m); eşlemesi olmayan: inf"""
+    from ai.güncel_v6_fullvehicle import load_street_mapping
+
+    eslesme = load_street_mapping(yol) or {}
+    anahtarlar = zip(konteynerler['lat'].tolist(), konteynerler['lon'].tolist())
+    return np.array([eslesme.get(k, np.inf) for k in anahtarlar], dtype=np.float64)
+
+def _gps_oncesi(gps, tarih):
+    """
+    Karşılaştırma için GPS günlük mesafesi: tarih GPS verisinde varsa o gün,
+    yoksa aynı hafta gününe ait GPS günlerinin ortalaması (rotasyon hafta
+    gününe bağlı olduğundan). Eşleşen gün yoksa (None, None).
+
+    Returns:
+        (km, kaynak)
+    """
+    gun = tarih.strftime('%d.%m.%Y')
+    if gun in gps:
+        return gps[gun], 'gps:' + gun
+    ayni = [km for g, km in gps.items() if datetime.strptime(g, '%d.%m.%Y').weekday() == tarih.weekday()]
+    if not ayni:
+        return None, None
+    return float(np.mean(ayni)), f"gps:{tarih.strftime('%A').upper()} ortalaması ({len(ayni)} gün)"
+
+def optimize_konteyner_rotalari(tarih=None, konteyner_yolu=None, filo_yolu=FILO_YOLU, gps_klasoru=GPS_KLASORU,
+                                cikti_yolu=None, rotasyon_yolu=ROTASYON_YOLU,
+                                sokak_genislik_yolu=None):
+    """
+    Konteyner ölçeğinde rota optimizasyonu
+
+    - Duraklar: o günün rotasyonundaki mahallelerin toplanabilir konteynerleri
+      (konteyner_tipli.csv; rotasyon dosyası yoksa tüm konteynerler)
+    - Talep: mahalle tahmini, mahalledeki konteynerlere kapasite payıyla
+    - Araçlar: fleet.csv kapasiteleri; her sefer yükünü alabilen ve en
+      erken boşalan araca verilir, sefer sonunda depoya dönülüp boşaltılır
+    - Erişim: planlayıcının kuralları (build_access_table: yeraltı -> vinçli,
+      kategori başına en dar sokak). Konteynerler erişebilen kategori
+      kümesine göre gruplanır, her grubun seferleri sadece o kategorilerin
+      araçlarıyla kurulur. Hiçbir aracın erişemediği konteynerler planlanmaz,
+      'erisim_disi_konteyner' olarak döner. Sokak genişliği planlayıcının
+      eşleme önbelleğinden (sokak_genislik_yolu) okunur; eşlemesi olmayan
+      konteynerde sokak kuralı uygulanmaz ('sokak_genisligi_bilinmeyen')
+    - İnşa: nearest_neighbor_kd, iyileştirme: sefer başına iki_opt
+    - Öncesi: gerçek GPS rotalarının günlük mesafesi, sadece planlanan
+      konteynerlere ve depoya eşlenen duraklar üzerinden (tarih GPS
+      verisinde varsa o gün, yoksa aynı hafta günlerinin ortalaması; o da
+      yoksa None ve 'optimize_oncesi_not')
+    - Vardiya: DAY_END_HOUR'u aşan araçlar için uyarı verilir ve sayıları
+      'vardiya_asan_arac' olarak döner
+
+    Args:
+        tarih: Plan tarihi (datetime; talep tahmininin ayı ve GPS karşılaştırma günü)
+        cikti_yolu: Verilirse routes_api.json şemasında buraya yazılır
+        sokak_genislik_yolu: Sokak eşleme önbelleği (None ise planlayıcının
+            PATH_STREET_MAPPING_CACHE'i)
+
+    Returns:
+        dict: Optimizasyon özeti + 'routes_api' (routes_api.json şeması)
+    """
+    from ai.güncel_v6_fullvehicle import (load_fleet, load_rotations, VehicleTypeManager, AVG_SPEED_KMH,
+                                          CONTAINER_SERVICE_SEC, UNLOAD_WAIT_MIN, DAY_START_HOUR, DAY_END_HOUR,
+                                          PATH_STREET_MAPPING_CACHE)
+
+    baslangic = time.time()
+    tarih = tarih if tarih is not None else datetime.now()
+    if sokak_genislik_yolu is None:
+        sokak_genislik_yolu = PATH_STREET_MAPPING_CACHE
+    if konteyner_yolu is None:
+        konteyner_yolu = next((p for p in KONTEYNER_YOLLARI if os.path.exists(p)), KONTEYNER_YOLLARI[0])
+    konteynerler = load_containers(konteyner_yolu)
+    konteynerler = konteynerler[konteynerler['is_collectible']]
+    kapsam = 'tum'
+    if rotasyon_yolu is not None and os.path.exists(rotasyon_yolu):
+        gun = tarih.weekday()
+        gun_mahalleleri = [m for m, gunler in load_rotations(rotasyon_yolu).items() if gun in gunler]
+        konteynerler = konteynerler[konteynerler['mahalle_norm'].isin(gun_mahalleleri)]
+        kapsam = 'rotasyon'
+        if konteynerler.empty:
+            return {'basarili': False, 'hata': f"{tarih.strftime('%A')} günü rotasyonda toplanacak konteyner yok"}
+    arac_yoneticisi = VehicleTypeManager(load_fleet(filo_yolu))
+    filo = arac_yoneticisi.fleet
+    talep = _konteyner_talepleri(konteynerler, tarih.month)
+
+    # Erişim sınıfı: erişebilen kategorilerin bit maskesi (0 = hiçbir araç erişemez)
+    genislik = _sokak_genislikleri(konteynerler, sokak_genislik_yolu)
+    erisim = arac_yoneticisi.build_access_table(konteynerler['is_underground'].to_numpy(bool), genislik)
+    kategori = filo['vehicle_category'].to_numpy()
+    kategoriler = [k for k in erisim if (kategori == k).any()]
+    sinif = np.zeros(len(konteynerler), dtype=np.int64)
+    for b, k in enumerate(kategoriler):
+        sinif |= erisim[k]['mask'].astype(np.int64) << b
+    erisilemeyen = sinif == 0
+    erisim_disi = {'erisim_disi_konteyner': int(erisilemeyen.sum()),
+                   'erisim_disi_talep': round(float(talep[erisilemeyen].sum()), 1),
+                   'sokak_genisligi_bilinmeyen': int(np.isinf(genislik).sum())}
+    if erisilemeyen.any():
+        print(f"⚠️ {erisim_disi['erisim_disi_konteyner']} konteynere filodaki hiçbir araç erişemiyor "
+              f"(yeraltı/dar sokak), planlanmadı")
+    if erisim_disi['sokak_genisligi_bilinmeyen']:
+        print(f"⚠️ {erisim_disi['sokak_genisligi_bilinmeyen']} konteynerin sokak genişliği eşlemesi yok, "
+              f"sokak kuralı uygulanmadı (önce güncel_v6_fullvehicle ile eşleme önbelleği oluşturulmalı)")
+    konteynerler, talep, genislik, sinif = (konteynerler[~erisilemeyen], talep[~erisilemeyen],
+                                            genislik[~erisilemeyen], sinif[~erisilemeyen])
+    if konteynerler.empty:
+        return {'basarili': False, 'hata': 'Filodaki araçların erişebildiği konteyner yok', **erisim_disi}
+
+    koordinatlar = np.vstack([[DEPO], konteynerler[['lat', 'lon']].to_numpy(float)])
+    talepler = np.concatenate([[0.0], talep])
+    kapasiteler = filo['capacity_ton'].to_numpy(float)
+
+    # Sınıf başına inşa; az araçlı (kısıtlı) sınıfların seferleri önce atanır
+    sinif_araclari = {s: np.flatnonzero(np.isin(kategori, [k for b, k in enumerate(kategoriler) if s >> b & 1]))
+                      for s in np.unique(sinif).tolist()}
+    rotalar, araclar, adaylar = [], [], []
+    for s in sorted(sinif_araclari, key=lambda s: len(sinif_araclari[s])):
+        aday = sinif_araclari[s]
+        nokta = np.concatenate([[0], np.flatnonzero(sinif == s) + 1])
+        r, a = nearest_neighbor_kd(koordinatlar[nokta], talepler[nokta], kapasiteler[aday], baslangic=0,
+                                   arac_dondur=True)
+        rotalar += [nokta[rota].tolist() for rota in r]
+        araclar += aday[a].tolist()
+        adaylar += [aday] * len(r)
+
+    # Sefer başına yerel matris + 2-opt / Or-opt. Sefer, sınıfının araçlarından
+    # yükünü alabilenlerin en erken boşalanına verilir (eşitlikte inşadaki araç)
+    arac_dakika = np.zeros(len(filo))
+    arac_bitis = np.zeros(len(filo))  # Son boşaltmaya varış (dakika)
+    arac_sefer = [[] for _ in range(len(filo))]
+    insa_mesafesi = toplam_mesafe = 0.0
+    servis_dk = CONTAINER_SERVICE_SEC / 60
+    for rota, arac, aday in zip(rotalar, araclar, adaylar):
+        uygun = aday[kapasiteler[aday] >= talepler[rota].sum() - 1e-9]
+        if len(uygun):
+            bos = uygun[arac_dakika[uygun] == arac_dakika[uygun].min()]
+            arac = arac if arac in bos else int(bos[0])
+        nokta = np.array([0] + rota)
+        mat = mesafe_matrisi_olustur(koordinatlar[nokta])
+        yerel = list(range(1, len(nokta)))
+        insa_mesafesi += rota_mesafesi_hesapla(yerel, mat)
+        yerel = iki_opt(yerel, mat)
+        yol = [0] + yerel + [0]
+        bacak = np.asarray(mat[yol[:-1], yol[1:]], dtype=np.float64)
+        varis = arac_dakika[arac] + np.cumsum(bacak / AVG_SPEED_KMH * 60) + servis_dk * np.arange(len(bacak))
+        arac_sefer[arac].append((nokta[yerel], varis, float(bacak.sum())))
+        arac_bitis[arac] = varis[-1]
+        arac_dakika[arac] = varis[-1] + UNLOAD_WAIT_MIN
+        toplam_mesafe += float(bacak.sum())
+
+    vardiya_dk = (DAY_END_HOUR - DAY_START_HOUR) * 60
+    asan = np.flatnonzero(arac_bitis > vardiya_dk)
+    if len(asan):
+        print(f"⚠️ {len(asan)} araç vardiya sonunu ({DAY_END_HOUR}:00) aşıyor, en geç bitiş "
+              f"{DAY_START_HOUR + arac_bitis.max() / 60:.1f}. saat")
+
+    # routes_api.json şeması (bkz. write_plan_outputs)
+    kayit = {
+        'lat': koordinatlar[1:, 0], 'lon': koordinatlar[1:, 1], 'demand_ton': talep,
+        'mahalle': konteynerler['mahalle_norm'].to_numpy(object), 'tip': konteynerler['tip_norm'].to_numpy(object),
+        'container_idx': konteynerler.index.to_numpy(),
+        'street_width': np.where(np.isinf(genislik), None, np.round(genislik, 2)).astype(object),
+    }
+    araclar_json = []
+    for ai, seferler in enumerate(arac_sefer):
+        if not seferler:
+            continue
+        v = filo.iloc[ai]
+        duraklar = [{'container_idx': -2, 'mahalle': 'DEPO', 'lat': DEPO[0], 'lon': DEPO[1], 'tip': 'BASLANGIC',
+                     'demand_ton': 0.0, 'hour': DAY_START_HOUR, 'load_ton': 0.0, 'street_width': None}]
+        mesafe = ton = 0.0
+        for sefer, varis, km in seferler:
+            k = sefer - 1
+            yuk = np.cumsum(talep[k])
+            saat = DAY_START_HOUR + (varis // 60).astype(int)
+            duraklar += pd.DataFrame({
+                'container_idx': kayit['container_idx'][k], 'mahalle': kayit['mahalle'][k],
+                'lat': kayit['lat'][k], 'lon': kayit['lon'][k], 'tip': kayit['tip'][k],
+                'demand_ton': np.round(talep[k], 4), 'hour': saat[:-1], 'load_ton': np.round(yuk, 4),
+                'street_width': kayit['street_width'][k],
+            }).to_dict('records')
+            duraklar.append({'container_idx': -1, 'mahalle': 'DEPO', 'lat': DEPO[0], 'lon': DEPO[1],
+                             'tip': 'BOŞALTMA', 'demand_ton': 0.0, 'hour': int(saat[-1]), 'load_ton': 0.0,
+                             'street_width': None})
+            ton += float(yuk[-1])
+            mesafe += km
+        araclar_json.append({
+            'vehicle_id': int(v['vehicle_id']),
+            'vehicle_name': v['vehicle_name'],
+            'vehicle_type': v['vehicle_type'],
+            'vehicle_category': v['vehicle_category'],
+            'capacity_ton': float(v['capacity_ton']),
+            'start_position': {'lat': DEPO[0], 'lon': DEPO[1], 'mahalle': 'DEPO'},
+            'total_stops': int(sum(len(sefer) for sefer, _, _ in seferler)),
+            'collected_tonnage': round(ton, 2),
+            'total_distance_km': round(mesafe, 2),
+            'unloads': len(seferler),
+            'route': duraklar,
+        })
+    routes_api = {
+        'date': tarih.strftime('%Y-%m-%d'),
+        'day': tarih.strftime('%A').upper(),
+        'total_vehicles': len(araclar_json),
+        'total_stops': int(sum(v['total_stops'] for v in araclar_json)),
+        'vehicles': araclar_json,
+    }
+    if cikti_yolu is not None:
+        with open(cikti_yolu, 'w', encoding='utf-8') as f:
+            json.dump(routes_api, f, ensure_ascii=False, indent=2)
+
+    gps = gps_gunluk_mesafeler(gps_klasoru, koordinatlar[1:])
+    oncesi, oncesi_kaynak = _gps_oncesi(gps, tarih)
+    if oncesi is None:
+        print(f"⚠️ GPS verisinde {tarih:%d.%m.%Y} ve aynı hafta günü yok, tasarruf hesaplanmadı")
+    return {
+        'basarili': True,
+        'mod': 'konteyner',
+        'kapsam': kapsam,
+        'toplam_arac': len(araclar_json),
+        'toplam_sefer': len(rotalar),
+        'toplam_konteyner': routes_api['total_stops'],
+        'toplam_talep': round(float(talep.sum()), 1),
+        'toplam_mesafe': round(toplam_mesafe, 1),
+        'insa_mesafesi': round(insa_mesafesi, 1),
+        'optimize_oncesi_mesafe': round(oncesi, 1) if oncesi is not None else None,
+        'optimize_oncesi_kaynak': oncesi_kaynak,
+        'optimize_oncesi_not': None if oncesi is not None else 'GPS verisinde bu tarih ve aynı hafta günü yok',
+        'tasarruf_km': round(oncesi - toplam_mesafe, 1) if oncesi is not None else None,
+        'tasarruf_yuzde': round(100 * (oncesi - toplam_mesafe) / oncesi, 1) if oncesi else None,
+        'vardiya_asan_arac': int(len(asan)),
+        **erisim_disi,
+        'sure_sn': round(time.time() - baslangic, 2),
+        'routes_api': routes_api,
+    }
+
 # Test
-if __name__ == '__main__':
+if __name__ == '__main__' and '--konteyner' in sys.argv:
+    # Konteyner ölçeği: python -m ai.rota_optimizer --konteyner [YYYY-MM-DD] [routes_api.json]
+    argumanlar = [a for a in sys.argv[1:] if a != '--konteyner']
+    tarih = datetime.strptime(argumanlar[0], '%Y-%m-%d') if argumanlar else None
+    cikti = argumanlar[1] if len(argumanlar) > 1 else str(PROJE_KOKU / 'full_dataset' / 'routes_api.json')
+    sonuc = optimize_konteyner_rotalari(tarih, cikti_yolu=cikti)
+    for anahtar, deger in sonuc.items():
+        if anahtar != 'routes_api':
+            print(f"{anahtar}: {deger}")
+    print(f"✅ Kaydedildi: {cikti}")
+elif __name__ == '__main__':
     print("Rota Optimizasyonu Testi")
     print("=" * 50)
     
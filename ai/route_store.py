@@ -0,0 +1,145 @@
+"""
+Sütunlu Rota Kaydı
+Planlayıcının durak kayıtlarını durak başına sözlük yerine önceden ayrılmış
+numpy sütunlarında tutar.
+
+Her araç için bir RouteStore:
+- container: int32 konteyner indeksi (>= 0), UNLOAD (-1), START (-2)
+- lat, lon: float32 koordinat (~0.5 m hassasiyet)
+- minute: int16 vardiya başından itibaren dakika
+- load: float32 duraktan sonraki yük (ton)
+- kind: int8 durak türü (KIND_START, KIND_CONTAINER, KIND_UNLOAD)
+
+Mahalle, tip, talep ve sokak genişliği gibi konteyner alanları kayıtta
+tutulmaz; CSV/JSON çıktıları üretilirken gün tablosundan indeksle
+(vektörel) birleştirilir. Kapasite dolunca sütunlar iki katına büyür.
+"""
+
+import numpy as np
+
+UNLOAD = -1
+START = -2
+
+KIND_START = 0
+KIND_CONTAINER = 1
+KIND_UNLOAD = 2
+
+INITIAL_CAPACITY = 64
+
+COLUMNS = (
+    ("container", np.int32),
+    ("lat", np.float32),
+    ("lon", np.float32),
+    ("minute", np.int16),
+    ("load", np.float32),
+    ("kind", np.int8),
+)
+
+
+class RouteStore:
+    """Tek aracın durak dizisi (sütunlu, büyüyebilir)"""
+
+    __slots__ = ("n",) + tuple(name for name, _ in COLUMNS)
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.n = 0
+        for name, dtype in COLUMNS:
+            setattr(self, name, np.empty(max(int(capacity), 1), dtype=dtype))
+
+    def __len__(self):
+        return self.n
+
+    def __getstate__(self):
+        return {name: getattr(self, name)[:self.n] for name, _ in COLUMNS}
+
+    def __setstate__(self, state):
+        self.n = len(state["container"])
+        for name, dtype in COLUMNS:
+            setattr(self, name, np.array(state[name], dtype=dtype))
+
+    def reserve(self, capacity):
+        """Sütunları en az capacity durak alacak şekilde büyüt"""
+        if capacity <= len(self.container):
+            return
+        for name, dtype in COLUMNS:
+            grown = np.empty(capacity, dtype=dtype)
+            grown[:self.n] = getattr(self, name)[:self.n]
+            setattr(self, name, grown)
+
+    def append(self, kind, container, lat, lon, minute, load):
+        i = self.n
+        if i == len(self.container):
+            self.reserve(2 * i)
+        self.container[i] = container
+        self.lat[i] = lat
+        self.lon[i] = lon
+        self.minute[i] = minute
+        self.load[i] = load
+        self.kind[i] = kind
+        self.n = i + 1
+
+    def add_start(self, lat, lon, minute=0):
+        self.append(KIND_START, START, lat, lon, minute, 0.0)
+
+    def add_container(self, idx, lat, lon, minute, load):
+        self.append(KIND_CONTAINER, idx, lat, lon, minute, load)
+
+    def add_unload(self, lat, lon, minute):
+        self.append(KIND_UNLOAD, UNLOAD, lat, lon, minute, 0.0)
+
+    def assign(self, container, lat, lon, minute, load):
+        """Rotayı verilen sütunlarla değiştir (tür, konteyner indeksinden türetilir)"""
+        container = np.asarray(container)
+        n = len(container)
+        self.n = 0
+        self.reserve(n)
+        self.container[:n] = container
+        self.lat[:n] = lat
+        self.lon[:n] = lon
+        self.minute[:n] = minute
+        self.load[:n] = load
+        self.kind[:n] = np.where(container >= 0, KIND_CONTAINER,
+                                 np.where(container == UNLOAD, KIND_UNLOAD, KIND_START))
+        self.n = n
+
+    def remap(self, index):
+        """Konteyner indekslerini index[i] ile çevir (alt problemden güne)"""
+        c = self.container[:self.n]
+        is_container = c >= 0
+        c[is_container] = np.asarray(index)[c[is_container]]
+
+    def truncate(self, n):
+        """İlk n durağı tut"""
+        self.n = min(max(int(n), 0), self.n)
+
+    def copy(self):
+        out = RouteStore(0)
+        out.__setstate__(self.__getstate__())
+        return out
+
+    def view(self, name):
+        """Sütunun dolu kısmı (kopyasız)"""
+        return getattr(self, name)[:self.n]
+
+    def count(self, kind):
+        return int(np.count_nonzero(self.kind[:self.n] == kind))
+
+
+def concat_routes(routes):
+    """
+    Rotaları tek sütun kümesinde birleştir.
+
+    Returns:
+        (owner, step, columns): owner = durağın rota sırası, step = rota
+        içindeki 1 tabanlı sıra, columns = {sütun adı: dizi}
+    """
+    lengths = np.array([len(r) for r in routes], dtype=np.int64)
+    total = int(lengths.sum())
+    owner = np.repeat(np.arange(len(routes)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    step = np.arange(total) - np.repeat(starts, lengths) + 1
+    columns = {}
+    for name, dtype in COLUMNS:
+        parts = [r.view(name) for r in routes if len(r)]
+        columns[name] = np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+    return owner, step, columns
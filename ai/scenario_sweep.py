@@ -0,0 +1,399 @@
+"""
+Filo Senaryo Taraması (What-If Analizi)
+Filo bileşimi, boşaltma noktası, ortalama hız ve vardiya penceresi
+kombinasyonlarını bir veya birkaç gün üzerinde planlayıp karşılaştırır.
+
+- Senaryo ızgarası: fleets × unload_sites × speeds × shifts (kartezyen çarpım)
+- Filo bileşimi kategori başına araç sayısıdır ({"CRANE": 15, "LARGE": 20, "SMALL": 6});
+  mevcut filodan o kategorinin araçları alınır, eksikler aynı kategorideki
+  araçların kopyasıyla (yeni id, varsayılan başlangıç konumu) tamamlanır
+- Her (senaryo, gün) çifti süreç havuzunda ayrı bir iştir; PlannerContext
+  ebeveynde bir kez yüklenir ve fork ile işçilere kopyalanmadan devredilir
+  (bkz. batch_planning)
+- minimal_fleet(): hedef kapsama oranına ulaşan en küçük filoyu ikili
+  aramayla bulur (kapsamanın araç sayısıyla monoton arttığı varsayılır)
+
+Kullanım:
+    python scenario_sweep.py --start 2025-12-15 --days 2 --fleet CRANE=15,LARGE=19,SMALL=4 \\
+        --fleet CRANE=12,LARGE=19,SMALL=8 --speed 20 --speed 25 --shift 6-23 --shift 6-20
+    python scenario_sweep.py --start 2025-12-15 --days 2 --min-fleet 0.95
+"""
+
+import argparse
+import itertools
+import multiprocessing as mp
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Tuple
+
+try:
+    from .güncel_v6_fullvehicle import PlannerContext, DEFAULT_CONFIG, DATA_DIR, normalize_text_tr
+    from .route_store import concat_routes
+except ImportError:  # script olarak çalıştırıldığında
+    from güncel_v6_fullvehicle import PlannerContext, DEFAULT_CONFIG, DATA_DIR, normalize_text_tr
+    from route_store import concat_routes
+
+CATEGORIES = ("CRANE", "LARGE", "SMALL")
+MAX_FLEET = 500  # minimal_fleet üst sınırı
+
+# İşçi süreç durumu - fork'ta ebeveynden devralınır, spawn'da _init_worker kurar
+_CONTEXT = None
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """
+    Tek bir what-if senaryosu.
+
+    fleet: {kategori: araç sayısı} (None = mevcut filo)
+    overrides: PlannerConfig alanları (unload_mah/unload_pos, avg_speed_kmh,
+        day_start_hour, day_end_hour, ...)
+    """
+    name: str
+    fleet: Optional[Tuple[Tuple[str, int], ...]] = None
+    overrides: Tuple[Tuple[str, object], ...] = ()
+
+    def config(self, base):
+        return replace(base, **dict(self.overrides))
+
+
+def fleet_counts(ctx):
+    """Mevcut filonun kategori başına araç sayısı"""
+    counts = ctx.vehicle_mgr.fleet["vehicle_category"].value_counts()
+    return {cat: int(counts.get(cat, 0)) for cat in CATEGORIES}
+
+
+def fleet_mix(ctx, counts):
+    """
+    Kategori başına istenen sayıda araçtan oluşan filo DataFrame'i. Mevcut
+    araçlar dosya sırasıyla alınır; fazlası o kategorinin araçlarının
+    kopyalarıdır (yeni id, "(ek)" adı).
+    """
+    fleet = ctx.vehicle_mgr.fleet
+    next_id = int(fleet["vehicle_id"].max()) + 1
+    parts = []
+    for cat, n in counts.items():
+        pool = fleet[fleet["vehicle_category"] == cat]
+        if n <= 0:
+            continue
+        if pool.empty:
+            raise ValueError(f"Filoda {cat} kategorisinde araç yok, kopyalanamaz")
+        rows = pool.iloc[np.arange(n) % len(pool)].copy()
+        extra = np.arange(n) >= len(pool)
+        rows.loc[extra, "vehicle_id"] = np.arange(next_id, next_id + extra.sum())
+        rows.loc[extra, "vehicle_name"] = rows.loc[extra, "vehicle_name"] + " (ek)"
+        next_id += int(extra.sum())
+        parts.append(rows)
+    if not parts:
+        return fleet.iloc[:0].copy()
+    return pd.concat(parts, ignore_index=True)
+
+
+def scenario_grid(fleets=(None,), unload_sites=(None,), speeds=(None,), shifts=(None,)):
+    """
+    Kartezyen senaryo ızgarası.
+
+    Args:
+        fleets: {kategori: sayı} sözlükleri (None = mevcut filo)
+        unload_sites: Boşaltma mahallesi adı (normalize edilir) veya (lat, lon)
+            (None = varsayılan)
+        speeds: Ortalama hız km/s (None = varsayılan)
+        shifts: (başlangıç saati, bitiş saati) (None = varsayılan)
+    """
+    scenarios = []
+    for fleet, site, speed, shift in itertools.product(fleets, unload_sites, speeds, shifts):
+        overrides, tags = {}, []
+        if fleet is not None:
+            tags.append("/".join(f"{cat[0]}{fleet.get(cat, 0)}" for cat in CATEGORIES))
+        if site is not None:
+            if isinstance(site, str):
+                overrides["unload_mah"] = normalize_text_tr(site)
+                tags.append(f"boşaltma={overrides['unload_mah']}")
+            else:
+                overrides["unload_pos"] = tuple(site)
+                tags.append(f"boşaltma=({site[0]:.4f},{site[1]:.4f})")
+        if speed is not None:
+            overrides["avg_speed_kmh"] = float(speed)
+            tags.append(f"{speed:g}km/s")
+        if shift is not None:
+            overrides["day_start_hour"], overrides["day_end_hour"] = int(shift[0]), int(shift[1])
+            tags.append(f"{shift[0]:02d}-{shift[1]:02d}")
+        scenarios.append(Scenario(
+            name=" ".join(tags) or "mevcut",
+            fleet=tuple(sorted(fleet.items())) if fleet is not None else None,
+            overrides=tuple(sorted(overrides.items())),
+        ))
+    return scenarios
+
+
+def _init_worker(data_dir):
+    global _CONTEXT
+    if _CONTEXT is None:
+        _CONTEXT = PlannerContext.build(data_dir)
+
+
+def _evaluate(task):
+    """Tek (senaryo, gün) çiftini planla ve ölçütlerini döndür"""
+    scenario, target_date, base = task
+    ctx = _CONTEXT
+    cfg = scenario.config(base)
+    fleet = fleet_mix(ctx, dict(scenario.fleet)) if scenario.fleet is not None else None
+    start = time.time()
+    day = ctx.prepare_day(target_date, cfg)
+    if day is None:
+        return None
+    # Gün bir kez hazırlanır; ctx.plan prepare_day'i tekrarlayacağından plan_day kullanılır
+    vehicles, _ = ctx.plan_day(day, cfg, fleet=fleet)
+    demand = day.day_containers["demand_ton"].values
+    stops = np.zeros(0, dtype=np.int64)
+    if vehicles:
+        stops = concat_routes([v["route"] for v in vehicles])[2]["container"].astype(np.int64)
+    collected = np.unique(stops[stops >= 0])
+    n_day = len(demand)
+    return {
+        "scenario": scenario.name,
+        "date": target_date.strftime("%Y-%m-%d"),
+        "vehicles": len(vehicles),
+        "containers": n_day,
+        "collected": len(collected),
+        "uncollected": n_day - len(collected),
+        "coverage_pct": round(100.0 * len(collected) / n_day, 2) if n_day else 100.0,
+        "demand_ton": round(float(demand.sum()), 2),
+        "collected_ton": round(float(demand[collected].sum()), 2),
+        "total_distance_km": round(sum(v["distance"] for v in vehicles), 2),
+        "unloads": int(sum(v["unloads"] for v in vehicles)),
+        "plan_seconds": round(time.time() - start, 2),
+    }
+
+
+def _run_tasks(tasks, data_dir, workers):
+    """(senaryo, gün, config) işlerini süreç havuzunda çalıştır"""
+    if workers > 1 and len(tasks) > 1:
+        if "fork" in mp.get_all_start_methods():
+            # İşçiler ebeveynin context'ini kopyalamadan devralır
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("fork"),
+                                       initializer=_init_worker, initargs=(data_dir,))
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data_dir,))
+        with pool:
+            rows = list(pool.map(_evaluate, tasks))
+    else:
+        rows = [_evaluate(t) for t in tasks]
+    return [r for r in rows if r is not None]
+
+
+def _prepare(context, data_dir, config):
+    global _CONTEXT
+    _CONTEXT = context if context is not None else _CONTEXT or PlannerContext.build(data_dir)
+    _CONTEXT.warm_up()
+    return config if config is not None else replace(DEFAULT_CONFIG, verbose=False)
+
+
+def _worker_count(context, n_tasks, workers):
+    """fork yoksa işçiler context'i data_dir'den yükler: hazır context tek süreçte kullanılır"""
+    if context is not None and "fork" not in mp.get_all_start_methods():
+        return 1
+    return workers or min(n_tasks, os.cpu_count() or 1)
+
+
+def _check_sites(ctx, scenarios):
+    """Bilinmeyen boşaltma mahallesi varsayılan başlangıç konumuna düşmesin"""
+    unknown = sorted({dict(s.overrides)["unload_mah"] for s in scenarios
+                      if "unload_mah" in dict(s.overrides)} - set(ctx.mahalle_index))
+    if unknown:
+        raise ValueError(f"Bilinmeyen boşaltma mahallesi: {', '.join(unknown)}")
+
+
+def summarize(per_day):
+    """Gün satırlarını senaryo başına topla (kapsama: günlerin toplamı üzerinden)"""
+    if per_day.empty:
+        return per_day
+    g = per_day.groupby("scenario", sort=False)
+    out = g.agg(days=("date", "count"), vehicles=("vehicles", "max"), containers=("containers", "sum"),
+                collected=("collected", "sum"), uncollected=("uncollected", "sum"),
+                demand_ton=("demand_ton", "sum"), collected_ton=("collected_ton", "sum"),
+                total_distance_km=("total_distance_km", "sum"), unloads=("unloads", "sum"),
+                plan_seconds=("plan_seconds", "sum")).reset_index()
+    out["coverage_pct"] = (100.0 * out["collected"] / out["containers"].clip(lower=1)).round(2)
+    out["tonnage_pct"] = (100.0 * out["collected_ton"] / out["demand_ton"].clip(lower=1e-9)).round(2)
+    out["total_distance_km"] = out["total_distance_km"].round(2)
+    return out
+
+
+def sweep(scenarios, dates, config=None, context=None, data_dir=None, workers=None):
+    """
+    Senaryoları günler üzerinde paralel değerlendir.
+
+    Args:
+        scenarios: Scenario listesi (bkz. scenario_grid)
+        dates: Planlanacak günler
+        config: Temel PlannerConfig (senaryo alanları bunun üzerine yazılır)
+        workers: Süreç sayısı (None ise min(iş sayısı, çekirdek sayısı))
+
+    Returns:
+        (summary, per_day): senaryo başına karşılaştırma tablosu ve
+        (senaryo, gün) satırları
+    """
+    base = _prepare(context, data_dir, config)
+    _check_sites(_CONTEXT, scenarios)
+    tasks = [(s, d, base) for s in scenarios for d in dates]
+    workers = _worker_count(context, len(tasks), workers)
+    print(f"🧪 SENARYO TARAMASI: {len(scenarios)} senaryo × {len(dates)} gün ({workers} süreç)")
+    started = time.time()
+    per_day = pd.DataFrame(_run_tasks(tasks, data_dir, workers))
+    summary = summarize(per_day)
+
+    print(f"\n{'='*60}")
+    print("📊 SENARYO KARŞILAŞTIRMASI")
+    print(f"{'='*60}")
+    for r in summary.itertuples():
+        print(f"   {r.scenario}: %{r.coverage_pct:.1f} kapsama, {r.uncollected} toplanmayan, "
+              f"{r.total_distance_km:.1f} km, {r.unloads} boşaltma")
+    print(f"⏱️ Toplam süre: {time.time() - started:.2f} saniye")
+    return summary, per_day
+
+
+def _scaled_counts(shares, n):
+    """n aracı paylara en büyük kalan yöntemiyle dağıt (payı olan kategori en az 1)"""
+    cats = [c for c in CATEGORIES if shares.get(c, 0) > 0]
+    weights = np.array([shares[c] for c in cats], dtype=np.float64)
+    raw = weights / weights.sum() * max(n, len(cats))
+    counts = np.maximum(np.floor(raw).astype(np.int64), 1)
+    for i in np.argsort(-(raw - np.floor(raw)), kind="stable")[:max(n - int(counts.sum()), 0)]:
+        counts[i] += 1
+    return dict(zip(cats, counts.tolist()))
+
+
+def minimal_fleet(target_coverage, dates, config=None, context=None, data_dir=None, workers=None,
+                  mix=None, category=None):
+    """
+    Tüm günlerde hedef kapsamaya (0-1, konteyner sayısı) ulaşan en küçük filo.
+
+    İkili arama kapsamanın filo büyüdükçe artmadığı durumları görmez;
+    açgözlü planlayıcı bunu garanti etmediğinden bulunan filo hedefe
+    ulaşır ama gerçek en küçük filo olmayabilir. Günlerin hiçbiri
+    planlanamıyorsa (prepare_day hep None) kapsama tanımsızdır: ValueError.
+
+    Args:
+        mix: {kategori: sayı} başlangıç bileşimi (None = mevcut filo)
+        category: Verilirse sadece bu kategorinin sayısı aranır, diğerleri
+            mix'teki gibi kalır; None ise toplam araç sayısı aranır ve mix
+            oranlarıyla kategorilere dağıtılır
+
+    Returns:
+        (counts, summary): bulunan bileşim (ulaşılamazsa None) ve denenen
+        filoların özet tablosu
+    """
+    base = _prepare(context, data_dir, config)
+    mix = dict(mix) if mix is not None else fleet_counts(_CONTEXT)
+    workers = _worker_count(context, len(dates), workers)
+
+    def counts_for(n):
+        if category is not None:
+            return {**mix, category: n}
+        return _scaled_counts(mix, n)
+
+    # Farklı n'ler aynı bileşimi verebilir; her bileşim bir kez planlanır
+    tried = {}
+
+    def coverage(n):
+        counts = counts_for(n)
+        key = tuple(sorted(counts.items()))
+        if key not in tried:
+            scenario = scenario_grid(fleets=[counts])[0]
+            rows = summarize(pd.DataFrame(_run_tasks([(scenario, d, base) for d in dates], data_dir, workers)))
+            if rows.empty:
+                raise ValueError("Verilen günlerin hiçbirinde planlanacak konteyner yok, kapsama tanımsız")
+            tried[key] = rows.iloc[0].to_dict()
+            print(f"   {scenario.name}: %{tried[key]['coverage_pct']:.2f} kapsama")
+        return tried[key]["coverage_pct"] / 100.0
+
+    print(f"🔎 EN KÜÇÜK FİLO: hedef %{100 * target_coverage:.1f} kapsama, {len(dates)} gün")
+    # lo: aranmasına gerek olmayan en büyük sayı. Kategori aramasında 0 araç da
+    # denenebilir; toplam aramada payı olan her kategori en az 1 araç aldığından
+    # kategori sayısının altındaki n'ler aynı filoyu verir.
+    lo = -1 if category is not None else len(_scaled_counts(mix, 0)) - 1
+    hi = max(mix.get(category, 0) if category is not None else sum(mix.values()), lo + 1)
+    # Üst sınır hedefe ulaşmıyorsa ikiye katlanarak genişletilir
+    while coverage(hi) < target_coverage:
+        if hi >= MAX_FLEET:
+            print(f"⚠️ {MAX_FLEET} araçla da hedefe ulaşılamadı")
+            return None, pd.DataFrame(tried.values())
+        lo, hi = hi, min(max(2 * hi, 1), MAX_FLEET)
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        if coverage(mid) >= target_coverage:
+            hi = mid
+        else:
+            lo = mid
+    counts = counts_for(hi)
+    print(f"✅ En küçük filo: {counts} ({sum(counts.values())} araç)")
+    return counts, pd.DataFrame(tried.values())
+
+
+def _parse_date(text):
+    return datetime.strptime(text, "%Y-%m-%d")
+
+
+def _parse_fleet(text):
+    """"CRANE=15,LARGE=19,SMALL=4" -> {"CRANE": 15, ...}"""
+    out = {}
+    for part in text.split(","):
+        cat, n = part.split("=")
+        out[cat.strip().upper()] = int(n)
+    return out
+
+
+def _parse_site(text):
+    """Mahalle adı veya "lat,lon" """
+    parts = text.split(",")
+    if len(parts) == 2:
+        try:
+            return float(parts[0]), float(parts[1])
+        except ValueError:
+            pass
+    return text
+
+
+def _parse_shift(text):
+    a, b = text.split("-")
+    return int(a), int(b)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Filo/boşaltma/hız/vardiya senaryolarını karşılaştır")
+    parser.add_argument("--start", type=_parse_date, required=True, help="İlk gün (YYYY-MM-DD)")
+    parser.add_argument("--days", type=int, default=1, help="Gün sayısı")
+    parser.add_argument("--fleet", type=_parse_fleet, action="append", help="CRANE=15,LARGE=19,SMALL=4 (tekrarlanabilir)")
+    parser.add_argument("--unload", type=_parse_site, action="append", help="Boşaltma mahallesi veya lat,lon")
+    parser.add_argument("--speed", type=float, action="append", help="Ortalama hız km/s")
+    parser.add_argument("--shift", type=_parse_shift, action="append", help="Vardiya, ör. 6-23")
+    parser.add_argument("--min-fleet", type=float, default=None, help="Bu kapsamaya (0-1) ulaşan en küçük filoyu ara")
+    parser.add_argument("--category", default=None, help="--min-fleet sadece bu kategoriyi değiştirsin")
+    parser.add_argument("--workers", type=int, default=None, help="Süreç sayısı")
+    parser.add_argument("--data-dir", default=None, help="Veri klasörü (varsayılan: full_dataset)")
+    parser.add_argument("--output", default=None, help="Sonuç CSV klasörü")
+    args = parser.parse_args()
+
+    dates = [args.start + timedelta(days=i) for i in range(args.days)]
+    output_dir = Path(args.output) if args.output else Path(args.data_dir) if args.data_dir else DATA_DIR
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tag = f"{args.start:%Y%m%d}_{args.days}"
+    if args.min_fleet is not None:
+        counts, tried = minimal_fleet(args.min_fleet, dates, data_dir=args.data_dir, workers=args.workers,
+                                      mix=args.fleet[0] if args.fleet else None,
+                                      category=args.category.upper() if args.category else None)
+        tried.to_csv(output_dir / f"min_fleet_{tag}.csv", index=False)
+    else:
+        scenarios = scenario_grid(args.fleet or [None], args.unload or [None], args.speed or [None],
+                                  args.shift or [None])
+        summary, per_day = sweep(scenarios, dates, data_dir=args.data_dir, workers=args.workers)
+        summary.to_csv(output_dir / f"scenario_summary_{tag}.csv", index=False)
+        per_day.to_csv(output_dir / f"scenario_days_{tag}.csv", index=False)
+        print(f"✅ Özet: {output_dir / f'scenario_summary_{tag}.csv'}")
@@ -0,0 +1,189 @@
+"""
+Uzamsal Aday İndeksi
+Günün konteynerleri üzerinde silme destekli (tombstone) düzgün grid.
+Greedy planlayıcı her adımda tüm konteynerleri skorlamak yerine
+mevcut konuma en yakın k uygun adayı buradan alır.
+"""
+
+import numpy as np
+
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON_EQ = 111.320
+
+
+class CandidateGrid:
+    """
+    Konteynerleri km cinsinden yerel projeksiyonda hücrelere böler.
+    - restrict(members): indeksi konteyner alt kümesiyle yeniden kurar
+    - remove(i): konteyneri silindi olarak işaretler (tombstone)
+    - query(lat, lon, k, allowed): hâlâ canlı ve izinli en yakın k konteyner
+
+    Hücreler satır-öncelikli (ix * ny + iy) sıralandığı için bir hücre
+    satırındaki tüm konteynerler `order` dizisinde bitişiktir. Sorgu,
+    yarıçapı ikiye katlanan kareleri satır başına en fazla iki dilimle
+    toplar; ölü kayıtlar yarıyı geçince indeks sıkıştırılır.
+    """
+
+    TARGET_PER_CELL = 4
+    MIN_CELL_KM = 0.05
+    MAX_CELL_KM = 2.0
+
+    def __init__(self, lats, lons, cell_km=None):
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        self.n = len(lats)
+
+        if self.n == 0:
+            self.lat_min, self.lon_min = 0.0, 0.0
+            self.kx = KM_PER_DEG_LON_EQ
+        else:
+            self.lat_min = float(lats.min())
+            self.lon_min = float(lons.min())
+            self.kx = KM_PER_DEG_LON_EQ * np.cos(np.radians(float(lats.mean())))
+        self.ky = KM_PER_DEG_LAT
+
+        self.x = (lons - self.lon_min) * self.kx
+        self.y = (lats - self.lat_min) * self.ky
+
+        if cell_km is None:
+            # Hücre başına ortalama TARGET_PER_CELL konteyner düşecek boyut
+            area = max(float(self.x.max() * self.y.max()), 1e-6) if self.n else 1.0
+            cell_km = np.sqrt(area * self.TARGET_PER_CELL / max(self.n, 1))
+            cell_km = min(max(cell_km, self.MIN_CELL_KM), self.MAX_CELL_KM)
+        self.cell_km = float(cell_km)
+
+        ix = (self.x // self.cell_km).astype(np.int64)
+        iy = (self.y // self.cell_km).astype(np.int64)
+        self.nx = int(ix.max()) + 1 if self.n else 1
+        self.ny = int(iy.max()) + 1 if self.n else 1
+        self.cell = ix * self.ny + iy
+
+        self.alive = np.ones(self.n, dtype=bool)
+        self.indexed = np.zeros(self.n, dtype=bool)
+        self.n_alive = self.n
+        self.restrict(np.arange(self.n))
+
+    def restrict(self, members):
+        """
+        İndeksi sadece verilen konteynerlerle yeniden kur (ör. zaman diliminde
+        izinli olanlar). Silinmiş konteynerler zaten dışarıda kalır.
+        """
+        members = np.asarray(members, dtype=np.int64)
+        members = members[self.alive[members]]
+        cells = self.cell[members]
+        sort = np.argsort(cells, kind="stable")
+        self.order = members[sort]
+        counts = np.bincount(cells, minlength=self.nx * self.ny)
+        self.cell_start = np.zeros(self.nx * self.ny + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.cell_start[1:])
+        self.indexed[:] = False
+        self.indexed[members] = True
+        self.n_indexed = len(members)
+        self.n_indexed_alive = len(members)
+
+    def remove(self, idx):
+        """Konteyneri indeksten düşür (toplandı / atlandı)"""
+        if self.alive[idx]:
+            self.alive[idx] = False
+            self.n_alive -= 1
+            if self.indexed[idx]:
+                self.n_indexed_alive -= 1
+                # Ölü kayıtlar çoğunluğa geçince sıkıştır
+                if self.n_indexed > 64 and self.n_indexed_alive < self.n_indexed // 2:
+                    self.restrict(self.order)
+
+    def project(self, lat, lon):
+        return (lon - self.lon_min) * self.kx, (lat - self.lat_min) * self.ky
+
+    def _band_indices(self, cx, cy, r_in, r_out):
+        """Chebyshev hücre uzaklığı r_in < d <= r_out olan hücrelerdeki konteynerler"""
+        ny = self.ny
+        cs = self.cell_start
+        order = self.order
+        y0, y1 = max(cy - r_out, 0), min(cy + r_out, ny - 1)
+        inner_lo, inner_hi = cy - r_in - 1, cy + r_in + 1
+
+        # Her satır için en fazla iki bitişik aralık (iç kare hariç)
+        chunks = []
+        for ix in range(max(cx - r_out, 0), min(cx + r_out, self.nx - 1) + 1):
+            base = ix * ny
+            if abs(ix - cx) > r_in:
+                a, b = cs[base + y0], cs[base + y1 + 1]
+                if b > a:
+                    chunks.append(order[a:b])
+                continue
+            if inner_lo >= y0:
+                a, b = cs[base + y0], cs[base + inner_lo + 1]
+                if b > a:
+                    chunks.append(order[a:b])
+            if inner_hi <= y1:
+                a, b = cs[base + inner_hi], cs[base + y1 + 1]
+                if b > a:
+                    chunks.append(order[a:b])
+
+        if not chunks:
+            return None
+        return np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+
+    def query(self, lat, lon, k, allowed=None):
+        """
+        (lat, lon) konumuna en yakın, canlı ve `allowed` maskesinde True olan
+        en fazla k konteynerin indekslerini mesafe sırasıyla döndürür.
+
+        Kare yarıçapı tüm gridi kapsayana kadar büyüdüğü için boş sonuç
+        indekste gerçekten uygun konteyner kalmadığı anlamına gelir.
+        """
+        if self.n_indexed_alive == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64)
+
+        qx, qy = self.project(lat, lon)
+        cx = int(np.floor(qx / self.cell_km))
+        cy = int(np.floor(qy / self.cell_km))
+        # Grid dışındaki konumlar (ör. boşaltma noktası) en yakın hücreye kenetlenir;
+        # durma koşulunda kenetleme mesafesi kadar pay bırakılır
+        ccx = min(max(cx, 0), self.nx - 1)
+        ccy = min(max(cy, 0), self.ny - 1)
+        if cx != ccx or cy != ccy:
+            outside_km = (np.hypot(cx - ccx, cy - ccy) + 1.0) * self.cell_km
+        else:
+            outside_km = 0.0
+
+        max_ring = max(ccx, self.nx - 1 - ccx, ccy, self.ny - 1 - ccy, 0)
+        found_idx = []
+        found_d = []
+        n_found = 0
+        # İlk kare ortalama yoğunlukta yaklaşık k konteyner içerecek boyutta
+        r_in = -1
+        r_out = max(1, int(np.ceil(0.5 * np.sqrt(k / self.TARGET_PER_CELL))))
+
+        while True:
+            idx = self._band_indices(ccx, ccy, r_in, r_out)
+            if idx is not None:
+                keep = self.alive[idx]
+                if allowed is not None:
+                    keep &= allowed[idx]
+                idx = idx[keep]
+                if len(idx):
+                    found_idx.append(idx)
+                    found_d.append(np.hypot(self.x[idx] - qx, self.y[idx] - qy))
+                    n_found += len(idx)
+
+            if r_out >= max_ring:
+                break
+            # Taranmamış hücrelerdeki noktalar en az r_out * cell_km uzakta
+            if n_found >= k:
+                d_all = np.concatenate(found_d)
+                if np.partition(d_all, k - 1)[k - 1] <= r_out * self.cell_km - outside_km:
+                    return self._take_k(np.concatenate(found_idx), d_all, k)
+            r_in, r_out = r_out, r_out * 2
+
+        if n_found == 0:
+            return np.empty(0, dtype=np.int64)
+        return self._take_k(np.concatenate(found_idx), np.concatenate(found_d), k)
+
+    @staticmethod
+    def _take_k(idx, d, k):
+        if len(idx) > k:
+            part = np.argpartition(d, k - 1)[:k]
+            idx, d = idx[part], d[part]
+        return idx[np.argsort(d, kind="stable")]
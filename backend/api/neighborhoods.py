@@ -4,6 +4,7 @@ Mahalle ve konteyner yönetimi API'leri
 """
 from flask import jsonify
 import pandas as pd
+from ai.mahalle_merkezleri import mahalle_merkezleri, mahalle_merkezi
 from . import neighborhoods_bp
 
 
@@ -71,7 +72,8 @@ def api_mahalleler():
 def api_mahalleler_liste():
     """Dropdown için mahalle listesi"""
     
-    # Mahalle koordinatları (CSV'deki tam isimlerle)
+    # Yaklaşık mahalle koordinatları (CSV'deki tam isimlerle) - merkez tablosu
+    # oluşturulamazsa veya mahalle tabloda yoksa kullanılır
     mahalle_koordinatlari = {
         '100. YIL ': {'lat': 40.2234, 'lon': 28.8678},
         '19 MAYIS': {'lat': 40.2156, 'lon': 28.8423},
@@ -143,10 +145,21 @@ def api_mahalleler_liste():
     try:
         df = pd.read_csv('full_dataset/container_counts.csv', sep=';', encoding='utf-8')
         
+        # GPS / konteyner verilerinden hesaplanan merkezler (init_db'de oluşturulan
+        # tablo; yoksa sabit koordinatlar kullanılır)
+        try:
+            merkezler = mahalle_merkezleri()
+        except FileNotFoundError:
+            merkezler = None
+        
         mahalleler = []
         for _, row in df.iterrows():
             mahalle_ad = str(row['MAHALLE']).strip()
-            coords = mahalle_koordinatlari.get(mahalle_ad, {'lat': 40.22, 'lon': 28.94})
+            merkez = mahalle_merkezi(mahalle_ad, merkezler) if merkezler is not None else None
+            if merkez is not None:
+                coords = {'lat': round(merkez[0], 6), 'lon': round(merkez[1], 6)}
+            else:
+                coords = mahalle_koordinatlari.get(mahalle_ad, {'lat': 40.22, 'lon': 28.94})
             mahalleler.append({
                 'id': mahalle_ad.lower().replace(' ', '_').replace('ı', 'i').replace('ö', 'o').replace('ü', 'u').replace('ş', 's').replace('ç', 'c').replace('ğ', 'g').replace('.', ''),
                 'ad': mahalle_ad,
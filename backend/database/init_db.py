@@ -6,6 +6,7 @@ import sqlite3
 import pandas as pd
 import os
 from backend.database.database import init_database, create_default_users, DB_PATH
+from ai.mahalle_merkezleri import merkez_tablosu_olustur, mahalle_merkezi
 
 # Ana proje klasörü (backend/database/'den 2 üst)
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
@@ -49,11 +50,20 @@ def import_neighborhood_data():
         df_containers['TOPLAM'] = df_containers['TOPLAM'].astype(str).str.replace('.', '').str.replace(',', '')
         df_containers['TOPLAM'] = pd.to_numeric(df_containers['TOPLAM'], errors='coerce').fillna(0).astype(int)
         
+        # Mahalle merkezleri (GPS / konteyner verilerinden) - tablo import sırasında
+        # yeniden oluşturulur, API'ler sadece okur
+        try:
+            merkezler = merkez_tablosu_olustur()
+        except FileNotFoundError:
+            merkezler = None
+        
         conn = sqlite3.connect(DB_PATH)
         cursor = conn.cursor()
         
         for _, row in df_containers.iterrows():
             mahalle_adi = row['MAHALLE'].strip()
+            merkez = mahalle_merkezi(mahalle_adi, merkezler) if merkezler is not None else None
+            lat, lon = merkez if merkez is not None else (None, None)
             toplam_konteyner = row['TOPLAM']
             yeralti = row.get('YERALTI KONTEYNER', 0)
             
@@ -67,13 +77,15 @@ def import_neighborhood_data():
             
             cursor.execute('''
                 INSERT OR REPLACE INTO neighborhoods 
-                (name, total_containers, underground_containers, requires_crane)
-                VALUES (?, ?, ?, ?)
+                (name, total_containers, underground_containers, requires_crane, latitude, longitude)
+                VALUES (?, ?, ?, ?, ?, ?)
             ''', (
                 mahalle_adi,
                 int(toplam_konteyner),
                 yeralti_int,
-                requires_crane
+                requires_crane,
+                lat,
+                lon
             ))
         
         conn.commit()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# ai paketi proje kökünden içe aktarılır (ai.güncel_v6_fullvehicle, ai.rota_optimizer ...)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ai.güncel_v6_fullvehicle import TonnageManager
+from ai.konteyner_verisi import load_containers, container_capacity
+
+
+@pytest.fixture
+def containers_csv(tmp_path):
+    rng = np.random.default_rng(11)
+    n = 400
+    df = pd.DataFrame({
+        "Mahalle": rng.choice(["Görükle Mahallesi", "ALAADDİNBEY MH.", "Odunluk", "Beşevler Mh", None], n),
+        "Tip": rng.choice(["770 LT", "400 lt", "Yeraltı", "YERALTI 3000", "Diğer", "BILINMIYOR", None], n),
+        "Lat": 40.2 + rng.random(n) * 0.05,
+        "Lon": 28.9 + rng.random(n) * 0.05,
+    })
+    path = tmp_path / "konteyner_tipli.csv"
+    df.to_csv(path, index=False)
+    return path
+
+
+def _reference_demand(containers_df, mah_tonnage):
+    """Kodlu tablodan önceki hesap: satır başına kapasite, groupby ile mahalle toplamı"""
+    df = containers_df[["mahalle_norm", "tip_norm"]].copy()
+    df["container_capacity"] = container_capacity(df["tip_norm"].values)
+    mah_total_cap = df.groupby("mahalle_norm")["container_capacity"].transform("sum")
+    df["mah_tonnage"] = df["mahalle_norm"].map(mah_tonnage).fillna(0)
+    df["ratio"] = df["container_capacity"] / mah_total_cap.replace(0, 1)
+    demand = np.minimum(df["mah_tonnage"] * df["ratio"], df["container_capacity"] * 0.8)
+    return np.maximum(demand, df["container_capacity"] * 0.3).values
+
+
+def test_codes_and_capacity(containers_csv):
+    df = load_containers(containers_csv)
+    names = df["mahalle_norm"].values
+    codes = df["mahalle_code"].values
+    # Kod <-> ad birebir
+    assert all(len(set(names[codes == c])) == 1 for c in np.unique(codes))
+    assert len(np.unique(codes)) == len(set(names))
+    tips = df["tip_norm"].values
+    assert all(len(set(tips[df["tip_code"].values == c])) == 1 for c in np.unique(df["tip_code"]))
+    # Tip başına bir kez hesaplanan kapasite satır başına hesapla aynı
+    np.testing.assert_array_equal(df["container_capacity"].values, container_capacity(tips))
+
+
+@pytest.mark.parametrize("precoded", [True, False])
+def test_distribute_matches_groupby(containers_csv, precoded):
+    df = load_containers(containers_csv)
+    if not precoded:
+        df = df.drop(columns=["mahalle_code", "container_capacity"])
+    mahs = sorted(set(df["mahalle_norm"]))
+    mah_tonnage = {m: 3.0 + i for i, m in enumerate(mahs[:-1])}  # son mahallenin tonajı yok
+    expected = _reference_demand(df, mah_tonnage)
+    out = TonnageManager().distribute_to_containers(df, mah_tonnage)
+    assert out is df  # yerinde güncellenir
+    # Mahalle kapasite toplamı farklı sırayla toplanır: sadece son basamaklar farklı olabilir
+    np.testing.assert_allclose(out["demand_ton"].values, expected, rtol=1e-12, atol=0)
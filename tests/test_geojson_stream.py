@@ -0,0 +1,79 @@
+import json
+
+import numpy as np
+import pytest
+
+from ai.geojson_stream import iter_features, read_road_lines, parse_width, WIDTH_PROPERTY
+
+
+@pytest.fixture
+def road_file(tmp_path):
+    """Küçük yol dosyası: Türkçe karakterli özellikler, MultiLineString, kısa ve geometrisiz çizgiler"""
+    rng = np.random.default_rng(7)
+    features = []
+    for i in range(40):
+        n = int(rng.integers(2, 6))
+        coords = np.column_stack([28.9 + rng.random(n) * 0.05, 40.2 + rng.random(n) * 0.05]).tolist()
+        width = ["5,5", 8, "0", "yok", 12.0][i % 5]
+        props = {WIDTH_PROPERTY: width, "Ad": f"Güzelyalı Çağlayan Sokağı {i}"}
+        if i % 7 == 3:
+            geom = {"type": "MultiLineString", "coordinates": [coords, coords[:1], coords[::-1]]}
+        else:
+            geom = {"type": "LineString", "coordinates": coords}
+        features.append({"type": "Feature", "properties": props, "geometry": geom})
+    features.append({"type": "Feature", "properties": {"Ad": "Nokta"},
+                     "geometry": {"type": "Point", "coordinates": [28.9, 40.2]}})
+    features.append({"type": "Feature", "properties": {}, "geometry": None})
+    path = tmp_path / "yol.json"
+    path.write_text(json.dumps({"type": "FeatureCollection", "name": "Yol", "features": features},
+                               ensure_ascii=False, indent=1), encoding="utf-8")
+    return path
+
+
+def _reference_lines(path):
+    """json.load ile aynı çizgi dizileri (akışlı okuyucudan önceki yol)"""
+    with open(path, encoding="utf-8") as f:
+        features = json.load(f)["features"]
+    lons, lats, starts, widths, names = [], [], [0], [], []
+    for feat in features:
+        geom = feat.get("geometry") or {}
+        if geom.get("type") == "LineString":
+            lines = [geom["coordinates"]]
+        elif geom.get("type") == "MultiLineString":
+            lines = geom["coordinates"]
+        else:
+            continue
+        for coords in lines:
+            if len(coords) < 2:
+                continue
+            lons += [c[0] for c in coords]
+            lats += [c[1] for c in coords]
+            starts.append(len(lons))
+            widths.append(parse_width(feat["properties"].get(WIDTH_PROPERTY, 6.0)))
+            names.append(feat["properties"].get("Ad", ""))
+    return lons, lats, starts, widths, names
+
+
+@pytest.mark.parametrize("chunk_size", [7, 64, 1 << 20])
+def test_iter_features_matches_json_load(road_file, chunk_size):
+    # Küçük parçalar özelliklerin ve çok baytlı UTF-8 karakterlerin parça sınırında bölünmesini sağlar
+    with open(road_file, encoding="utf-8") as f:
+        expected = json.load(f)["features"]
+    assert list(iter_features(road_file, chunk_size=chunk_size)) == expected
+
+
+def test_read_road_lines_matches_json_load(road_file):
+    lons, lats, starts, widths, names = _reference_lines(road_file)
+    out = read_road_lines(road_file, properties=("Ad",), progress=False)
+    np.testing.assert_array_equal(out["vertex_lon"], lons)
+    np.testing.assert_array_equal(out["vertex_lat"], lats)
+    np.testing.assert_array_equal(out["line_start"], starts)
+    np.testing.assert_array_equal(out["width"], np.array(widths, dtype=np.float32))
+    assert out["Ad"] == names
+
+
+def test_truncated_file_raises(road_file, tmp_path):
+    broken = tmp_path / "kesik.json"
+    broken.write_bytes(road_file.read_bytes()[:-200])
+    with pytest.raises(ValueError):
+        list(iter_features(broken, chunk_size=64))
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from ai.local_search import intra_moves, MOVES
+
+
+def _trip_km(D, pos, order):
+    """[önceki, *order, sonraki] yolunun D üzerindeki uzunluğu"""
+    ext = np.concatenate([[0], pos[order], [len(D) - 1]])
+    return float(D[ext[:-1], ext[1:]].sum())
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("m", [2, 3, 6, 12])
+def test_intra_move_deltas_match_recomputed_length(seed, m):
+    rng = np.random.default_rng(seed)
+    xy = rng.random((m + 2, 2))
+    D = np.sqrt(((xy[:, None] - xy[None, :]) ** 2).sum(-1))
+    trip = np.arange(100, 100 + m)          # konteyner indeksleri
+    pos = np.zeros(100 + m, dtype=np.int64)
+    pos[trip] = np.arange(1, m + 1)          # konteyner -> D içindeki sıra
+    stats = {mv: {"evaluated": 0} for mv in MOVES}
+
+    before = _trip_km(D, pos, trip)
+    cands = intra_moves(D, trip, stats)
+    for delta, kind, new in cands:
+        assert kind in ("2opt", "or_opt")
+        assert sorted(new.tolist()) == trip.tolist()
+        assert delta < 0
+        assert _trip_km(D, pos, new) - before == pytest.approx(delta, abs=1e-9)
+    assert [c[0] for c in cands] == sorted(c[0] for c in cands)
+    assert stats["2opt"]["evaluated"] == m * (m - 1) // 2
+
+
+def test_intra_moves_fix_crossing():
+    # Kare köşeleri çapraz sırayla: 2-opt kesişmeyi açar
+    xy = np.array([[0, 0], [0, 1], [1, 0], [1, 1], [0, 0]], dtype=np.float64)
+    D = np.sqrt(((xy[:, None] - xy[None, :]) ** 2).sum(-1))
+    cands = intra_moves(D, np.array([1, 2, 3]))
+    assert cands and cands[0][0] < 0
+    pos = np.arange(4)
+    assert _trip_km(D, pos, cands[0][2]) == pytest.approx(_trip_km(D, pos, np.array([1, 2, 3])) + cands[0][0])
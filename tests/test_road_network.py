@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+from scipy.spatial import cKDTree
+
+from ai.road_network import RoadGraph, M2M_BLOCK
+
+WIDTHS = (0.0, 4.0, 7.0)
+
+
+@pytest.fixture(scope="module")
+def graph_and_edges():
+    """Rastgele geometrik graf: 3 en yakın komşu kenarları, farklı genişlikte paralel kenarlar"""
+    rng = np.random.default_rng(21)
+    n = 300
+    lat = 40.2 + rng.random(n) * 0.05
+    lon = 28.9 + rng.random(n) * 0.06
+    xy = np.column_stack([lon * 85.0, lat * 111.0])
+    _, nbr = cKDTree(xy).query(xy, k=4)
+    u = np.repeat(np.arange(n), 3)
+    v = nbr[:, 1:].ravel()
+    km = np.hypot(*(xy[u] - xy[v]).T) * rng.uniform(1.0, 1.4, len(u))
+    width = rng.choice([3.0, 5.0, 8.0], len(u))
+    # Aynı düğüm çiftinde daha uzun ama geniş ikinci kenar
+    extra = rng.choice(len(u), 80, replace=False)
+    u, v = np.concatenate([u, u[extra]]), np.concatenate([v, v[extra]])
+    km = np.concatenate([km, km[extra] * 1.5])
+    width = np.concatenate([width, np.full(len(extra), 8.0)])
+    return RoadGraph(lat, lon, u, v, km, width), (u, v, km, width)
+
+
+def _reference(edges, n, min_width):
+    """Grafın kendi CSR'ından bağımsız referans: paralel kenarlardan en kısası, scipy dijkstra"""
+    u, v, km, width = edges
+    keep = width >= min_width
+    dense = np.full((n, n), np.inf)
+    np.minimum.at(dense, (u[keep], v[keep]), km[keep].astype(np.float32).astype(np.float64))
+    np.minimum.at(dense, (v[keep], u[keep]), km[keep].astype(np.float32).astype(np.float64))
+    rows, cols = np.nonzero(np.isfinite(dense))
+    m = csr_matrix((dense[rows, cols], (rows, cols)), shape=(n, n))
+    return dijkstra(m)
+
+
+@pytest.mark.parametrize("landmarks", [False, True])
+@pytest.mark.parametrize("min_width", WIDTHS)
+def test_shortest_path_matches_dijkstra(graph_and_edges, min_width, landmarks):
+    graph, edges = graph_and_edges
+    graph.landmarks.pop(float(min_width), None)
+    if landmarks:
+        graph.prepare_landmarks(min_width)
+    ref = _reference(edges, graph.n_nodes, min_width)
+    rng = np.random.default_rng(int(min_width * 10) + landmarks)
+    pairs = rng.integers(0, graph.n_nodes, size=(150, 2))
+    got = np.array([graph.shortest_path_km(s, t, min_width) for s, t in pairs])
+    want = ref[pairs[:, 0], pairs[:, 1]]
+    # Dar genişliklerde bağlantısız bileşenler: inf aynı yerde olmalı
+    assert np.array_equal(np.isinf(got), np.isinf(want))
+    fin = np.isfinite(want)
+    np.testing.assert_allclose(got[fin], want[fin], rtol=1e-5, atol=1e-6)
+    if min_width == 7.0:
+        assert np.isinf(want).any()
+
+
+@pytest.mark.parametrize("min_width", WIDTHS)
+def test_many_to_many_matches_dijkstra(graph_and_edges, min_width):
+    graph, edges = graph_and_edges
+    ref = _reference(edges, graph.n_nodes, min_width)
+    rng = np.random.default_rng(5)
+    # Blok sınırını aşan, tekrarlı kaynaklar; hem kaynak < hedef hem de (devrik) kaynak > hedef
+    many = rng.integers(0, graph.n_nodes, M2M_BLOCK * 2 + 7)
+    few = rng.integers(0, graph.n_nodes, 40)
+    for sources, targets in ((few, many), (many, few), (many, many[:M2M_BLOCK + 1])):
+        got = graph.many_to_many_km(sources, targets, min_width)
+        assert got.shape == (len(sources), len(targets))
+        np.testing.assert_allclose(got, ref[np.ix_(sources, targets)], rtol=1e-5)
+    got = graph.one_to_many_km(few[0], many, min_width)
+    np.testing.assert_allclose(got, ref[few[0], many], rtol=1e-6)
+
+
+def test_limit_cuts_search(graph_and_edges):
+    graph, edges = graph_and_edges
+    ref = _reference(edges, graph.n_nodes, 0.0)
+    limit = float(np.median(ref[0][np.isfinite(ref[0])]))
+    got = graph.many_to_many_km([0], np.arange(graph.n_nodes), 0.0, limit=limit)[0]
+    near = ref[0] <= limit * (1 - 1e-6)
+    np.testing.assert_allclose(got[near], ref[0][near], rtol=1e-5)
+    assert np.all(np.isinf(got[ref[0] > limit * (1 + 1e-6)]))
+
+
+def test_save_load_keeps_landmarks(graph_and_edges, tmp_path):
+    graph, _ = graph_and_edges
+    graph.prepare_landmarks(4.0)
+    graph.save(tmp_path / "g.npz")
+    loaded = RoadGraph.load(tmp_path / "g.npz")
+    np.testing.assert_array_equal(loaded.landmarks[4.0], graph.landmarks[4.0])
+    assert loaded.shortest_path_km(3, 250, 4.0) == pytest.approx(graph.shortest_path_km(3, 250, 4.0))
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from ai.rota_optimizer import (IKI_OPT_KOMSU, haversine, iki_opt, mesafe_matrisi_olustur, nearest_neighbor,
+                               nearest_neighbor_kd, rota_mesafesi_hesapla)
+
+
+@pytest.fixture
+def noktalar():
+    rng = np.random.default_rng(5)
+    return np.column_stack([40.15 + rng.random(150) * 0.15, 28.85 + rng.random(150) * 0.15]).tolist()
+
+
+def _skaler_matris(kaynak, hedef):
+    """Blok hesaptan önceki yol: her hücre için skaler haversine"""
+    return np.array([[haversine(a[0], a[1], b[0], b[1]) for b in hedef] for a in kaynak])
+
+
+def test_matrix_matches_scalar_haversine(noktalar):
+    beklenen = _skaler_matris(noktalar, noktalar)
+    matris = mesafe_matrisi_olustur(noktalar)
+    assert matris.dtype == np.float32
+    assert np.all(np.diag(matris) == 0)
+    # float32: ~1e-6 göreli, kısa mesafelerde birkaç metre mutlak hata
+    np.testing.assert_allclose(matris, beklenen, rtol=1e-5, atol=5e-3)
+
+
+def test_blocks_threads_and_rectangular(noktalar, tmp_path):
+    kaynak, hedef = noktalar[:37], noktalar[37:]
+    tek = mesafe_matrisi_olustur(kaynak, hedef)
+    np.testing.assert_allclose(tek, _skaler_matris(kaynak, hedef), rtol=1e-5, atol=5e-3)
+    bloklu = mesafe_matrisi_olustur(kaynak, hedef, blok_satir=5, is_parcacigi=4)
+    np.testing.assert_array_equal(bloklu, tek)
+    dosya = tmp_path / "matris.npy"
+    diskte = mesafe_matrisi_olustur(kaynak, hedef, dosya=str(dosya), blok_satir=8)
+    np.testing.assert_array_equal(np.load(dosya, mmap_mode="r"), tek)
+    assert diskte.shape == (37, len(hedef))
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_kd_nearest_neighbor_matches_matrix_order(seed):
+    rng = np.random.default_rng(seed)
+    n = 120
+    koordinatlar = np.column_stack([40.15 + rng.random(n) * 0.15, 28.85 + rng.random(n) * 0.15]).tolist()
+    talepler = rng.random(n) * 2.0 + 0.1
+    talepler[0] = 0.0
+    matris = _skaler_matris(koordinatlar, koordinatlar)
+    assert nearest_neighbor_kd(koordinatlar, talepler, 9.0) == nearest_neighbor(matris, talepler, 9.0)
+
+
+def test_kd_nearest_neighbor_fleet_and_oversized_points(noktalar):
+    talepler = np.full(len(noktalar), 1.0)
+    talepler[0] = 0.0
+    talepler[[10, 20]] = 30.0  # hiçbir araca sığmaz
+    rotalar, araclar = nearest_neighbor_kd(noktalar, talepler, [12.0, 5.0], arac_dondur=True)
+    ziyaret = sorted(p for r in rotalar for p in r)
+    assert ziyaret == list(range(1, len(noktalar)))
+    assert [10] in rotalar and [20] in rotalar
+    kapasite = np.array([12.0, 5.0])
+    for rota, arac in zip(rotalar, araclar):
+        if len(rota) > 1:
+            assert talepler[rota].sum() <= kapasite[arac] + 1e-9
+
+
+@pytest.mark.parametrize("uzunluk", [0, 1, 2, 3, 4, IKI_OPT_KOMSU, IKI_OPT_KOMSU + 1, 40, 120])
+def test_iki_opt_permutes_and_never_lengthens(noktalar, uzunluk):
+    matris = mesafe_matrisi_olustur(noktalar)
+    rng = np.random.default_rng(uzunluk)
+    rota = rng.choice(np.arange(1, len(noktalar)), uzunluk, replace=False).tolist()
+    once = rota_mesafesi_hesapla(rota, matris)
+    # Eski çağrı biçimi: sadece rota ve matris
+    sonuc = iki_opt(list(rota), matris)
+    assert isinstance(sonuc, list)
+    assert sorted(sonuc) == sorted(rota)
+    assert rota_mesafesi_hesapla(sonuc, matris) <= once + 1e-6
+    if uzunluk > IKI_OPT_KOMSU:
+        # Rastgele sıradan başlayınca uzun rotada iyileşme bulunmalı
+        assert rota_mesafesi_hesapla(sonuc, matris) < once
+
+
+def test_iki_opt_depot_neighbors_and_list_matrix(noktalar):
+    matris = mesafe_matrisi_olustur(noktalar[:60])
+    rota = list(range(1, 60))
+    np.random.default_rng(3).shuffle(rota)
+    depo = rota.pop()
+    once = rota_mesafesi_hesapla(rota, matris, depo=depo)
+    for komsu in (1, 3, 100):
+        sonuc = iki_opt(list(rota), matris, depo=depo, komsu=komsu)
+        assert sorted(sonuc) == sorted(rota) and depo not in sonuc
+        assert rota_mesafesi_hesapla(sonuc, matris, depo=depo) <= once + 1e-6
+    # Liste matrisi ile aynı sonuç
+    assert iki_opt(list(rota), matris.tolist(), depo) == iki_opt(list(rota), matris, depo)
@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ai.güncel_v6_fullvehicle import routes_to_dataframe, DEFAULT_CONFIG
+from ai.route_store import RouteStore, concat_routes, UNLOAD, START, KIND_CONTAINER, KIND_UNLOAD
+
+
+@pytest.fixture
+def planned_day():
+    """Küçük bir gün tablosu ve iki aracın rastgele (boşaltmalı) rotaları"""
+    rng = np.random.default_rng(3)
+    n = 30
+    day_containers = pd.DataFrame({
+        "mahalle_norm": rng.choice(["ALAADDINBEY", "GORUKLE", "ODUNLUK"], n),
+        "tip_norm": rng.choice(["770 LT", "400 LT", "YERALTI"], n),
+        "demand_ton": rng.random(n) * 0.7 + 0.05,
+        "lat": 40.2 + rng.random(n) * 0.05,
+        "lon": 28.9 + rng.random(n) * 0.05,
+        "street_width": rng.choice([4.5, 7.0, 12.25], n),
+    })
+    day = SimpleNamespace(day_containers=day_containers, unload_pos=(40.2063, 28.9023))
+    vehicles, stops = [], []
+    order = rng.permutation(n)
+    for vi, part in enumerate(np.array_split(order, 2)):
+        start = (40.21 + vi / 100, 28.95 - vi / 100)
+        route = RouteStore(4)  # küçük başlangıç kapasitesi: büyüme de sınanır
+        route.add_start(*start)
+        plan, load, minute = [], 0.0, 0
+        for k, idx in enumerate(part):
+            minute += int(rng.integers(3, 40))
+            if k and k % 6 == 0:
+                route.add_unload(*day.unload_pos, minute)
+                plan.append((UNLOAD, minute, 0.0))
+                load = 0.0
+            load += day_containers["demand_ton"].values[idx]
+            route.add_container(idx, day_containers["lat"].values[idx], day_containers["lon"].values[idx],
+                                minute, load)
+            plan.append((int(idx), minute, load))
+        vehicles.append({"id": 10 + vi, "name": f"ARAC-{vi}", "type": "Kamyon", "category": "LARGE",
+                         "capacity": 12.0, "is_crane": bool(vi), "start_mahalle": "NILUFER",
+                         "start_pos": start, "route": route})
+        stops.append(plan)
+    return day, vehicles, stops
+
+
+def _reference_frame(day, vehicles, stops, cfg):
+    """Sütunlu kayıttan önceki çıktı: durak başına sözlük, yük çalışan toplamdan"""
+    dc = day.day_containers
+    rows = []
+    for v, plan in zip(vehicles, stops):
+        route = [{"container_idx": -2, "mahalle": v["start_mahalle"], "lat": v["start_pos"][0],
+                  "lon": v["start_pos"][1], "tip": "BASLANGIC", "demand_ton": 0,
+                  "hour": cfg.day_start_hour, "load_ton": 0, "street_width": 99}]
+        load = 0.0
+        for idx, minute, _ in plan:
+            hour = cfg.day_start_hour + minute // 60
+            if idx == UNLOAD:
+                load = 0.0
+                route.append({"container_idx": -1, "mahalle": cfg.unload_mah, "lat": day.unload_pos[0],
+                              "lon": day.unload_pos[1], "tip": "BOŞALTMA", "demand_ton": 0,
+                              "hour": hour, "load_ton": 0, "street_width": 99})
+                continue
+            demand = dc["demand_ton"].values[idx]
+            load += demand
+            route.append({"container_idx": idx, "mahalle": dc["mahalle_norm"].values[idx],
+                          "lat": float(dc["lat"].values[idx]), "lon": float(dc["lon"].values[idx]),
+                          "tip": dc["tip_norm"].values[idx], "demand_ton": float(demand), "hour": hour,
+                          "load_ton": round(load, 2), "street_width": float(dc["street_width"].values[idx])})
+        for i, stop in enumerate(route):
+            rows.append({"vehicle_id": v["id"], "vehicle_name": v["name"], "vehicle_type": v["type"],
+                         "vehicle_category": v["category"], "vehicle_capacity": v["capacity"],
+                         "is_crane": v["is_crane"], "step": i + 1, **stop})
+    return pd.DataFrame(rows)
+
+
+def test_routes_csv_matches_per_stop_dicts(planned_day):
+    day, vehicles, stops = planned_day
+    expected = _reference_frame(day, vehicles, stops, DEFAULT_CONFIG)
+    result = routes_to_dataframe(vehicles, day, DEFAULT_CONFIG)
+    assert result.to_csv(index=False) == expected.to_csv(index=False)
+
+
+def test_store_growth_and_concat(planned_day):
+    _, vehicles, stops = planned_day
+    routes = [v["route"] for v in vehicles]
+    owner, step, cols = concat_routes(routes)
+    assert len(owner) == sum(len(r) for r in routes) == sum(len(p) + 1 for p in stops)
+    assert cols["container"][0] == START and step[0] == 1
+    for vi, plan in enumerate(stops):
+        own = cols["container"][owner == vi][1:]
+        assert own.tolist() == [idx for idx, _, _ in plan]
+        assert np.array_equal(step[owner == vi], np.arange(1, len(plan) + 2))
+    r = routes[0]
+    assert r.count(KIND_UNLOAD) == sum(idx == UNLOAD for idx, _, _ in stops[0])
+    assert r.count(KIND_CONTAINER) + r.count(KIND_UNLOAD) + 1 == len(r)
+    copy = r.copy()
+    copy.truncate(3)
+    assert len(copy) == 3 and len(r) == len(stops[0]) + 1
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from ai.spatial_index import CandidateGrid
+
+
+def _brute_force(grid, lat, lon, k, allowed):
+    """İndeksli, canlı ve izinli tüm konteynerler arasından en yakın k (aynı projeksiyonda)"""
+    qx, qy = grid.project(lat, lon)
+    ok = grid.indexed & grid.alive
+    if allowed is not None:
+        ok &= allowed
+    idx = np.flatnonzero(ok)
+    d = np.hypot(grid.x[idx] - qx, grid.y[idx] - qy)
+    return np.sort(d)[:k]
+
+
+def _query_distances(grid, lat, lon, res):
+    qx, qy = grid.project(lat, lon)
+    return np.hypot(grid.x[res] - qx, grid.y[res] - qy)
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_query_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(50, 600))
+    # Kümelenmiş + düzgün noktalar: boş ve kalabalık hücreler birlikte
+    lats = np.concatenate([40.2 + rng.random(n // 2) * 0.06, 40.23 + rng.normal(0, 0.002, n - n // 2)])
+    lons = np.concatenate([28.9 + rng.random(n // 2) * 0.08, 28.95 + rng.normal(0, 0.002, n - n // 2)])
+    grid = CandidateGrid(lats, lons)
+    if seed % 2:
+        grid.restrict(np.flatnonzero(rng.random(n) < 0.7))
+
+    for step in range(60):
+        # Silmeler (sıkıştırmayı da tetikler) ve rastgele izin maskeleri
+        for i in rng.choice(n, size=int(rng.integers(0, 12)), replace=False):
+            grid.remove(i)
+        allowed = rng.random(n) < rng.uniform(0.05, 1.0) if step % 3 else None
+        if step % 5 == 0:
+            # Grid dışı konum (ör. boşaltma noktası)
+            lat, lon = 40.2 + rng.uniform(-0.05, 0.11), 28.9 + rng.uniform(-0.05, 0.13)
+        else:
+            lat, lon = 40.2 + rng.random() * 0.06, 28.9 + rng.random() * 0.08
+        k = int(rng.choice([1, 5, 20, 100, 1000]))
+
+        res = grid.query(lat, lon, k, allowed)
+        expected = _brute_force(grid, lat, lon, k, allowed)
+        assert len(res) == len(expected) == len(np.unique(res))
+        assert np.all(grid.alive[res]) and np.all(grid.indexed[res])
+        if allowed is not None:
+            assert np.all(allowed[res])
+        d = _query_distances(grid, lat, lon, res)
+        assert np.all(np.diff(d) >= 0)
+        np.testing.assert_allclose(d, expected, rtol=0, atol=1e-12)
+
+
+def test_empty_and_exhausted():
+    grid = CandidateGrid([], [])
+    assert len(grid.query(40.2, 28.9, 5)) == 0
+    grid = CandidateGrid([40.2, 40.21, 40.22], [28.9, 28.91, 28.92])
+    for i in range(3):
+        grid.remove(i)
+    assert len(grid.query(40.2, 28.9, 5)) == 0
+    assert grid.n_alive == 0